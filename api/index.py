@@ -1,6 +1,7 @@
 # api/index.py - Vercel Serverless 函数入口
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from typing import Optional
 import sys
 import os
@@ -25,6 +26,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 为每个请求设置关联ID（X-Request-ID），日志中的 request_id 与之对应
+# 并在响应中返回各阶段耗时（Server-Timing）
+# 按 Accept-Encoding 压缩响应（gzip/brotli/zstd），压缩耗时计入 Server-Timing
+# 设置 STOCK_API_STATIC_DIR 时直接返回 materialize.py 收盘后预渲染的响应（X-Cache: STATIC）
+from compression import compression_middleware
+from log_utils import request_id_middleware
+from profiling import server_timing_middleware, profiling_allowed, run_profiled, load_profile
+from static_files import static_middleware
+
+app.middleware("http")(static_middleware)
+app.middleware("http")(compression_middleware)
+app.middleware("http")(server_timing_middleware)
+app.middleware("http")(request_id_middleware)
+
+_api = None
+
+
+def get_api():
+    """延迟创建并复用 StockDataAPI 实例，同一容器内的请求共享缓存和指标"""
+    global _api
+    if _api is None:
+        from stock_api import StockDataAPI
+        _api = StockDataAPI()
+    return _api
+
 
 # ==================== 基础路由 ====================
 @app.get("/")
@@ -42,11 +68,17 @@ async def root():
             "/": "API信息",
             "/health": "健康检查",
             "/test": "测试接口",
+            "/metrics": "Prometheus监控指标",
             "/api/stock": "获取所有股票列表",
-            "/api/stock/{name}": "获取单只股票数据"
+            "/api/stock/{name}": "获取单只股票数据",
+            "/api/batch": "一次获取多只股票",
+            "/api/screener": "全市场选股（条件表达式）",
+            "/api/cross-section": "横截面分析（排名、相关性矩阵）",
+            "/api/backtest": "信号回测（净值曲线和统计）"
         },
         "example": {
             "get_stock": "/api/stock/贵州茅台?days=10",
+            "screener": "/api/screener?filter=RSI<30 and MACD_golden_cross",
             "list_stocks": "/api/stock"
         }
     }
@@ -72,6 +104,14 @@ async def test():
     }
 
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus监控指标"""
+    import metrics
+    get_api()  # 确保缓存指标已绑定
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # ==================== 股票数据路由 ====================
 @app.get("/api/stock")
 async def list_stocks(
@@ -133,28 +173,81 @@ async def list_stocks(
         )
 
 
+# 需要等待请求预算的路由（单只、简化版、批量）使用同步函数，由线程池执行，等待时不阻塞事件循环
 @app.get("/api/stock/{stock_name}")
-async def get_stock(
+def get_stock(
         stock_name: str,
-        days: int = 30
+        response: Response,
+        days: int = 30,
+        interval: str = "1d",
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        max_points: Optional[int] = None,
+        profile: bool = False,
+        x_profile_token: Optional[str] = Header(None)
 ):
     """
     获取单只股票数据
     - stock_name: 股票名称，如"贵州茅台"
-    - days: 天数，默认30天，最大100天
+    - days: K线数量，默认30
+    - interval: K线周期 1m/5m/15m/60m/1d/1wk/1mo，默认1d
+    - start / end: 日期区间（YYYY-MM-DD），设置后按区间分页返回
+    - cursor: 上一页返回的 metadata.next_cursor，只返回之后的新K线
+    - limit: 分页时每页最多K线数，默认等于 days
+    - max_points: 每个序列最多返回的点数（图表用），K线按桶聚合OHLC，指标用LTTB选点
+    - profile: 是否对本次请求做CPU采样分析（需要 X-Profile-Token 头）
+    days / limit 受服务端行数和响应大小上限限制（STOCK_API_MAX_ROWS / STOCK_API_MAX_RESPONSE_BYTES）
+    超过请求时间预算（STOCK_API_REQUEST_BUDGET）时返回过期缓存（X-Cache: STALE），没有缓存时返回504
     """
-    # 限制天数
-    if days > 100:
-        days = 100
-    if days < 1:
-        days = 1
+    from deadline import request_deadline
+    deadline = request_deadline()
+    from resample import INTERVALS
+    if interval not in INTERVALS:
+        raise HTTPException(status_code=400, detail=f"不支持的周期: {interval}，可选: {', '.join(INTERVALS)}")
+    from downsample import MIN_POINTS
+    if max_points is not None and max_points < MIN_POINTS:
+        raise HTTPException(status_code=400, detail=f"max_points 不能小于 {MIN_POINTS}")
+
+    days = max(days, 1)
 
     try:
         # 延迟导入，避免启动时失败
-        from stock_api import StockDataAPI
-        api = StockDataAPI()
-        result = api.get_stock_data(stock_name, days)
-
+        api = get_api()
+        try:
+            api.check_rows(days, interval=interval)
+            if limit is not None:
+                api.check_rows(limit, interval=interval)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        if start or end or cursor:
+            try:
+                result = api.get_stock_history(stock_name, interval, start=start, end=end, cursor=cursor,
+                                               max_points=max_points, limit=max(limit or days, 1))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            response.headers["Cache-Control"] = f"public, max-age={api.cache_max_age}"
+        elif profile:
+            if not profiling_allowed(x_profile_token):
+                raise HTTPException(status_code=403, detail="无权进行性能分析")
+            result, profile_summary = run_profiled(
+                api.get_stock_data, stock_name, days, use_cache=False, interval=interval,
+                metadata={"stock_name": stock_name, "days": days, "interval": interval}
+            )
+            if result.get("success", False):
+                result = {**result, "profile": profile_summary}
+        else:
+            result = api.get_stock_data(stock_name, days, interval=interval, max_points=max_points,
+                                        deadline=deadline)
+            response.headers["Cache-Control"] = f"public, max-age={api.cache_max_age}"
+
+        if result.get("timeout"):
+            raise HTTPException(status_code=504, detail=result["message"])
+        if (result.get("metadata") or {}).get("stale"):
+            response.headers["X-Cache"] = "STALE"
+            response.headers["Cache-Control"] = "no-cache"
         if not result.get("success", False):
             raise HTTPException(
                 status_code=404,
@@ -173,54 +266,191 @@ async def get_stock(
 
 
 @app.get("/api/stock/{stock_name}/simple")
-async def get_stock_simple(
+def get_stock_simple(
         stock_name: str,
+        response: Response,
         days: int = 10
 ):
     """
     获取股票数据（简化版）
     - 仅返回关键信息，适合快速查看
+    - 只计算最新一行的指标摘要，不计算完整指标表、不生成K线和指标明细
+    未找到股票时返回404，超过请求时间预算且没有缓存时返回504
     """
+    from deadline import request_deadline
+    deadline = request_deadline()
     try:
         # 延迟导入
-        from stock_api import StockDataAPI
-        api = StockDataAPI()
-        result = api.get_stock_data(stock_name, min(days, 30))
-
+        from stock_api import simple_response
+        api = get_api()
+        result = api.get_stock_summary(stock_name, min(max(days, 1), 30), deadline=deadline)
+        if result.get("timeout"):
+            raise HTTPException(status_code=504, detail=result["message"])
         if not result.get("success", False):
-            return {
-                "success": False,
-                "message": result.get("message", "获取数据失败"),
-                "stock_name": stock_name
-            }
+            raise HTTPException(
+                status_code=404,
+                detail=result.get("message") or f"未找到股票 {stock_name}"
+            )
+        if (result.get("metadata") or {}).get("stale"):
+            response.headers["X-Cache"] = "STALE"
+            response.headers["Cache-Control"] = "no-cache"
+        else:
+            response.headers["Cache-Control"] = f"public, max-age={api.cache_max_age}"
+
+        return simple_response(result, stock_name)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"获取数据失败: {str(e)}"
+        )
 
-        # 提取关键信息
-        summary = result.get("summary", {})
-        price_info = summary.get("price", {})
 
-        simple_data = {
+@app.get("/api/batch")
+def get_stock_batch(
+        response: Response,
+        names: str,
+        days: int = 30,
+        interval: str = "1d",
+        summary_only: bool = False
+):
+    """
+    一次获取多只股票（客户端SDK合并请求使用）
+    - names: 股票名称，逗号分隔，最多50只
+    - summary_only: 为true时只返回摘要和元数据，不返回K线和指标明细
+    超过请求时间预算时返回已完成的部分结果（partial 为true），未完成的股票返回过期缓存或超时结果
+    """
+    from deadline import request_deadline
+    deadline = request_deadline()
+    from resample import INTERVALS
+    if interval not in INTERVALS:
+        raise HTTPException(status_code=400, detail=f"不支持的周期: {interval}，可选: {', '.join(INTERVALS)}")
+    stock_names = list(dict.fromkeys(s.strip() for s in names.split(",") if s.strip()))
+    if not stock_names or len(stock_names) > 50:
+        raise HTTPException(status_code=400, detail="names 需要1到50只股票")
+    api = get_api()
+    try:
+        days = api.check_rows(max(days, 1), len(stock_names), interval)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        results = api.get_multiple_stocks(stock_names, days, interval=interval, deadline=deadline)
+        partial = any(r.get("timeout") or (r.get("metadata") or {}).get("stale") for r in results.values())
+        if summary_only:
+            results = {
+                name: {key: value for key, value in result.items() if key not in ("data", "indicators")}
+                for name, result in results.items()
+            }
+        response.headers["Cache-Control"] = "no-cache" if partial else f"public, max-age={api.cache_max_age}"
+        return {
             "success": True,
-            "stock_name": result.get("stock_name"),
-            "stock_code": result.get("stock_code"),
-            "price": price_info.get("close"),
-            "change": price_info.get("change"),
-            "summary": {
-                "rsi": summary.get("rsi", {}).get("value"),
-                "rsi_status": summary.get("rsi", {}).get("status"),
-                "macd_signal": summary.get("macd", {}).get("signal_text"),
-                "above_ma20": summary.get("moving_averages", {}).get("above_MA20")
-            },
-            "data_points": result.get("metadata", {}).get("days", 0)
+            "count": sum(1 for r in results.values() if r.get("success")),
+            "partial": partial,
+            "results": results
         }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量获取失败: {str(e)}")
 
-        return simple_data
 
+@app.get("/api/screener")
+def screen_stocks(
+        expr: Optional[str] = Query(None, alias="filter"),
+        sort: Optional[str] = None,
+        order: str = "desc",
+        limit: int = 50,
+        fields: Optional[str] = None
+):
+    """
+    全市场选股
+    - filter: 条件表达式，如 "RSI < 30 and MACD_golden_cross"
+    - sort: 排序列，如 RSI、price_change_5d
+    - order: asc / desc，默认desc
+    - limit: 最多返回的股票数，默认50
+    - fields: 返回的指标列，逗号分隔，默认全部
+    """
+    try:
+        api = get_api()
+        return api.screen(
+            expr, sort=sort, ascending=order == "asc", limit=max(limit, 0),
+            fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        return {
-            "success": False,
-            "message": f"获取数据失败: {str(e)}",
-            "stock_name": stock_name
-        }
+        raise HTTPException(status_code=500, detail=f"选股失败: {str(e)}")
+
+
+@app.get("/api/cross-section")
+def get_cross_section(
+        symbols: Optional[str] = None,
+        days: int = 60,
+        sort_by: Optional[str] = None,
+        top: Optional[int] = None,
+        window: int = 20,
+        matrix: str = "corr"
+):
+    """
+    横截面分析
+    - symbols: 股票名称，逗号分隔，默认全部股票
+    - days: 每只股票使用的交易日数，默认60
+    - sort_by: price_change_1d / price_change_5d / price_change_20d / rs_rank（默认）
+    - top: 只返回排名前N的股票
+    - window: 相关/协方差矩阵使用的交易日数，默认20
+    - matrix: corr / cov / none
+    """
+    try:
+        api = get_api()
+        names = [s.strip() for s in symbols.split(",") if s.strip()] if symbols else None
+        return api.cross_section(names, days=api.check_rows(max(days, 2)), sort_by=sort_by, top=top,
+                                 window=max(window, 2), matrix=matrix)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"横截面分析失败: {str(e)}")
+
+
+@app.get("/api/backtest")
+def run_backtest(
+        entry: str,
+        exit: str,
+        symbols: Optional[str] = None,
+        days: int = 250,
+        fee_bps: float = 3.0,
+        slippage_bps: float = 5.0,
+        equity: bool = False
+):
+    """
+    信号回测
+    - entry: 买入条件，如 "MACD_golden_cross and RSI < 50"
+    - exit: 卖出条件，如 "MACD_death_cross"
+    - symbols: 股票名称，逗号分隔，默认全部股票
+    - days: 回测K线数量，默认250
+    - fee_bps / slippage_bps: 单边手续费和滑点（基点），默认3和5
+    - equity: 是否返回净值曲线
+    """
+    try:
+        api = get_api()
+        names = [s.strip() for s in symbols.split(",") if s.strip()] if symbols else None
+        return api.backtest(entry, exit, stock_names=names, days=api.check_rows(max(days, 2)),
+                            fee=max(fee_bps, 0) / 10000, slippage=max(slippage_bps, 0) / 10000, equity=equity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"回测失败: {str(e)}")
+
+
+@app.get("/api/profiles/{profile_id}")
+async def get_profile(profile_id: str, x_profile_token: Optional[str] = Header(None)):
+    """获取已保存的性能分析结果（仅限同一容器内，包含火焰图使用的 collapsed stack）"""
+    if not profiling_allowed(x_profile_token):
+        raise HTTPException(status_code=403, detail="无权查看性能分析结果")
+    data = load_profile(profile_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail=f"分析结果不存在: {profile_id}")
+    return data
 
 
 # ==================== 错误处理 ====================
@@ -0,0 +1,218 @@
+# backtest.py - 基于技术指标信号的向量化回测
+"""
+用 IndicatorCalculator 输出的信号列（MACD_golden_cross、KDJ_golden_cross、RSI_oversold 等）
+构造买入/卖出条件，对多只股票同时回测。
+
+所有股票的指标按日期对齐成矩阵[日期, 股票]，条件表达式（语法同选股接口）在整个矩阵上求值，
+持仓、收益、手续费和滑点都用数组运算得到，没有逐K线的Python循环：
+- 买入条件成立 -> 持仓1，卖出条件成立 -> 持仓0（同时成立时以卖出为准），其余时间沿用上一状态
+- 信号在当根K线收盘时产生，从下一根K线开始持仓（避免未来函数）
+- 每次换手按 (手续费 + 滑点) 扣除成本
+"""
+import numpy as np
+import pandas as pd
+
+from compact import finite_list
+from cross_section import align_frames
+from screener import COLUMNS, FLAG_COLUMNS, compile_filter, evaluate_filter
+
+# 年化使用的每年K线数量（日线）
+PERIODS_PER_YEAR = 252
+
+
+def _hold_forward(state):
+    """沿时间轴前值填充状态矩阵（NaN表示没有信号），开始时为空仓"""
+    n = len(state)
+    has_signal = ~np.isnan(state)
+    idx = np.where(has_signal, np.arange(n)[:, None], 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    held = np.take_along_axis(state, idx, axis=0)
+    return np.nan_to_num(held, nan=0.0)
+
+
+def _stats(returns, position, periods_per_year):
+    """
+    按列（每只股票或组合）计算回测统计
+    Args:
+        returns: 策略每根K线的收益率矩阵[日期, N]
+        position: 持仓矩阵[日期, N]
+    """
+    n = len(returns)
+    equity = np.cumprod(1 + returns, axis=0)
+    final = equity[-1]
+    mean = returns.mean(axis=0)
+    std = returns.std(axis=0, ddof=1) if n > 1 else np.zeros(returns.shape[1])
+    drawdown = equity / np.maximum.accumulate(equity, axis=0) - 1
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(std > 0, mean / std * np.sqrt(periods_per_year), np.nan)
+        annual_return = np.power(final, periods_per_year / n) - 1
+
+    return equity, {
+        "total_return": (final - 1) * 100,
+        "annual_return": annual_return * 100,
+        "volatility": std * np.sqrt(periods_per_year) * 100,
+        "sharpe": sharpe,
+        "max_drawdown": drawdown.min(axis=0) * 100,
+        "exposure": position.mean(axis=0) * 100,
+    }
+
+
+def _trade_stats(returns, position):
+    """
+    每只股票的交易次数和胜率
+    同一笔交易（从买入到卖出当根K线）的收益率按对数收益求和，用 bincount 一次性汇总
+    """
+    n_bars, n_symbols = position.shape
+    prev = np.vstack([np.zeros((1, n_symbols)), position[:-1]])
+    entries = (position > 0) & (prev == 0)
+    exits = (position == 0) & (prev > 0)
+    trade_no = np.cumsum(entries, axis=0)
+    in_trade = (position > 0) | exits
+    trades = entries.sum(axis=0)
+
+    stride = int(trades.max()) + 1 if n_symbols else 1
+    keys = (np.arange(n_symbols)[None, :] * stride + trade_no)[in_trade]
+    log_returns = np.log1p(returns)[in_trade]
+    per_trade = np.bincount(keys, weights=log_returns, minlength=n_symbols * stride).reshape(n_symbols, stride)
+    opened = np.zeros((n_symbols, stride), dtype=bool)
+    opened[:, 1:] = np.arange(1, stride)[None, :] <= trades[:, None]
+
+    wins = ((per_trade > 0) & opened).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        win_rate = np.where(trades > 0, wins / trades * 100, np.nan)
+    return trades, win_rate
+
+
+class Backtester:
+    """多只股票的向量化回测（对齐后的指标矩阵可被多条规则复用）"""
+
+    def __init__(self, frames, fee=0.0003, slippage=0.0005, periods_per_year=PERIODS_PER_YEAR):
+        """
+        Args:
+            frames: {symbol: calculate_all 之后的DataFrame}
+            fee: 单边手续费率
+            slippage: 单边滑点（按成交价比例）
+            periods_per_year: 年化使用的每年K线数量
+        """
+        self.fee = fee
+        self.slippage = slippage
+        self.periods_per_year = periods_per_year
+        self.dates, self.symbols, matrices = align_frames(frames, COLUMNS)
+
+        self.valid = ~np.isnan(matrices["close"])
+        self.columns = {}
+        for col, values in matrices.items():
+            self.columns[col] = np.nan_to_num(values, nan=0.0).astype(bool) if col in FLAG_COLUMNS else values
+
+        # 缺失的K线（停牌/各市场节假日不同）按前值填充收盘价，当根收益为0
+        close = pd.DataFrame(matrices["close"]).ffill().to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bar_returns = close[1:] / close[:-1] - 1
+        self.bar_returns = np.nan_to_num(np.vstack([np.zeros((1, close.shape[1])), bar_returns]), nan=0.0)
+        self.close = close
+
+    def positions(self, entry, exit):
+        """根据买入/卖出条件计算持仓矩阵[日期, 股票]"""
+        entry_mask = np.broadcast_to(evaluate_filter(compile_filter(entry), self.columns), self.valid.shape) & self.valid
+        exit_mask = np.broadcast_to(evaluate_filter(compile_filter(exit), self.columns), self.valid.shape) & self.valid
+
+        state = np.where(exit_mask, 0.0, np.where(entry_mask, 1.0, np.nan))
+        held = _hold_forward(state)
+        # 信号在收盘时产生，下一根K线开始持仓
+        position = np.zeros_like(held)
+        position[1:] = held[:-1]
+        return position
+
+    def run(self, entry, exit, equity=False):
+        """
+        回测一条规则
+        Args:
+            entry: 买入条件表达式，如 "MACD_golden_cross and RSI < 50"
+            exit: 卖出条件表达式，如 "MACD_death_cross"
+            equity: 是否返回每只股票和组合的净值曲线
+        Returns:
+            结果字典；表达式不合法时抛出 ValueError
+        """
+        if not self.symbols:
+            return {"entry": entry, "exit": exit, "portfolio": None, "symbols": []}
+
+        position = self.positions(entry, exit)
+        prev = np.vstack([np.zeros((1, position.shape[1])), position[:-1]])
+        cost = np.abs(position - prev) * (self.fee + self.slippage)
+        returns = position * self.bar_returns - cost
+
+        curves, stats = _stats(returns, position, self.periods_per_year)
+        trades, win_rate = _trade_stats(returns, position)
+
+        # 等权组合：每根K线取各股票策略收益的平均
+        portfolio_returns = returns.mean(axis=1, keepdims=True)
+        portfolio_curve, portfolio_stats = _stats(portfolio_returns, position.mean(axis=1, keepdims=True),
+                                                  self.periods_per_year)
+
+        first = np.argmax(self.valid, axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            buy_hold = (self.close[-1] / self.close[first, np.arange(len(self.symbols))] - 1) * 100
+
+        names = list(stats)
+        columns = {name: finite_list(stats[name]) for name in names}
+        columns["buy_hold_return"] = finite_list(buy_hold)
+        columns["win_rate"] = finite_list(win_rate)
+        trades = trades.tolist()
+
+        symbols = []
+        for j, symbol in enumerate(self.symbols):
+            row = {"stock_name": symbol, "trades": trades[j]}
+            for name, values in columns.items():
+                row[name] = values[j]
+            symbols.append(row)
+
+        portfolio = {name: finite_list(portfolio_stats[name])[0] for name in names}
+        portfolio["trades"] = int(sum(trades))
+
+        result = {"entry": entry, "exit": exit, "portfolio": portfolio, "symbols": symbols}
+        if equity:
+            result["equity"] = {
+                "dates": self.dates.tolist(),
+                "portfolio": finite_list(portfolio_curve[:, 0]),
+                "symbols": dict(zip(self.symbols, finite_list(curves.T)))
+            }
+        return result
+
+    def run_many(self, rules, equity=False):
+        """
+        回测多条规则，指标矩阵只对齐一次
+        Args:
+            rules: [(entry, exit)]
+        """
+        return [self.run(entry, exit, equity=equity) for entry, exit in rules]
+
+
+# 测试代码
+if __name__ == "__main__":
+    import time
+
+    from indicators import IndicatorCalculator
+    from synthetic_market import SyntheticMarket
+
+    market = SyntheticMarket(seed=11)
+    calculator = IndicatorCalculator()
+    frames = {f"SYM{i:04d}": calculator.calculate_all(market.generate(f"SYM{i:04d}", 500)) for i in range(1000)}
+
+    start = time.perf_counter()
+    backtester = Backtester(frames)
+    print(f"对齐 {len(frames)} 只股票: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    rules = [
+        ("MACD_golden_cross", "MACD_death_cross"),
+        ("KDJ_golden_cross", "KDJ_death_cross"),
+        ("RSI_oversold", "RSI_overbought"),
+        ("RSI < 30 and above_MA5", "RSI > 60"),
+        ("MACD_golden_cross and not above_MA20", "MACD_death_cross or K_overbought"),
+    ]
+    start = time.perf_counter()
+    results = backtester.run_many(rules)
+    elapsed = time.perf_counter() - start
+    print(f"{len(rules)} 条规则 x {len(frames)} 只股票: {elapsed * 1000:.1f}ms")
+    for result in results:
+        print(f"{result['entry']} / {result['exit']}: {result['portfolio']}")
@@ -0,0 +1,307 @@
+# bar_store.py - K线存储：按日期区间和游标分页读取，不再每次请求重新计算整个窗口
+"""
+原先唯一的历史参数是 days，每次请求都重新获取并计算完整窗口；客户端轮询时只能反复下载整段序列。
+
+BarStore 为每只股票、每个周期保存一份K线及其指标（calculate_all 的结果）：
+- 请求需要的K线超出已保存的范围时，向上游获取完整区间（多年日线由 KlineFetcher 分段并行获取）
+- 保存时间超过 max_age 时只获取最后一根K线之后的新K线（带少量重叠），与已保存的K线合并去重，
+  只为新K线逐根计算指标（IncrementalIndicators 用之前的预热K线初始化）；重叠部分的价格不一致（除权复权调整了历史价格）时改为重新获取完整区间
+- 其余请求都只是在已保存的序列上按日期二分查找后切片
+- 所有序列（K线+指标）的总内存不超过 max_bytes，超出时淘汰最久未使用的序列
+
+分页：
+- start / end: 日期区间（含两端），格式 YYYY-MM-DD 或 YYYY-MM-DD HH:MM
+- cursor: 上一页返回的 next_cursor，只返回游标之后的K线；没有新K线时返回空页和原游标，
+  客户端可以一直用最新的游标轮询增量
+- 既没有 start 也没有 cursor 时返回区间内最近的 limit 根K线
+"""
+import base64
+import binascii
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from indicators import IncrementalIndicators
+from log_utils import get_logger
+from resample import estimate_bars, validate_interval
+from warmup import warmup_bars
+
+logger = get_logger(__name__)
+
+DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%d %H:%M")
+
+# 单只股票单个周期最多保存的K线数量
+MAX_BARS = int(os.environ.get("STOCK_API_MAX_BARS", 6000))
+
+# 增量更新时与已保存K线重叠的根数（用于校验历史价格是否被调整，并覆盖盘中变化的最后一根）
+OVERLAP_BARS = 5
+
+KLINE_COLUMNS = ["date", "open", "high", "low", "close", "volume"]
+
+
+def parse_date(value):
+    """解析日期参数，返回 datetime；格式不正确时抛出 ValueError"""
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"日期格式错误: {value}，应为 YYYY-MM-DD 或 YYYY-MM-DD HH:MM")
+
+
+def date_key(value):
+    """日期参数转换为保存的日期格式（补齐前导零、去掉空白），用于在已排序的日期中二分查找"""
+    fmt = DATE_FORMATS[1] if ":" in value else DATE_FORMATS[0]
+    return parse_date(value).strftime(fmt)
+
+
+def encode_cursor(stock_code, interval, date):
+    """游标：最后一根已返回K线的日期（附带股票代码和周期，防止误用于其他序列）"""
+    raw = json.dumps([stock_code, interval, date], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, stock_code, interval):
+    """解析游标，返回其中的日期；游标无效或不属于该序列时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        code, cursor_interval, date = json.loads(raw.decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise ValueError("无效的游标")
+    if code != stock_code or cursor_interval != interval:
+        raise ValueError("游标不属于该股票或周期")
+    return str(date)
+
+
+def _end_key(value):
+    """只给出日期的 end 包含当天所有分钟线（"~" 排在空格和数字之后）"""
+    return value + "~" if len(value) == 10 else value
+
+
+class StoredSeries:
+    """一只股票一个周期的K线和指标"""
+
+    __slots__ = ("frame", "dates", "requested", "fetched_at", "nbytes")
+
+    def __init__(self, frame, requested):
+        self.frame = frame
+        self.dates = frame["date"].astype(str).to_numpy(dtype=str)
+        self.requested = requested
+        self.fetched_at = time.time()
+        self.nbytes = int(frame.memory_usage(index=False, deep=True).sum()) + self.dates.nbytes
+
+    def __len__(self):
+        return len(self.frame)
+
+
+class BarStore:
+    """按股票和周期保存K线及指标，按日期区间/游标切片"""
+
+    def __init__(self, fetcher, calculator, max_age=60.0, max_bytes=256 * 1024 * 1024):
+        """
+        Args:
+            fetcher: KlineFetcher
+            calculator: IndicatorCalculator
+            max_age: 序列的有效时间（秒），超过后下次读取时增量更新
+            max_bytes: 所有序列的内存上限（字节），超出时按LRU淘汰
+        """
+        self.fetcher = fetcher
+        self.calculator = calculator
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._series = OrderedDict()
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._series)
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _get(self, key):
+        with self._lock:
+            series = self._series.get(key)
+            if series is not None:
+                self._series.move_to_end(key)
+            return series
+
+    def _put(self, key, series):
+        """保存序列，总内存超出上限时淘汰最久未使用的序列（至少保留刚写入的一个）"""
+        with self._lock:
+            old = self._series.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._series[key] = series
+            self.nbytes += series.nbytes
+            while self.nbytes > self.max_bytes and len(self._series) > 1:
+                evicted_key, evicted = self._series.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self._locks.pop(evicted_key, None)
+
+    def peek(self, stock_name, stock_code, interval, bars):
+        """已保存且未过期、至少覆盖最近 bars 根K线的序列；没有时返回None（不获取）"""
+        series = self._get((stock_code or stock_name, interval))
+        return series if self._fresh(series, bars) and len(series) >= bars else None
+
+    def _fresh(self, series, bars):
+        return series is not None and series.requested >= bars and time.time() - series.fetched_at <= self.max_age
+
+    def series(self, stock_name, stock_code, interval, bars):
+        """
+        返回至少覆盖最近 bars 根K线的序列（上游历史不足时以实际获取到的为准）
+        """
+        bars = min(bars, MAX_BARS)
+        key = (stock_code or stock_name, interval)
+        series = self._get(key)
+        if self._fresh(series, bars):
+            return series
+
+        with self._key_lock(key):
+            # 等待锁期间其他请求可能已经更新
+            series = self._get(key)
+            if self._fresh(series, bars):
+                return series
+
+            frame = None
+            if series is not None and series.requested >= bars:
+                frame = self._append_new(stock_name, interval, series)
+                requested = series.requested
+            else:
+                requested = max(bars, series.requested if series is not None else 0)
+            if frame is None:
+                bars_df = self.fetcher.get_kline_data(stock_name, requested, interval)
+                if bars_df is None or len(bars_df) == 0:
+                    return None
+                frame = self.calculator.calculate_all(bars_df.tail(MAX_BARS).reset_index(drop=True))
+
+            series = StoredSeries(frame, requested)
+            self._put(key, series)
+            logger.debug("K线存储已更新", extra={"stock": stock_name, "interval": interval, "rows": len(series)})
+            return series
+
+    def _append_new(self, stock_name, interval, series):
+        """
+        只获取已保存序列最后一根之后的新K线并合并，只计算新获取的K线的指标
+        Returns:
+            合并后的K线和指标；重叠部分价格不一致或获取失败时返回None（改为重新获取完整区间）
+        """
+        stored = series.frame[KLINE_COLUMNS]
+        last = series.dates[-1]
+        new_bars = estimate_bars(interval, parse_date(last[:16]), datetime.now()) + OVERLAP_BARS
+        tail = self.fetcher.get_kline_data(stock_name, new_bars, interval)
+        if tail is None or len(tail) == 0:
+            return None
+
+        # 重叠部分（不含可能仍在变化的最后一根）价格必须一致
+        tail_dates = tail["date"].astype(str).to_numpy(dtype=str)
+        overlap = np.intersect1d(tail_dates, series.dates[:-1])
+        if len(overlap) == 0 and tail_dates[0] > last:
+            return None
+        if len(overlap):
+            stored_close = stored["close"].to_numpy()[np.searchsorted(series.dates, overlap)]
+            tail_close = tail["close"].to_numpy()[np.searchsorted(tail_dates, overlap)]
+            if not np.allclose(stored_close, tail_close, rtol=1e-6, atol=0):
+                logger.info("历史价格已调整，重新获取完整区间", extra={"stock": stock_name, "interval": interval})
+                return None
+
+        # 新获取的第一根K线之前的K线和指标不变：用之前的预热K线初始化 IncrementalIndicators，
+        # 只逐根计算新K线的指标，再接到已保存的指标后面
+        # （STOCK_API_WARMUP=0 时没有预热长度可用，重新计算整个序列）
+        first = int(np.searchsorted(series.dates, tail_dates[0]))
+        context = warmup_bars()
+        if not context or first < context:
+            return self.calculator.calculate_all(
+                pd.concat([stored.iloc[:first], tail[KLINE_COLUMNS]], ignore_index=True).tail(MAX_BARS)
+                .reset_index(drop=True))
+        engine = IncrementalIndicators()
+        for bar in stored.iloc[first - context:first].to_dict(orient="records"):
+            engine.update(bar)
+        rows = [engine.update(bar) for bar in tail[KLINE_COLUMNS].to_dict(orient="records")]
+        frame = pd.concat([series.frame.iloc[:first], pd.DataFrame(rows, columns=series.frame.columns)],
+                          ignore_index=True)
+        return frame.tail(MAX_BARS).reset_index(drop=True)
+
+    def page(self, stock_name, stock_code, interval="1d", start=None, end=None, cursor=None, limit=100):
+        """
+        读取一页K线和指标
+        Args:
+            start / end: 日期字符串（含两端）
+            cursor: 上一页的 next_cursor
+            limit: 每页最多K线数
+        Returns:
+            (DataFrame, 分页信息字典)；序列不存在时 DataFrame 为None
+        Raises:
+            ValueError: 参数不合法
+        """
+        validate_interval(interval)
+        limit = max(1, int(limit))
+        start = date_key(start) if start else None
+        end = date_key(end) if end else None
+        start_dt = parse_date(start) if start else None
+        end_dt = parse_date(end) if end else None
+        if start_dt and end_dt and start_dt > end_dt:
+            raise ValueError("start 不能晚于 end")
+        after = decode_cursor(cursor, stock_code or stock_name, interval) if cursor else None
+
+        # 需要覆盖的最早时间 -> 需要保存的K线数量（另加指标的预热期，区间开头的指标也是预热过的值）
+        earliest = start_dt or (parse_date(after[:16]) if after else None)
+        now = datetime.now()
+        bars = estimate_bars(interval, earliest, now) if earliest else limit
+        if not earliest and end_dt:
+            bars += estimate_bars(interval, end_dt, now)
+        bars += warmup_bars()
+        series = self.series(stock_name, stock_code, interval, bars)
+        if series is None:
+            return None, None
+
+        dates = series.dates
+        hi = int(np.searchsorted(dates, _end_key(end), side="right")) if end else len(dates)
+        lo = int(np.searchsorted(dates, start, side="left")) if start else 0
+        if after is not None:
+            lo = max(lo, int(np.searchsorted(dates, after, side="right")))
+        if start is None and after is None:
+            lo = max(lo, hi - limit)
+        stop = min(lo + limit, hi) if lo < hi else lo
+
+        frame = series.frame.iloc[lo:stop].reset_index(drop=True)
+        last = str(dates[stop - 1]) if stop > lo else after
+        page = {
+            "next_cursor": encode_cursor(stock_code or stock_name, interval, last) if last else cursor,
+            "has_more": stop < hi,
+            "available": {
+                "start": str(dates[0]) if len(dates) else None,
+                "end": str(dates[-1]) if len(dates) else None
+            }
+        }
+        return frame, page
+
+
+# 测试代码
+if __name__ == "__main__":
+    from indicators import IndicatorCalculator
+    from kline_fetcher import KlineFetcher
+    from stock_code import StockCodeConverter
+
+    converter = StockCodeConverter()
+    fetcher = KlineFetcher(offline=True)
+    fetcher.set_converter(converter)
+    store = BarStore(fetcher, IndicatorCalculator())
+
+    code = converter.name_to_code("贵州茅台")
+    frame, page = store.page("贵州茅台", code, start="2024-01-01", limit=5)
+    print(frame[["date", "close", "MA20"]])
+    print(page)
+
+    # 用游标继续读取下一页
+    frame, page = store.page("贵州茅台", code, cursor=page["next_cursor"], limit=5)
+    print(frame[["date", "close", "MA20"]])
+    print(page)
@@ -0,0 +1,180 @@
+# batch_compute.py - 多进程批量计算技术指标（全市场扫描等批量场景）
+"""
+pandas 计算受GIL限制只能使用一个CPU核。这里把多只股票按块分配给进程池：
+- 所有股票的OHLCV拼成一个 float64 矩阵放入共享内存，子进程直接映射读取，不需要pickle DataFrame
+- 子进程把指标结果写入另一块共享内存（同样的行偏移），只通过pickle返回很小的摘要字典
+- 主进程按偏移把结果重新组装成每只股票的DataFrame
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from indicators import IndicatorCalculator
+
+PRICE_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+_calculator = None
+
+
+def _init_worker():
+    global _calculator
+    _calculator = IndicatorCalculator()
+
+
+def indicator_columns():
+    """calculate_all 新增的指标列及其类型（用样例数据推断，避免手工维护列表）"""
+    sample = pd.DataFrame({col: np.linspace(1.0, 2.0, 10) for col in PRICE_COLUMNS})
+    result = IndicatorCalculator().calculate_all(sample)
+    return [(col, result[col].dtype) for col in result.columns if col not in PRICE_COLUMNS]
+
+
+def _compute_chunk(in_name, out_name, total_rows, n_out, columns, tasks):
+    """
+    子进程：计算一块股票的指标
+    Args:
+        in_name / out_name: 输入、输出共享内存名称
+        total_rows: 所有股票的总行数
+        n_out: 输出列数
+        columns: 输出列名列表
+        tasks: [(symbol, start, end)]
+    Returns:
+        {symbol: summary}
+    """
+    # 进程池的子进程与主进程共用同一个 resource_tracker，映射共享内存不会导致其被提前回收
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    try:
+        bars = np.ndarray((total_rows, len(PRICE_COLUMNS)), dtype=np.float64, buffer=in_shm.buf)
+        out = np.ndarray((total_rows, n_out), dtype=np.float64, buffer=out_shm.buf)
+
+        summaries = {}
+        for symbol, start, end in tasks:
+            df = pd.DataFrame(bars[start:end], columns=PRICE_COLUMNS)
+            result = _calculator.calculate_all(df)
+            for j, col in enumerate(columns):
+                if col in result.columns:
+                    out[start:end, j] = result[col].to_numpy(dtype=np.float64)
+            summaries[symbol] = _calculator.get_indicators_summary(result)
+
+        del bars, out
+        return summaries
+    finally:
+        in_shm.close()
+        out_shm.close()
+
+
+class BatchIndicatorEngine:
+    """多进程批量指标计算"""
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+        self._columns = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def compute(self, frames, chunks_per_worker=4):
+        """
+        并行计算多只股票的技术指标
+        Args:
+            frames: {symbol: 包含date, open, high, low, close, volume的DataFrame}
+            chunks_per_worker: 每个worker分到的任务块数（越大负载越均衡，调度开销越高）
+        Returns:
+            ({symbol: 添加了技术指标的DataFrame}, {symbol: 指标摘要})
+        """
+        frames = {symbol: df for symbol, df in frames.items() if df is not None and len(df) > 0}
+        if not frames:
+            return {}, {}
+
+        if self._columns is None:
+            self._columns = indicator_columns()
+        columns = [col for col, _ in self._columns]
+
+        # 1. 所有股票的OHLCV拼接成一个矩阵，记录每只股票的行范围
+        symbols = list(frames.keys())
+        lengths = np.array([len(frames[s]) for s in symbols])
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        total_rows = int(offsets[-1])
+
+        in_shm = shared_memory.SharedMemory(create=True, size=max(total_rows * len(PRICE_COLUMNS) * 8, 1))
+        out_shm = shared_memory.SharedMemory(create=True, size=max(total_rows * len(columns) * 8, 1))
+        try:
+            bars = np.ndarray((total_rows, len(PRICE_COLUMNS)), dtype=np.float64, buffer=in_shm.buf)
+            for i, symbol in enumerate(symbols):
+                bars[offsets[i]:offsets[i + 1]] = frames[symbol][PRICE_COLUMNS].to_numpy(dtype=np.float64)
+            out = np.ndarray((total_rows, len(columns)), dtype=np.float64, buffer=out_shm.buf)
+            out.fill(np.nan)
+
+            # 2. 按行数均衡地切分任务块
+            tasks = [(symbol, int(offsets[i]), int(offsets[i + 1])) for i, symbol in enumerate(symbols)]
+            n_chunks = min(len(tasks), self.workers * chunks_per_worker)
+            chunks = [tasks[i::n_chunks] for i in range(n_chunks)]
+
+            pool = self._get_pool()
+            futures = [
+                pool.submit(_compute_chunk, in_shm.name, out_shm.name, total_rows, len(columns), columns, chunk)
+                for chunk in chunks
+            ]
+            summaries = {}
+            for future in futures:
+                summaries.update(future.result())
+
+            # 3. 重新组装DataFrame
+            results = {}
+            for i, symbol in enumerate(symbols):
+                df = frames[symbol].copy()
+                if len(df) < IndicatorCalculator.MIN_ROWS:
+                    # 与 calculate_all 一致：数据不足时不添加指标列
+                    results[symbol] = df
+                    continue
+                block = out[offsets[i]:offsets[i + 1]]
+                for j, (col, dtype) in enumerate(self._columns):
+                    values = block[:, j].copy()
+                    df[col] = np.nan_to_num(values, nan=0.0).astype(bool) if dtype == bool else values
+                results[symbol] = df
+                del block
+
+            del bars, out
+            return results, summaries
+        finally:
+            in_shm.close()
+            in_shm.unlink()
+            out_shm.close()
+            out_shm.unlink()
+
+
+# 测试代码
+if __name__ == "__main__":
+    import time
+
+    from synthetic_market import SyntheticMarket
+
+    market = SyntheticMarket(seed=7)
+    universe = {f"SYM{i:04d}": market.generate(f"SYM{i:04d}", 2520) for i in range(200)}
+
+    calculator = IndicatorCalculator()
+    start = time.perf_counter()
+    serial = {s: calculator.calculate_all(df) for s, df in universe.items()}
+    serial_time = time.perf_counter() - start
+
+    engine = BatchIndicatorEngine()
+    engine.compute(dict(list(universe.items())[:engine.workers]))  # 预热进程池
+    start = time.perf_counter()
+    parallel, _ = engine.compute(universe)
+    parallel_time = time.perf_counter() - start
+    engine.close()
+
+    pd.testing.assert_frame_equal(serial["SYM0001"], parallel["SYM0001"], check_dtype=False)
+    print(f"单进程: {serial_time:.2f}s，{engine.workers}进程: {parallel_time:.2f}s，"
+          f"加速比 {serial_time / parallel_time:.1f}x")
@@ -0,0 +1,203 @@
+# benchmark.py - 指标计算和序列化热点路径的微基准测试
+"""
+用法:
+    python benchmark.py run --output bench_baseline.json
+    python benchmark.py compare bench_baseline.json --threshold 0.15
+
+run     运行全部基准并把结果写成JSON基线
+compare 重新运行基准，与基线对比，任一用例变慢超过阈值时返回非0退出码
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from synthetic_market import SyntheticMarket
+
+# 30根K线 ~ 10年日线
+DEFAULT_SIZES = [30, 100, 250, 1000, 2520]
+
+
+@contextlib.contextmanager
+def _quiet():
+    """屏蔽被测代码中的 print 输出，避免终端IO干扰计时"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _time_call(func, min_time=0.2, repeat=5):
+    """
+    测量单次调用耗时（秒）
+    先自动确定每轮调用次数，使每轮耗时不少于 min_time / repeat
+    Returns:
+        每轮平均单次耗时的列表
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeat or number >= 1_000_000:
+            break
+        number *= 2
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return samples
+
+
+def build_cases(sizes):
+    """构造基准用例，返回 [(name, size, func)]"""
+    from compact import CompactFrame
+    from indicator_sweep import IndicatorSweep, parameter_grid
+    from indicators import IndicatorCalculator
+    from stock_api import StockDataAPI
+    from stock_code import StockCodeConverter
+
+    market = SyntheticMarket(seed=1)
+    calculator = IndicatorCalculator()
+    with _quiet():
+        api = StockDataAPI(offline=True)
+    converter = StockCodeConverter()
+    sweep = IndicatorSweep()
+    grid = {"ma": range(2, 121), "rsi": range(5, 31), "macd": parameter_grid()}
+
+    cases = []
+    for size in sizes:
+        bars = market.generate("BENCH", size)
+        with _quiet():
+            full = calculator.calculate_all(bars)
+        cleaned = api._clean_dataframe(full)
+        work = bars.copy()
+
+        cases.append(("calculate_all", size, lambda b=bars: calculator.calculate_all(b)))
+        for method in ("_calculate_ma", "_calculate_rsi", "_calculate_macd",
+                       "_calculate_kdj", "_calculate_price_change"):
+            # _calculate_* 会原地写入列，重复调用只是覆盖相同列，可以复用同一个DataFrame
+            cases.append((method, size, lambda m=getattr(calculator, method), w=work: m(w)))
+        cases.append(("get_indicators_summary", size, lambda f=full: calculator.get_indicators_summary(f)))
+        cases.append(("get_latest_summary", size, lambda b=bars: calculator.get_latest_summary(b)))
+        cases.append(("_clean_dataframe", size, lambda f=full: api._clean_dataframe(f)))
+        cases.append(("to_dict", size, lambda c=cleaned: c.to_dict(orient="records")))
+        compact = CompactFrame.from_dataframe(full)
+        cases.append(("compact_from_dataframe", size, lambda f=full: CompactFrame.from_dataframe(f)))
+        cases.append(("compact_to_records", size, lambda c=compact: c.to_records()))
+        cases.append(("indicator_sweep", size, lambda b=bars: sweep.run(b, **grid)))
+
+    # name_to_code 与数据量无关：直接命中 / 模糊匹配 / 未命中
+    for label, name in (("exact", "贵州茅台"), ("fuzzy", "宁德"), ("miss", "不存在的股票")):
+        cases.append((f"name_to_code_{label}", 0, lambda n=name: converter.name_to_code(n)))
+
+    return cases
+
+
+def run_benchmarks(sizes=None, name_filter=None, min_time=0.2, repeat=5):
+    """运行基准，返回可写入JSON的结果字典"""
+    sizes = sizes or DEFAULT_SIZES
+    results = {}
+
+    for name, size, func in build_cases(sizes):
+        key = f"{name}[{size}]"
+        if name_filter and name_filter not in key:
+            continue
+
+        with _quiet():
+            func()  # 预热
+            samples = _time_call(func, min_time=min_time, repeat=repeat)
+
+        results[key] = {
+            "name": name,
+            "size": size,
+            "min_us": min(samples) * 1e6,
+            "median_us": statistics.median(samples) * 1e6,
+        }
+        print(f"  {key:40} {results[key]['median_us']:12.1f} µs")
+
+    return {
+        "metadata": {
+            "created": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sizes,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """
+    对比两次基准结果
+    Returns:
+        变慢超过阈值的用例列表 [(key, baseline_us, current_us, ratio)]
+    """
+    regressions = []
+    print(f"\n{'用例':40} {'基线(µs)':>12} {'当前(µs)':>12} {'变化':>8}")
+
+    for key, cur in current["results"].items():
+        base = baseline["results"].get(key)
+        if base is None:
+            print(f"{key:40} {'-':>12} {cur['min_us']:12.1f}      新增")
+            continue
+
+        # 用最小值对比，受系统噪声影响最小
+        ratio = cur["min_us"] / base["min_us"] if base["min_us"] > 0 else 1.0
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  ⚠️ 变慢"
+            regressions.append((key, base["min_us"], cur["min_us"], ratio))
+        print(f"{key:40} {base['min_us']:12.1f} {cur['min_us']:12.1f} {ratio - 1:+7.1%}{flag}")
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="股票数据API微基准测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    for command in ("run", "compare"):
+        p = sub.add_parser(command)
+        p.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="K线数量")
+        p.add_argument("--filter", default=None, help="只运行名称包含该字符串的用例")
+        p.add_argument("--min-time", type=float, default=0.2, help="每个用例的最少计时秒数")
+        p.add_argument("--repeat", type=int, default=5, help="计时轮数")
+        if command == "run":
+            p.add_argument("--output", default="bench_baseline.json", help="结果输出文件")
+        else:
+            p.add_argument("baseline", help="基线JSON文件")
+            p.add_argument("--threshold", type=float, default=0.15, help="允许的变慢比例，默认15%%")
+            p.add_argument("--output", default=None, help="同时保存本次结果")
+
+    args = parser.parse_args(argv)
+
+    print(f"运行基准测试，数据量: {args.sizes}")
+    current = run_benchmarks(args.sizes, args.filter, args.min_time, args.repeat)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+    if args.command == "compare":
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} 个用例变慢超过 {args.threshold:.0%}")
+            return 1
+        print("\n没有发现性能回退")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
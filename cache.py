@@ -0,0 +1,89 @@
+# cache.py - 带容量上限和过期时间的LRU缓存
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    线程安全的LRU缓存
+    - maxsize: 最大条目数，超出后淘汰最久未使用的条目
+    - ttl: 过期时间（秒），0或None表示永不过期
+    同时统计命中、未命中和淘汰次数
+    """
+
+    def __init__(self, maxsize=512, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl or None
+        self._data = OrderedDict()  # key -> (过期时间戳, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, expires_at):
+        return expires_at is not None and expires_at < time.monotonic()
+
+    def get(self, key, default=None):
+        """读取缓存，命中时将条目移到最近使用的位置"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or self._expired(item[0]):
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, ttl=None):
+        """
+        写入缓存，超出容量时淘汰最久未使用的条目
+        Args:
+            ttl: 本条目的有效秒数，默认使用缓存的 ttl（从其他缓存层回填时传入剩余有效期）
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_stale(self, key):
+        """
+        读取缓存，过期的条目也返回（请求超时时使用）
+        Returns:
+            (value, 已过期秒数)；过期时间为0表示未过期，不存在时返回None
+        """
+        with self._lock:
+            item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        return value, max(time.monotonic() - expires_at, 0.0) if expires_at is not None else 0.0
+
+    def __contains__(self, key):
+        """判断key是否存在且未过期（不计入命中统计）"""
+        with self._lock:
+            item = self._data.get(key)
+            return item is not None and not self._expired(item[0])
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """返回缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0
+        }
@@ -0,0 +1,229 @@
+# compact.py - 缓存使用的紧凑列式数据结构
+"""
+缓存原先保存的是完整的JSON结构：每行一个dict、Python float、字符串日期，且OHLCV在
+data 和 indicators 中各存一份，比原始数据大一到两个数量级。
+
+CompactFrame 按列保存同样的数据：
+- 日期: int32 天数（距1970-01-01）；分钟级K线使用 int64 分钟数
+- 价格和指标: float64（与原输出逐位一致）
+- 成交量: int64
+- 布尔信号: 每列按位压缩为 uint8
+只在响应时才渲染为JSON结构（to_records），渲染同时完成 NaN/Infinity -> None 的清理。
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+# 列类型
+DATE, FLOAT, INT, FLAG = "date", "float", "int", "flag"
+
+
+def _encode_dates(strings):
+    """
+    日期字符串 -> (整数数组, 单位)
+    依次尝试按天、按分钟解析，只有能无损还原为原字符串时才使用整数存储，否则保留原字符串
+    """
+    for unit, dtype in (("D", np.int32), ("m", np.int64)):
+        try:
+            parsed = np.asarray(strings, dtype=f"datetime64[{unit}]")
+        except ValueError:
+            continue
+        encoded = parsed.astype(np.int64).astype(dtype)
+        if _decode_dates(encoded, unit) == strings.tolist():
+            return encoded, unit
+    return strings.astype(object), None
+
+
+def _decode_dates(encoded, unit):
+    if unit is None:
+        return encoded.tolist()
+    text = np.datetime_as_string(encoded.astype(f"datetime64[{unit}]"), unit=unit)
+    if unit != "D":
+        text = np.char.replace(text, "T", " ")
+    return text.tolist()
+
+
+def finite_list(values):
+    """float数组（任意维度）转list，NaN和无穷大替换为None"""
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        # 一维（渲染的热点路径）：NaN通常很少，逐个替换比转object数组快
+        result = values.tolist()
+        for i in np.flatnonzero(~np.isfinite(values)).tolist():
+            result[i] = None
+        return result
+    result = values.astype(object)
+    result[~np.isfinite(values)] = None
+    return result.tolist()
+
+
+def clean_value(value):
+    """递归地把numpy标量转为Python类型，NaN和无穷大转为None（用于字典/标量）"""
+    if isinstance(value, dict):
+        return {key: clean_value(item) for key, item in value.items()}
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class CompactFrame:
+    """DataFrame 的紧凑列式表示（只读）"""
+
+    __slots__ = ("length", "columns", "kinds", "dates", "date_unit", "floats", "ints", "flags", "_index")
+
+    def __init__(self, length, columns, kinds, dates, date_unit, floats, ints, flags):
+        self.length = length
+        self.columns = columns
+        self.kinds = kinds
+        self.dates = dates
+        self.date_unit = date_unit
+        self.floats = floats
+        self.ints = ints
+        self.flags = flags
+        self._build_index()
+
+    def _build_index(self):
+        # 列名 -> 所在存储块中的位置
+        counters = {DATE: 0, FLOAT: 0, INT: 0, FLAG: 0}
+        index = {}
+        for name, kind in zip(self.columns, self.kinds):
+            index[name] = counters[kind]
+            counters[kind] += 1
+        self._index = index
+
+    def __getstate__(self):
+        return (self.length, self.columns, self.kinds, self.dates, self.date_unit,
+                self.floats, self.ints, self.flags)
+
+    def __setstate__(self, state):
+        (self.length, self.columns, self.kinds, self.dates, self.date_unit,
+         self.floats, self.ints, self.flags) = state
+        self._build_index()
+
+    @classmethod
+    def from_dataframe(cls, df):
+        length = len(df)
+        columns, kinds = [], []
+        dates, date_unit, floats, ints, flags = None, None, [], [], []
+
+        for name in df.columns:
+            series = df[name]
+            dtype = series.dtype
+            if name == "date":
+                dates, date_unit = _encode_dates(series.astype(str).to_numpy(dtype=str))
+                kind = DATE
+            elif dtype == bool:
+                flags.append(np.packbits(series.to_numpy(dtype=bool)))
+                kind = FLAG
+            elif np.issubdtype(dtype, np.integer):
+                ints.append(series.to_numpy(dtype=np.int64))
+                kind = INT
+            else:
+                floats.append(series.to_numpy(dtype=np.float64))
+                kind = FLOAT
+            columns.append(name)
+            kinds.append(kind)
+
+        return cls(
+            length,
+            tuple(columns),
+            tuple(kinds),
+            dates,
+            date_unit,
+            np.vstack(floats) if floats else np.empty((0, length)),
+            np.vstack(ints) if ints else np.empty((0, length), dtype=np.int64),
+            np.vstack(flags) if flags else np.empty((0, 0), dtype=np.uint8),
+        )
+
+    def column(self, name):
+        """返回某一列的numpy数组"""
+        kind = self.kinds[self.columns.index(name)]
+        i = self._index[name]
+        if kind == DATE:
+            if self.date_unit is None:
+                return self.dates
+            return self.dates.astype(f"datetime64[{self.date_unit}]")
+        if kind == FLOAT:
+            return self.floats[i]
+        if kind == INT:
+            return self.ints[i]
+        return np.unpackbits(self.flags[i], count=self.length).astype(bool)
+
+    def _column_list(self, name, kind):
+        i = self._index[name]
+        if kind == DATE:
+            return _decode_dates(self.dates, self.date_unit)
+        if kind == FLOAT:
+            return finite_list(self.floats[i])
+        if kind == INT:
+            return self.ints[i].tolist()
+        return np.unpackbits(self.flags[i], count=self.length).astype(bool).tolist()
+
+    def to_dataframe(self):
+        """还原为 DataFrame（日期为字符串，信号列为bool）"""
+        kinds = dict(zip(self.columns, self.kinds))
+        data = {}
+        for name in self.columns:
+            kind = kinds[name]
+            if kind == DATE:
+                data[name] = _decode_dates(self.dates, self.date_unit)
+            elif kind == FLAG:
+                data[name] = self.column(name)
+            else:
+                data[name] = (self.floats if kind == FLOAT else self.ints)[self._index[name]]
+        return pd.DataFrame(data, columns=list(self.columns))
+
+    def to_records(self, columns=None):
+        """渲染为 [{列名: 值}] 列表，与 DataFrame.to_dict(orient='records') 的结果一致"""
+        names = [c for c in self.columns if columns is None or c in columns]
+        kinds = dict(zip(self.columns, self.kinds))
+        values = [self._column_list(name, kinds[name]) for name in names]
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.dates, self.floats, self.ints, self.flags) if a is not None)
+
+
+class CompactResult:
+    """
+    get_stock_data 的缓存结果
+    K线列和指标列只保存一份，data 在渲染时从同一个 CompactFrame 中选出OHLCV列
+    """
+
+    __slots__ = ("stock_name", "stock_code", "frame", "data_columns", "summary", "metadata")
+
+    def __init__(self, stock_name, stock_code, frame, data_columns, summary, metadata):
+        self.stock_name = stock_name
+        self.stock_code = stock_code
+        self.frame = frame
+        self.data_columns = data_columns
+        self.summary = summary
+        self.metadata = metadata
+
+    def __getstate__(self):
+        return (self.stock_name, self.stock_code, self.frame, self.data_columns, self.summary, self.metadata)
+
+    def __setstate__(self, state):
+        (self.stock_name, self.stock_code, self.frame,
+         self.data_columns, self.summary, self.metadata) = state
+
+    def render(self, data_frame=None, indicator_frame=None):
+        """
+        渲染为接口返回的JSON结构
+        Args:
+            data_frame / indicator_frame: 替代 self.frame 渲染 data / indicators 的 CompactFrame（降采样时使用）
+        """
+        return {
+            "success": True,
+            "stock_name": self.stock_name,
+            "message": "获取数据成功",
+            "data": (data_frame or self.frame).to_records(self.data_columns),
+            "indicators": (indicator_frame or self.frame).to_records(),
+            "summary": self.summary,
+            "metadata": self.metadata,
+            "stock_code": self.stock_code,
+        }
@@ -0,0 +1,207 @@
+# compression.py - 响应压缩中间件（gzip / brotli / zstd 协商）
+"""
+/api/stock/{name}?days=100 的响应是约30列 x 100行、重复度很高的JSON，原先不压缩直接返回。
+
+compression_middleware 根据请求的 Accept-Encoding 协商压缩算法：
+- 服务端偏好 zstd > br > gzip（客户端指定了 q 值时先按 q 值选择）；brotli / zstandard 未安装时只使用可用的算法
+- 小于 STOCK_API_COMPRESS_MIN_SIZE 字节（默认1024）的响应、流式响应（SSE）和已编码的响应不压缩
+- 压缩级别按路由选择：/simple 这类小响应用最快的级别，可缓存的K线数据用高压缩比
+- 大于 STOCK_API_COMPRESS_THREAD_SIZE 字节（默认64KB）的响应在线程池中压缩，不阻塞事件循环
+- 可缓存的响应（Cache-Control 为 public / max-age 且不含 no-store / private）按
+  (算法, 级别, 内容摘要) 缓存压缩结果，热门股票重复请求时不会重复压缩
+
+用法: app.middleware("http")(compression_middleware)
+"""
+import gzip
+import hashlib
+import os
+import re
+
+from fastapi import Response
+from fastapi.concurrency import run_in_threadpool
+
+from cache import LRUCache
+from metrics import COMPRESSED_RESPONSES, COMPRESSION_BYTES, time_stage
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# 各级别在不同算法下的压缩参数
+LEVELS = {
+    "fast": {"gzip": 1, "br": 1, "zstd": 1},
+    "default": {"gzip": 6, "br": 5, "zstd": 3},
+    "best": {"gzip": 9, "br": 9, "zstd": 12},
+}
+
+# 路由 -> 压缩级别，按顺序匹配，未匹配的路由使用 default
+ROUTE_LEVELS = (
+    (re.compile(r"^/api/stock/[^/]+/simple$"), "fast"),
+    (re.compile(r"^/api/(stock/[^/]+|batch)$"), "best"),
+)
+
+# 不压缩的内容类型（流式响应需要逐条发送）
+SKIP_CONTENT_TYPES = ("text/event-stream",)
+
+MIN_SIZE = int(os.environ.get("STOCK_API_COMPRESS_MIN_SIZE", 1024))
+
+# 超过该大小的响应（多年K线）降低一级压缩级别，避免高级别压缩耗时随响应大小成倍增加
+LARGE_SIZE = 512 * 1024
+_LOWER_LEVEL = {"best": "default", "default": "fast", "fast": "fast"}
+
+# 超过该大小的响应在线程池中压缩（几MB的响应压缩要上百毫秒，期间事件循环无法处理其他请求）
+THREAD_SIZE = int(os.environ.get("STOCK_API_COMPRESS_THREAD_SIZE", 64 * 1024))
+
+# 压缩结果缓存
+_compressed_cache = LRUCache(maxsize=int(os.environ.get("STOCK_API_COMPRESS_CACHE", 256)))
+
+
+def _compress_gzip(body, level):
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def _compress_br(body, level):
+    return brotli.compress(body, quality=level)
+
+
+def _compress_zstd(body, level):
+    return zstandard.ZstdCompressor(level=level).compress(body)
+
+
+# 服务端偏好顺序
+COMPRESSORS = {}
+if zstandard is not None:
+    COMPRESSORS["zstd"] = _compress_zstd
+if brotli is not None:
+    COMPRESSORS["br"] = _compress_br
+COMPRESSORS["gzip"] = _compress_gzip
+
+
+def negotiate(accept_encoding):
+    """
+    根据 Accept-Encoding 选择压缩算法
+    Returns:
+        "zstd" / "br" / "gzip"，客户端不接受任何可用算法时返回None
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name] = q
+
+    wildcard = weights.get("*")
+    best, best_q = None, 0.0
+    for encoding in COMPRESSORS:
+        q = weights.get(encoding, wildcard if wildcard is not None else 0.0)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def route_level(path):
+    """路由对应的压缩级别"""
+    for pattern, level in ROUTE_LEVELS:
+        if pattern.match(path):
+            return level
+    return "default"
+
+
+def is_cacheable(headers):
+    """响应是否可以被共享缓存（据此决定是否缓存压缩结果）"""
+    value = headers.get("cache-control", "")
+    if not value or "no-store" in value or "private" in value or "no-cache" in value:
+        return False
+    return "public" in value or "max-age" in value
+
+
+def compress(body, encoding, level, cacheable=False):
+    """
+    压缩响应体
+    Returns:
+        (压缩后的字节, 是否命中压缩缓存)
+    """
+    if len(body) > LARGE_SIZE:
+        level = _LOWER_LEVEL[level]
+    params = LEVELS[level][encoding]
+    key = None
+    if cacheable:
+        key = (encoding, params, hashlib.blake2b(body, digest_size=16).digest())
+        cached = _compressed_cache.get(key)
+        if cached is not None:
+            return cached, True
+
+    compressed = COMPRESSORS[encoding](body, params)
+    if key is not None:
+        _compressed_cache.set(key, compressed)
+    return compressed, False
+
+
+async def compression_middleware(request, call_next):
+    """FastAPI HTTP中间件：按 Accept-Encoding 压缩响应"""
+    response = await call_next(request)
+
+    headers = response.headers
+    content_length = headers.get("content-length")
+    if (content_length is None or int(content_length) < MIN_SIZE
+            or "content-encoding" in headers
+            or headers.get("content-type", "").startswith(SKIP_CONTENT_TYPES)):
+        return response
+
+    vary = headers.get("vary")
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    if encoding is None:
+        response.headers["Vary"] = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    args = (body, encoding, route_level(request.url.path), is_cacheable(headers))
+    with time_stage("compress"):
+        if len(body) > THREAD_SIZE:
+            compressed, hit = await run_in_threadpool(compress, *args)
+        else:
+            compressed, hit = compress(*args)
+    COMPRESSED_RESPONSES.inc(encoding=encoding, cache="hit" if hit else "miss")
+    COMPRESSION_BYTES.inc(len(body), direction="in")
+    COMPRESSION_BYTES.inc(len(compressed), direction="out")
+
+    new_headers = {key: value for key, value in headers.items() if key != "content-length"}
+    new_headers["content-encoding"] = encoding
+    new_headers["vary"] = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+    return Response(content=compressed, status_code=response.status_code, headers=new_headers,
+                    background=response.background)
+
+
+# 测试代码
+if __name__ == "__main__":
+    import json
+    import time
+
+    from stock_api import StockDataAPI
+
+    os.environ.setdefault("STOCK_API_OFFLINE", "1")
+    body = json.dumps(StockDataAPI().get_stock_data("贵州茅台", 100), ensure_ascii=False).encode()
+    print(f"原始大小: {len(body)} 字节，可用算法: {', '.join(COMPRESSORS)}")
+    for encoding in COMPRESSORS:
+        for level in LEVELS:
+            start = time.perf_counter()
+            compressed, _ = compress(body, encoding, level)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"{encoding:5s} {level:8s}: {len(compressed):7d} 字节 "
+                  f"({len(compressed) / len(body):.1%}), {elapsed:.2f}ms")
+    print("协商:", negotiate("gzip, deflate, br;q=0.9, zstd;q=0.8"))
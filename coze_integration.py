@@ -1,14 +1,99 @@
 # coze_integration.py - 扣子平台调用示例
 
-import requests
-import json
+from stock_client import StockClient, StockAPIError
+
+
+def overall_signal(summary):
+    """
+    根据摘要中的均线、RSI、MACD、KDJ状态给出综合信号
+    Returns:
+        "bullish" / "bearish" / "neutral"
+    """
+    score = 0
+    above_ma20 = summary.get("moving_averages", {}).get("above_MA20")
+    if above_ma20 is not None:
+        score += 1 if above_ma20 else -1
+    score += {"金叉看多": 1, "死叉看空": -1}.get(summary.get("macd", {}).get("signal_text"), 0)
+    # 超卖视为反弹机会，超买视为回调风险
+    score += {"超卖": 1, "超买": -1}.get(summary.get("rsi", {}).get("status"), 0)
+    score += {"超卖": 1, "超买": -1}.get(summary.get("kdj", {}).get("status"), 0)
+    if score >= 2:
+        return "bullish"
+    if score <= -2:
+        return "bearish"
+    return "neutral"
+
+
+def format_report(stock_name, data):
+    """把 /api/stock 的结果格式化为适合在聊天中显示的文本"""
+    summary = data.get("summary") or {}
+
+    result = f"📊 **{stock_name}** 股票分析报告\n"
+    result += "=" * 40 + "\n"
+
+    price_info = summary.get("price", {})
+    if price_info:
+        result += f"💰 当前价格: {price_info.get('close', 'N/A')}\n"
+        if price_info.get('change') is not None:
+            change = price_info['change']
+            change_icon = "📈" if change > 0 else "📉"
+            result += f"{change_icon} 涨跌幅: {change:.2f}%\n"
+
+    result += "\n📈 技术指标:\n"
+
+    rsi = summary.get("rsi", {}).get("value")
+    if rsi is not None:
+        rsi_status = ""
+        if rsi > 70:
+            rsi_status = " (超买⚠️)"
+        elif rsi < 30:
+            rsi_status = " (超卖⚠️)"
+        result += f"  • RSI: {rsi:.2f}{rsi_status}\n"
+
+    above_ma20 = summary.get("moving_averages", {}).get("above_MA20")
+    if above_ma20 is not None:
+        if above_ma20:
+            result += "  • 股价在20日均线之上 ✅\n"
+        else:
+            result += "  • 股价在20日均线之下 ⚠️\n"
+
+    macd = summary.get("macd", {})
+    if macd.get("value") is not None and macd.get("signal") is not None:
+        if macd["value"] > macd["signal"]:
+            result += "  • MACD在信号线之上，偏多 ✅\n"
+        else:
+            result += "  • MACD在信号线之下，偏空 ⚠️\n"
+        if macd.get("signal_text") in ("金叉看多", "死叉看空"):
+            result += f"  • 今日MACD{macd['signal_text']}\n"
+
+    kdj = summary.get("kdj", {})
+    if kdj.get("K") is not None:
+        result += f"  • KDJ: K={kdj['K']:.2f} D={kdj['D']:.2f} J={kdj['J']:.2f} ({kdj.get('status', '正常')})\n"
+
+    result += "\n🎯 综合信号:\n"
+    signal = overall_signal(summary)
+    if signal == "bullish":
+        result += "  • 总体看涨信号较强 🚀\n"
+    elif signal == "bearish":
+        result += "  • 总体看跌信号较强 ⚠️\n"
+    else:
+        result += "  • 中性信号 ↔️\n"
+
+    # 添加数据来源
+    metadata = data.get("metadata") or {}
+    date_range = metadata.get("date_range", {})
+    result += f"\n📅 数据期间: {date_range.get('start', '')} 至 {date_range.get('end', '')}\n"
+    result += f"📊 数据条数: {metadata.get('days', 0)} 条\n"
+
+    return result
 
 
 class CozeStockAPI:
-    """扣子平台调用股票API的示例"""
+    """扣子平台调用股票API的示例（通过 StockClient 复用连接、重试和缓存）"""
 
-    def __init__(self, base_url="http://localhost:8000"):
+    def __init__(self, base_url="http://localhost:8000", client=None):
         self.base_url = base_url
+        self.client = client or StockClient(base_url)
 
     def get_stock_for_coze(self, stock_name, days=30):
         """
@@ -16,75 +101,32 @@ class CozeStockAPI:
         返回格式化的文本，适合在聊天中显示
         """
         try:
-            # 调用自己的API
-            url = f"{self.base_url}/api/stock/{stock_name}"
-            params = {"days": days}
-
-            response = requests.get(url, params=params)
-            data = response.json()
-
-            if not data.get("success", False):
-                return f"获取 {stock_name} 数据失败：{data.get('message', '未知错误')}"
-
-            summary = data.get("summary", {})
-
-            # 构建适合在聊天中显示的文本
-            result = f"📊 **{stock_name}** 股票分析报告\n"
-            result += "=" * 40 + "\n"
-
-            if "price" in summary:
-                price_info = summary["price"]
-                result += f"💰 当前价格: {price_info.get('close', 'N/A')}\n"
-                if price_info.get('change'):
-                    change = price_info['change']
-                    change_icon = "📈" if change > 0 else "📉"
-                    result += f"{change_icon} 涨跌幅: {change:.2f}%\n"
-
-            result += "\n📈 技术指标:\n"
-
-            if "rsi_status" in summary and summary["rsi_status"].get("RSI"):
-                rsi = summary["rsi_status"]["RSI"]
-                rsi_status = ""
-                if rsi > 70:
-                    rsi_status = " (超买⚠️)"
-                elif rsi < 30:
-                    rsi_status = " (超卖⚠️)"
-                result += f"  • RSI: {rsi:.2f}{rsi_status}\n"
-
-            if "ma_status" in summary:
-                ma = summary["ma_status"]
-                if ma.get("above_MA20"):
-                    result += f"  • 股价在20日均线之上 ✅\n"
-                else:
-                    result += f"  • 股价在20日均线之下 ⚠️\n"
-
-            if "macd_status" in summary and summary["macd_status"].get("MACD"):
-                macd = summary["macd_status"]["MACD"]
-                signal = summary["macd_status"].get("signal", 0)
-                if macd > signal:
-                    result += f"  • MACD金叉看多 ✅\n"
-                else:
-                    result += f"  • MACD死叉看空 ⚠️\n"
-
-            result += "\n🎯 综合信号:\n"
-            if "signals" in summary:
-                signals = summary["signals"]
-                if signals.get("bullish"):
-                    result += "  • 总体看涨信号较强 🚀\n"
-                elif signals.get("bearish"):
-                    result += "  • 总体看跌信号较强 ⚠️\n"
-                else:
-                    result += "  • 中性信号 ↔️\n"
-
-            # 添加数据来源
-            result += f"\n📅 数据期间: {data.get('metadata', {}).get('date_range', {}).get('start', '')} 至 "
-            result += f"{data.get('metadata', {}).get('date_range', {}).get('end', '')}\n"
-            result += f"📊 数据条数: {data.get('metadata', {}).get('days', 0)} 条\n"
-
-            return result
-
+            data = self.client.get_stock(stock_name, days=days)
+        except StockAPIError as e:
+            return f"获取 {stock_name} 数据失败：{e.message}"
         except Exception as e:
             return f"调用API失败：{str(e)}"
+        return format_report(stock_name, data)
+
+    def get_stocks_for_coze(self, stock_names, days=30):
+        """
+        一次请求获取多只股票（只取摘要），返回每只股票的报告文本
+        Returns:
+            {股票名称: 文本}
+        """
+        try:
+            results = self.client.get_many(stock_names, days=days, summary_only=True)
+        except Exception as e:
+            return {name: f"调用API失败：{str(e)}" for name in stock_names}
+
+        reports = {}
+        for name in stock_names:
+            data = results.get(name, {})
+            if data.get("success"):
+                reports[name] = format_report(name, data)
+            else:
+                reports[name] = f"获取 {name} 数据失败：{data.get('message', '未知错误')}"
+        return reports
 
 
 # 测试代码
@@ -101,4 +143,8 @@ if __name__ == "__main__":
         print("=" * 60)
 
         result = coze_api.get_stock_for_coze(stock, days=20)
-        print(result)
\ No newline at end of file
+        print(result)
+
+    # 批量获取（一次请求）
+    for stock, report in coze_api.get_stocks_for_coze(test_stocks, days=20).items():
+        print(report)
\ No newline at end of file
@@ -0,0 +1,202 @@
+# cross_section.py - 横截面分析：涨跌幅排名、相对强弱、相关性矩阵
+"""
+把一组股票的收盘价按日期对齐成一个矩阵（行=日期，列=股票），所有统计量都在这个矩阵上
+一次向量化计算，不需要逐只股票调用 /api/stock 再在客户端两两计算。
+
+- 停牌/节假日不同导致的缺失值用前值填充；上市较晚的股票在此之前保持NaN
+- N日涨跌幅: close[-1] / close[-1-N] - 1
+- 相对强弱排名: 每个周期的涨跌幅在股票池内的百分位（0-100，越大越强），再取平均
+- 相关/协方差矩阵: 最近 window 个交易日的日收益率
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from compact import finite_list
+
+# 默认计算的涨跌幅周期（交易日）
+DEFAULT_PERIODS = (1, 5, 20)
+
+MATRIX_KINDS = ("corr", "cov", "none")
+
+
+def align_frames(frames, columns):
+    """
+    按日期对齐多只股票的若干列
+    Args:
+        frames: {symbol: 包含 date 和 columns 的DataFrame}
+        columns: 需要对齐的列
+    Returns:
+        (日期数组, 股票列表, {列名: 矩阵[日期, 股票]})，缺失位置为NaN
+    """
+    frames = {symbol: df for symbol, df in frames.items() if df is not None and len(df) > 0}
+    if not frames:
+        return np.array([]), [], {col: np.empty((0, 0)) for col in columns}
+
+    symbols = list(frames)
+    dates = [df["date"].to_numpy().astype(str) for df in frames.values()]
+    all_dates = np.unique(np.concatenate(dates))
+
+    # 所有股票的 (日期下标, 股票下标) 拼接后，每列只做一次散列赋值
+    rows = np.searchsorted(all_dates, np.concatenate(dates))
+    cols = np.repeat(np.arange(len(symbols)), [len(d) for d in dates])
+
+    columns = list(columns)
+    values = np.concatenate([_select(df, columns) for df in frames.values()])
+    matrices = {}
+    for k, col in enumerate(columns):
+        matrix = np.full((len(all_dates), len(symbols)), np.nan)
+        matrix[rows, cols] = values[:, k]
+        matrices[col] = matrix
+    return all_dates, symbols, matrices
+
+
+def _select(df, columns):
+    """取出若干列为 float64 矩阵[行, 列]，不存在的列为NaN"""
+    present = [col for col in columns if col in df.columns]
+    if len(present) == len(columns):
+        return df[columns].to_numpy(dtype=np.float64)
+    result = np.full((len(df), len(columns)), np.nan)
+    if present:
+        result[:, [columns.index(col) for col in present]] = df[present].to_numpy(dtype=np.float64)
+    return result
+
+
+def align_closes(frames):
+    """
+    Args:
+        frames: {symbol: 包含 date, close 的DataFrame}
+    Returns:
+        (日期数组, 股票列表, 收盘价矩阵[日期, 股票])，缺失值用前值填充
+    """
+    dates, symbols, matrices = align_frames(frames, ["close"])
+    return dates, symbols, pd.DataFrame(matrices["close"]).ffill().to_numpy()
+
+
+def period_returns(closes, period):
+    """各股票最近 period 个交易日的涨跌幅（%），数据不足时为NaN"""
+    if len(closes) <= period:
+        return np.full(closes.shape[1], np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (closes[-1] / closes[-1 - period] - 1) * 100
+
+
+def percentile_rank(values):
+    """横截面百分位排名（0-100），NaN不参与排名"""
+    ranks = np.full(len(values), np.nan)
+    valid = np.flatnonzero(np.isfinite(values))
+    if len(valid) == 1:
+        ranks[valid] = 100.0
+    elif len(valid) > 1:
+        order = np.argsort(values[valid], kind="stable")
+        ranks[valid[order]] = np.arange(len(valid)) / (len(valid) - 1) * 100
+    return ranks
+
+
+def return_matrix(closes, window, kind="corr"):
+    """
+    最近 window 个交易日日收益率的相关系数或协方差矩阵
+    只使用所有股票都有数据的交易日
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = closes[1:] / closes[:-1] - 1
+    returns = returns[np.isfinite(returns).all(axis=1)][-window:]
+    n = closes.shape[1]
+    if len(returns) < 2:
+        return np.full((n, n), np.nan), len(returns)
+
+    centered = returns - returns.mean(axis=0)
+    cov = centered.T @ centered / (len(returns) - 1)
+    if kind == "cov":
+        return cov, len(returns)
+    std = np.sqrt(np.diag(cov))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = cov / np.outer(std, std)
+    return corr, len(returns)
+
+
+def cross_section(frames, codes=None, periods=DEFAULT_PERIODS, sort_by=None, top=None,
+                  window=20, matrix="corr"):
+    """
+    计算横截面统计
+    Args:
+        frames: {symbol: K线DataFrame}
+        codes: {symbol: 股票代码}
+        periods: 涨跌幅周期
+        sort_by: 排序列（price_change_{N}d 或 rs_rank），默认 rs_rank
+        top: 只返回排名前 top 的股票
+        window: 相关/协方差矩阵使用的交易日数
+        matrix: corr / cov / none
+    Returns:
+        结果字典
+    """
+    if matrix not in MATRIX_KINDS:
+        raise ValueError(f"不支持的矩阵类型: {matrix}，可选: {', '.join(MATRIX_KINDS)}")
+    columns = [f"price_change_{p}d" for p in periods]
+    sort_by = sort_by or "rs_rank"
+    if sort_by not in columns + ["rs_rank"]:
+        raise ValueError(f"不支持的排序列: {sort_by}，可选: {', '.join(columns + ['rs_rank'])}")
+
+    dates, symbols, closes = align_closes(frames)
+    codes = codes or {}
+
+    changes = np.vstack([period_returns(closes, p) for p in periods]) if symbols else np.empty((len(periods), 0))
+    ranks = np.vstack([percentile_rank(row) for row in changes]) if symbols else changes
+    with warnings.catch_warnings():
+        # 所有周期都缺失时 nanmean 返回NaN并发出RuntimeWarning
+        warnings.simplefilter("ignore", RuntimeWarning)
+        rs_rank = np.nanmean(ranks, axis=0) if symbols else np.array([])
+
+    table = dict(zip(columns, changes))
+    table["rs_rank"] = rs_rank
+    keys = table[sort_by]
+    order = np.argsort(np.where(np.isfinite(keys), -keys, np.inf), kind="stable")
+    if top:
+        order = order[:top]
+
+    last_close = closes[-1] if len(closes) else np.full(len(symbols), np.nan)
+    rankings = []
+    for rank, i in enumerate(order.tolist(), start=1):
+        row = {"rank": rank, "stock_name": symbols[i], "stock_code": codes.get(symbols[i]),
+               "close": finite_list([last_close[i]])[0]}
+        for col in columns + ["rs_rank"]:
+            row[col] = finite_list([table[col][i]])[0]
+        rankings.append(row)
+
+    result = {
+        "success": True,
+        "symbols": len(symbols),
+        "date_range": {
+            "start": str(dates[0]) if len(dates) else None,
+            "end": str(dates[-1]) if len(dates) else None
+        },
+        "sort_by": sort_by,
+        "rankings": rankings,
+    }
+    if matrix != "none" and symbols:
+        values, used = return_matrix(closes, window, matrix)
+        result["matrix"] = {
+            "kind": matrix,
+            "window": used,
+            "symbols": symbols,
+            "values": finite_list(values)
+        }
+    return result
+
+
+# 测试代码
+if __name__ == "__main__":
+    import time
+
+    from synthetic_market import SyntheticMarket
+
+    market = SyntheticMarket(seed=3)
+    frames = {f"SYM{i:03d}": market.generate(f"SYM{i:03d}", 250) for i in range(500)}
+
+    start = time.perf_counter()
+    result = cross_section(frames, top=5, sort_by="price_change_5d", window=60)
+    print(f"500只股票横截面统计: {(time.perf_counter() - start) * 1000:.1f}ms")
+    for row in result["rankings"]:
+        print(row)
+    print("相关矩阵:", len(result["matrix"]["values"]), "x", len(result["matrix"]["values"][0]))
@@ -0,0 +1,134 @@
+# deadline.py - 请求时间预算：超时后返回过期缓存或部分结果，而不是等待上游
+"""
+一次很慢的 yfinance 调用原先会一直占住请求，直到被 Vercel 的 maxDuration（10秒）强制结束。
+
+每个请求在入口创建一个 Deadline（预算由 STOCK_API_REQUEST_BUDGET 配置，默认8秒，0表示不限制），
+传给 StockDataAPI.get_stock_data / get_stock_summary / get_multiple_stocks：
+- 获取和计算放到后台线程执行，请求线程最多等待剩余预算（run_with_deadline）
+- 预算只限制等待：后台任务不接收 Deadline，上游请求使用自己的超时（kline_fetcher.UPSTREAM_TIMEOUT），
+  请求放弃等待后仍会执行完并写入缓存，下一次请求即可命中
+- 超时时 get_stock_data 返回过期的缓存结果（metadata.stale），批量接口返回已完成的部分结果
+- 指定 key 的任务按 (func, key) 合并：同一份数据的后台任务还在执行时，后到的请求等待同一个任务，
+  不会每次超时都再启动一份获取和计算
+- 等待会阻塞调用线程，路由需要是同步函数（def，由线程池执行），不能在事件循环中直接调用
+
+尾延迟因此由配置决定，而不取决于上游的响应速度。
+"""
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from metrics import DEADLINE_EXCEEDED
+
+# 默认请求预算（秒），低于 Vercel 的 maxDuration 以留出渲染和返回的时间
+DEFAULT_BUDGET = float(os.environ.get("STOCK_API_REQUEST_BUDGET", 8))
+
+# 执行带预算任务的线程池（超时的任务会继续占用线程直到上游返回）
+_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("STOCK_API_DEADLINE_WORKERS", 16)),
+                               thread_name_prefix="deadline")
+
+# 正在执行的任务：(func, key) -> Future，任务完成后移除
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class DeadlineExceeded(TimeoutError):
+    """请求预算已用尽"""
+
+
+class Deadline:
+    """请求的截止时间（基于 time.monotonic）"""
+
+    __slots__ = ("budget", "expires_at")
+
+    def __init__(self, budget):
+        """
+        Args:
+            budget: 从现在开始的预算（秒）
+        """
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self):
+        """剩余秒数（不小于0）"""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+    def check(self):
+        """预算已用尽时抛出 DeadlineExceeded"""
+        if self.expired:
+            raise DeadlineExceeded(f"超过请求时间预算 {self.budget:g} 秒")
+
+    def __repr__(self):
+        return f"Deadline(budget={self.budget:g}, remaining={self.remaining():.3f})"
+
+
+def request_deadline(budget=None):
+    """
+    为一次请求创建 Deadline
+    Args:
+        budget: 预算秒数，默认读取 STOCK_API_REQUEST_BUDGET
+    Returns:
+        Deadline；预算为0时返回None（不限制）
+    """
+    budget = DEFAULT_BUDGET if budget is None else budget
+    return Deadline(budget) if budget > 0 else None
+
+
+def _submit(func, key, args, kwargs):
+    """提交后台任务；(func, key) 相同的任务仍在执行时返回它的 Future，不重复提交"""
+    inflight_key = (func, key) if key is not None else None
+    with _inflight_lock:
+        future = _inflight.get(inflight_key) if inflight_key is not None else None
+        if future is not None:
+            return future
+        # 复制上下文，后台线程中的请求ID和阶段耗时仍归属（第一个）发起的请求
+        context = contextvars.copy_context()
+        future = _executor.submit(context.run, func, *args, **kwargs)
+        if inflight_key is not None:
+            _inflight[inflight_key] = future
+
+    if inflight_key is not None:
+        future.add_done_callback(lambda done: _forget(inflight_key, done))
+    return future
+
+
+def _forget(inflight_key, future):
+    with _inflight_lock:
+        if _inflight.get(inflight_key) is future:
+            del _inflight[inflight_key]
+
+
+def run_with_deadline(deadline, func, *args, key=None, **kwargs):
+    """
+    在后台线程执行 func，最多等待 deadline 的剩余时间（阻塞当前线程）
+    func 本身不受预算限制，超时后仍在后台执行完；deadline 为None时直接在当前线程执行
+    Args:
+        key: 任务标识（如缓存键），(func, key) 相同的任务正在执行时等待它的结果，不重复执行
+    Raises:
+        DeadlineExceeded: 预算用尽时 func 仍未完成（func 会在后台继续执行完）
+    """
+    if deadline is None:
+        return func(*args, **kwargs)
+    deadline.check()
+    future = _submit(func, key, args, kwargs)
+    try:
+        return future.result(timeout=deadline.remaining())
+    except FutureTimeout:
+        DEADLINE_EXCEEDED.inc(stage=getattr(func, "__name__", "task").lstrip("_"))
+        raise DeadlineExceeded(f"超过请求时间预算 {deadline.budget:g} 秒") from None
+
+
+# 测试代码
+if __name__ == "__main__":
+    deadline = request_deadline(0.2)
+    print(run_with_deadline(deadline, lambda: "完成"), deadline)
+    try:
+        run_with_deadline(deadline, time.sleep, 1)
+    except DeadlineExceeded as e:
+        print("超时:", e, deadline)
@@ -0,0 +1,116 @@
+# downsample.py - 服务端降采样：折线用LTTB选点，K线按桶聚合OHLC
+"""
+图表前端每个序列只需要约500个点，多年历史却会把每一根K线都发给浏览器。
+
+max_points 参数在 calculate_all 之后对结果做一次向量化降采样：
+- K线（data）: 按行数均分为 max_points 个桶，每个桶聚合为一根K线
+  （open取第一根，high取最大，low取最小，close取最后一根，volume求和，date为第一根的日期）
+- 指标（indicators）: 用 Largest-Triangle-Three-Buckets 按收盘价选出 max_points 行，
+  所有指标列取这些行的值，保留折线的形状（峰谷）而不是简单等间隔抽样
+
+标准LTTB中每个桶的三角形顶点依赖上一个桶已选出的点，只能逐桶循环；
+这里用上一个桶的平均点代替已选点，所有桶的三角形面积可以一次算出，再按桶取最大值。
+"""
+import numpy as np
+
+from compact import CompactFrame
+from resample import aggregate_ohlcv
+
+# 最少保留的点数（LTTB至少需要首尾两点和一个中间桶）
+MIN_POINTS = 3
+
+
+def bucket_starts(n, buckets):
+    """把 n 行均分为 buckets 个桶，返回每个桶第一行的下标"""
+    buckets = min(buckets, n)
+    return (np.arange(buckets) * n) // buckets
+
+
+def lttb_indices(y, n_out):
+    """
+    Largest-Triangle-Three-Buckets 选点
+    Args:
+        y: 数值数组（x 轴为行号）
+        n_out: 输出点数
+    Returns:
+        选中行的下标（升序，包含首尾两行）
+    """
+    n = len(y)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    if n_out < MIN_POINTS:
+        return np.array([0, n - 1])
+
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    x = np.arange(n, dtype=np.float64)
+
+    # 首尾两点固定，中间 1..n-2 均分为 n_out-2 个桶
+    n_buckets = n_out - 2
+    starts = 1 + (np.arange(n_buckets) * (n - 2)) // n_buckets
+    counts = np.diff(np.concatenate([starts, [n - 1]]))
+    inner_x = x[1:-1]
+    inner_y = y[1:-1]
+    offsets = starts - 1
+    avg_x = np.add.reduceat(inner_x, offsets) / counts
+    avg_y = np.add.reduceat(inner_y, offsets) / counts
+
+    # 每个桶的左顶点（上一个桶的平均点，第一个桶为首点）和右顶点（下一个桶的平均点，最后一个桶为尾点）
+    left_x = np.concatenate([[x[0]], avg_x[:-1]])
+    left_y = np.concatenate([[y[0]], avg_y[:-1]])
+    right_x = np.concatenate([avg_x[1:], [x[-1]]])
+    right_y = np.concatenate([avg_y[1:], [y[-1]]])
+
+    ax, ay = np.repeat(left_x, counts), np.repeat(left_y, counts)
+    cx, cy = np.repeat(right_x, counts), np.repeat(right_y, counts)
+    area = np.abs((ax - cx) * (inner_y - ay) - (ax - inner_x) * (cy - ay))
+
+    # 每个桶面积最大的点（并列时取第一个）
+    bucket_max = np.maximum.reduceat(area, offsets)
+    candidates = np.flatnonzero(area == np.repeat(bucket_max, counts))
+    bucket_of = np.searchsorted(offsets, candidates, side="right") - 1
+    first = candidates[np.concatenate([[True], np.diff(bucket_of) > 0])]
+    return np.concatenate([[0], first + 1, [n - 1]])
+
+
+def downsample_frame(df, max_points, kline_columns):
+    """
+    Args:
+        df: calculate_all 的结果
+        max_points: 每个序列最多的点数
+        kline_columns: K线列（date, open, high, low, close, volume）
+    Returns:
+        (聚合后的K线DataFrame, LTTB选出的指标DataFrame)
+    """
+    candles = aggregate_ohlcv(df[list(kline_columns)], bucket_starts(len(df), max_points))
+    lines = df.iloc[lttb_indices(df["close"].to_numpy(), max_points)].reset_index(drop=True)
+    return candles, lines
+
+
+def render_downsampled(compact, max_points):
+    """
+    把缓存的 CompactResult 渲染为降采样后的接口结构
+    行数不超过 max_points 时与 compact.render() 相同
+    """
+    rows = compact.frame.length
+    if rows <= max_points:
+        return compact.render()
+
+    candles, lines = downsample_frame(compact.frame.to_dataframe(), max_points, compact.data_columns)
+    result = compact.render(CompactFrame.from_dataframe(candles), CompactFrame.from_dataframe(lines))
+    result["metadata"] = {**compact.metadata, "downsampled": {"max_points": max_points, "rows": rows}}
+    return result
+
+
+# 测试代码
+if __name__ == "__main__":
+    import time
+
+    from indicators import IndicatorCalculator
+    from synthetic_market import SyntheticMarket
+
+    df = IndicatorCalculator().calculate_all(SyntheticMarket(seed=8).generate("LTTB", 5000))
+    start = time.perf_counter()
+    candles, lines = downsample_frame(df, 500, ["date", "open", "high", "low", "close", "volume"])
+    print(f"5000 -> {len(candles)} 根K线 / {len(lines)} 个指标点: {(time.perf_counter() - start) * 1000:.2f}ms")
+    assert candles["high"].max() == df["high"].max() and candles["volume"].sum() == df["volume"].sum()
+    assert lines["close"].max() == df["close"].max() or lines["close"].min() == df["close"].min()
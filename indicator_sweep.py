@@ -0,0 +1,186 @@
+# indicator_sweep.py - 参数扫描：一次计算一组周期的技术指标
+"""
+IndicatorCalculator 的周期是固定的（MA 5/10/20/60、RSI 14、MACD 12/26/9、KDJ 9/3/3）。
+尝试其他参数原先需要每组参数各调用一次 calculate_all 风格的代码。
+
+IndicatorSweep 在一次扫描中计算整组参数，共享中间结果：
+- MA: 所有窗口由同一个收盘价累加和相减得到
+- RSI: 涨跌序列只计算一次，各周期的平均涨跌同样由累加和得到
+- MACD: 所有快慢线周期去重后组成EMA组，每个周期的EMA只计算一次
+- KDJ: 同一 n 的最高/最低价只计算一次，供不同的 m1/m2 复用
+
+结果是列为 (指标, 参数, 字段) 三级索引的DataFrame，例如 result["MACD", "12/26/9"]，
+与 calculate_all 使用相同参数时的结果一致（窗口不足时同样按已有数据计算）。
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_MA_WINDOWS = (5, 10, 20, 60)
+DEFAULT_RSI_PERIODS = (14,)
+DEFAULT_MACD_VARIANTS = ((12, 26, 9),)
+DEFAULT_KDJ_VARIANTS = ((9, 3, 3),)
+
+
+def _rolling_means(values, windows):
+    """
+    用一个累加和计算多个窗口的滚动均值（与 rolling(window, min_periods=1).mean() 一致）
+    Returns:
+        矩阵[窗口, 行]
+    """
+    n = len(values)
+    csum = np.concatenate([[0.0], np.cumsum(values)])
+    end = np.arange(1, n + 1)
+    result = np.empty((len(windows), n))
+    for i, window in enumerate(windows):
+        start = np.maximum(end - window, 0)
+        result[i] = (csum[end] - csum[start]) / (end - start)
+    return result
+
+
+def _ema(values, span=None, alpha=None):
+    """指数移动平均（adjust=False）"""
+    return pd.Series(values).ewm(span=span, alpha=alpha, adjust=False).mean().to_numpy()
+
+
+class IndicatorSweep:
+    """一次计算多组参数的技术指标"""
+
+    def ma(self, df, windows=DEFAULT_MA_WINDOWS):
+        """Returns: {窗口: 均线数组}"""
+        close = df["close"].to_numpy(dtype=np.float64)
+        windows = list(windows)
+        return dict(zip(windows, _rolling_means(close, windows)))
+
+    def rsi(self, df, periods=DEFAULT_RSI_PERIODS):
+        """Returns: {周期: RSI数组}"""
+        close = df["close"].to_numpy(dtype=np.float64)
+        delta = np.diff(close, prepend=np.nan)
+        # 与 calculate_all 一致：第一根K线的涨跌按0计入窗口
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = np.where(delta < 0, -delta, 0.0)
+
+        periods = list(periods)
+        avg_gain = _rolling_means(gain, periods)
+        avg_loss = _rolling_means(loss, periods)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rs = avg_gain / avg_loss
+        rs[np.isinf(rs)] = 100  # 处理除以0的情况
+        return dict(zip(periods, 100 - 100 / (1 + rs)))
+
+    def macd(self, df, variants=DEFAULT_MACD_VARIANTS):
+        """
+        Args:
+            variants: [(fast, slow, signal)]
+        Returns:
+            {(fast, slow, signal): {"MACD", "MACD_signal", "MACD_hist"}}
+        """
+        close = df["close"].to_numpy(dtype=np.float64)
+        spans = sorted({span for fast, slow, _ in variants for span in (fast, slow)})
+        bank = {span: _ema(close, span=span) for span in spans}
+
+        lines = {}
+        result = {}
+        for fast, slow, signal in variants:
+            line = lines.get((fast, slow))
+            if line is None:
+                line = lines[(fast, slow)] = bank[fast] - bank[slow]
+            signal_line = _ema(line, span=signal)
+            result[(fast, slow, signal)] = {
+                "MACD": line,
+                "MACD_signal": signal_line,
+                "MACD_hist": line - signal_line,
+            }
+        return result
+
+    def kdj(self, df, variants=DEFAULT_KDJ_VARIANTS):
+        """
+        Args:
+            variants: [(n, m1, m2)]
+        Returns:
+            {(n, m1, m2): {"K", "D", "J"}}
+        """
+        close = df["close"]
+        rsv_by_n = {}
+        result = {}
+        for n, m1, m2 in variants:
+            rsv = rsv_by_n.get(n)
+            if rsv is None:
+                low_min = df["low"].rolling(window=n, min_periods=1).min().to_numpy()
+                high_max = df["high"].rolling(window=n, min_periods=1).max().to_numpy()
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    rsv = (close.to_numpy() - low_min) / (high_max - low_min) * 100
+                rsv[np.isinf(rsv)] = 50  # 处理除以0的情况
+                rsv = rsv_by_n[n] = rsv
+            k = _ema(rsv, alpha=1 / m1)
+            d = _ema(k, alpha=1 / m2)
+            result[(n, m1, m2)] = {"K": k, "D": d, "J": 3 * k - 2 * d}
+        return result
+
+    def run(self, df, ma=DEFAULT_MA_WINDOWS, rsi=DEFAULT_RSI_PERIODS,
+            macd=DEFAULT_MACD_VARIANTS, kdj=DEFAULT_KDJ_VARIANTS):
+        """
+        计算全部参数组合
+        Args:
+            df: 包含 open, high, low, close 的DataFrame
+            ma / rsi: 均线窗口、RSI周期列表
+            macd / kdj: 参数三元组列表
+            为空的指标族不计算
+        Returns:
+            列为 (指标, 参数, 字段) 的DataFrame，参数标签如 "20"、"12/26/9"
+        """
+        blocks = {}
+        if ma:
+            for window, values in self.ma(df, ma).items():
+                blocks[("MA", str(window), "MA")] = values
+        if rsi:
+            for period, values in self.rsi(df, rsi).items():
+                blocks[("RSI", str(period), "RSI")] = values
+        if macd:
+            for params, fields in self.macd(df, macd).items():
+                label = "/".join(map(str, params))
+                for field, values in fields.items():
+                    blocks[("MACD", label, field)] = values
+        if kdj:
+            for params, fields in self.kdj(df, kdj).items():
+                label = "/".join(map(str, params))
+                for field, values in fields.items():
+                    blocks[("KDJ", label, field)] = values
+
+        result = pd.DataFrame(blocks, index=df.index)
+        result.columns = pd.MultiIndex.from_tuples(result.columns, names=["indicator", "params", "field"])
+        return result
+
+
+def parameter_grid(fast=(8, 10, 12), slow=(21, 26, 30), signal=(7, 9)):
+    """生成有效的MACD参数组合（fast < slow）"""
+    return [(f, s, g) for f in fast for s in slow if f < s for g in signal]
+
+
+# 测试代码
+if __name__ == "__main__":
+    import time
+
+    from indicators import IndicatorCalculator
+    from synthetic_market import SyntheticMarket
+
+    df = SyntheticMarket(seed=5).generate("SWEEP", 2520)
+    sweep = IndicatorSweep()
+
+    # 默认参数与 calculate_all 一致
+    full = IndicatorCalculator().calculate_all(df)
+    result = sweep.run(df)
+    assert np.allclose(result["MA", "20", "MA"], full["MA20"])
+    assert np.allclose(result["RSI", "14", "RSI"], full["RSI"], equal_nan=True)
+    assert np.allclose(result["MACD", "12/26/9", "MACD_hist"], full["MACD_hist"])
+    assert np.allclose(result["KDJ", "9/3/3", "J"], full["J"], equal_nan=True)
+
+    ma_windows = list(range(2, 121))
+    rsi_periods = list(range(5, 31))
+    macd_variants = parameter_grid(fast=range(5, 16), slow=range(20, 36), signal=(5, 7, 9, 12))
+    kdj_variants = [(n, m1, m2) for n in (5, 9, 14, 21) for m1 in (2, 3, 5) for m2 in (2, 3, 5)]
+
+    start = time.perf_counter()
+    result = sweep.run(df, ma=ma_windows, rsi=rsi_periods, macd=macd_variants, kdj=kdj_variants)
+    elapsed = time.perf_counter() - start
+    print(f"{len(ma_windows)} 个MA窗口, {len(rsi_periods)} 个RSI周期, {len(macd_variants)} 组MACD, "
+          f"{len(kdj_variants)} 组KDJ: {result.shape[1]} 列, {elapsed * 1000:.1f}ms")
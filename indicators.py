@@ -1,9 +1,29 @@
 # indicators.py - 计算技术指标
+import copy
+import math
+from collections import deque
+
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+def _finite(value):
+    """转为float，NaN和无穷大（窗口开头数据不足时）返回None，保证摘要可以JSON序列化"""
+    value = float(value)
+    return value if math.isfinite(value) else None
 
 
 class IndicatorCalculator:
+    # 计算指标所需的最少K线数量
+    MIN_ROWS = 5
+    # get_latest_summary 在预热K线之外多保留的K线数
+    SUMMARY_BUFFER = 10
+
     def __init__(self):
         pass
 
@@ -15,11 +35,11 @@ class IndicatorCalculator:
         Returns:
             添加了技术指标的DataFrame
         """
-        if df is None or len(df) < 5:
-            print("数据不足，无法计算技术指标")
+        if df is None or len(df) < self.MIN_ROWS:
+            logger.info("数据不足，无法计算技术指标")
             return df
 
-        print(f"开始计算技术指标，数据量：{len(df)}条")
+        logger.debug("开始计算技术指标，数据量：%d条", len(df))
 
         # 复制数据，避免修改原始数据
         result = df.copy()
@@ -33,7 +53,7 @@ class IndicatorCalculator:
         # 计算价格变化
         result = self._calculate_price_change(result)
 
-        print("技术指标计算完成")
+        logger.debug("技术指标计算完成")
         return result
 
     def _calculate_ma(self, df):
@@ -136,45 +156,258 @@ class IndicatorCalculator:
         if df is None or len(df) == 0:
             return {}
 
-        latest = df.iloc[-1]
+        return self.summarize_row(df.iloc[-1])
+
+    def summary_bars(self):
+        """get_latest_summary 使用的K线数（预热K线 + SUMMARY_BUFFER）；STOCK_API_WARMUP=0 时为None（使用传入的全部K线）"""
+        from warmup import warmup_bars
 
+        bars = warmup_bars()
+        return bars + self.SUMMARY_BUFFER if bars else None
+
+    def get_latest_summary(self, df):
+        """
+        只计算最后一行指标的摘要（/simple 使用），结果与 get_indicators_summary(calculate_all(df)) 一致
+        （EMA 只在最后 summary_bars() 根K线上递推，与完整历史的差异不超过预热容差）。
+        窗口长度固定，与请求的 days 无关；均线、RSI、涨跌幅直接取数组末尾计算，
+        KDJ 的滚动最高最低价和 EMA 在这段短窗口上向量化计算，不生成完整的指标表
+        """
+        if df is None or len(df) == 0:
+            return {}
+        if len(df) < self.MIN_ROWS:
+            return self.get_indicators_summary(df)
+
+        bars = self.summary_bars() or len(df)
+        close = df['close'].to_numpy(dtype=np.float64)[-bars:]
+        row = {'close': close[-1]}
+
+        # 均线（min_periods=1：K线不足窗口长度时取全部K线的均值）
+        for window in IncrementalIndicators.MA_WINDOWS:
+            row[f'MA{window}'] = close[-window:].mean()
+        row['above_MA20'] = close[-1] > row['MA20']
+
+        # RSI：第一根K线没有涨跌，按0计入窗口
+        delta = np.diff(close[-(IncrementalIndicators.RSI_PERIOD + 1):])
+        if len(delta) < IncrementalIndicators.RSI_PERIOD:
+            delta = np.concatenate(([0.0], delta))
+        avg_gain = np.maximum(delta, 0).mean()
+        avg_loss = np.maximum(-delta, 0).mean()
+        if avg_loss == 0:
+            rs = np.nan if avg_gain == 0 else 100.0
+        else:
+            rs = avg_gain / avg_loss
+        row['RSI'] = 100 - (100 / (1 + rs))
+
+        # MACD：只需要最后两行判断金叉死叉
+        series = pd.Series(close)
+        macd = (series.ewm(span=12, adjust=False).mean() - series.ewm(span=26, adjust=False).mean()).to_numpy()
+        signal = pd.Series(macd).ewm(span=9, adjust=False).mean().to_numpy()
+        row['MACD'] = macd[-1]
+        row['MACD_signal'] = signal[-1]
+        row['MACD_hist'] = macd[-1] - signal[-1]
+        row['MACD_golden_cross'] = macd[-1] > signal[-1] and macd[-2] <= signal[-2]
+        row['MACD_death_cross'] = macd[-1] < signal[-1] and macd[-2] >= signal[-2]
+
+        # KDJ：n日最低/最高价（min_periods=1，开头用 inf 补齐窗口）
+        n = IncrementalIndicators.KDJ_N
+        low = np.concatenate((np.full(n - 1, np.inf), df['low'].to_numpy(dtype=np.float64)[-bars:]))
+        high = np.concatenate((np.full(n - 1, -np.inf), df['high'].to_numpy(dtype=np.float64)[-bars:]))
+        low_min = sliding_window_view(low, n).min(axis=1)
+        high_max = sliding_window_view(high, n).max(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsv = (close - low_min) / (high_max - low_min) * 100
+        rsv[np.isinf(rsv)] = 50
+        k = pd.Series(rsv).ewm(alpha=1 / 3, adjust=False).mean()
+        row['K'] = k.iloc[-1]
+        row['D'] = k.ewm(alpha=1 / 3, adjust=False).mean().iloc[-1]
+        row['J'] = 3 * row['K'] - 2 * row['D']
+
+        row['price_change'] = (close[-1] / close[-2] - 1) * 100
+        row['price_change_5d'] = (close[-1] / close[-6] - 1) * 100 if len(close) > 5 else np.nan
+        return self.summarize_row(row)
+
+    def summarize_row(self, latest):
+        """
+        由最后一行指标生成摘要
+        Args:
+            latest: calculate_all 结果的最后一行（Series）或 IncrementalIndicators.update 返回的字典
+        """
         summary = {
             "price": {
-                "close": float(latest['close']) if 'close' in df.columns else None,
-                "change": float(latest['price_change']) if 'price_change' in df.columns else None,
-                "change_5d": float(latest['price_change_5d']) if 'price_change_5d' in df.columns else None,
+                "close": _finite(latest['close']) if 'close' in latest else None,
+                "change": _finite(latest['price_change']) if 'price_change' in latest else None,
+                "change_5d": _finite(latest['price_change_5d']) if 'price_change_5d' in latest else None,
             },
             "moving_averages": {
-                "MA5": float(latest['MA5']) if 'MA5' in df.columns else None,
-                "MA10": float(latest['MA10']) if 'MA10' in df.columns else None,
-                "MA20": float(latest['MA20']) if 'MA20' in df.columns else None,
-                "MA60": float(latest['MA60']) if 'MA60' in df.columns else None,
-                "above_MA20": bool(latest['above_MA20']) if 'above_MA20' in df.columns else None,
+                "MA5": _finite(latest['MA5']) if 'MA5' in latest else None,
+                "MA10": _finite(latest['MA10']) if 'MA10' in latest else None,
+                "MA20": _finite(latest['MA20']) if 'MA20' in latest else None,
+                "MA60": _finite(latest['MA60']) if 'MA60' in latest else None,
+                "above_MA20": bool(latest['above_MA20']) if 'above_MA20' in latest else None,
             },
             "rsi": {
-                "value": float(latest['RSI']) if 'RSI' in df.columns else None,
-                "status": "超买" if 'RSI' in df.columns and latest['RSI'] > 70 else
-                "超卖" if 'RSI' in df.columns and latest['RSI'] < 30 else "正常"
+                "value": _finite(latest['RSI']) if 'RSI' in latest else None,
+                "status": "超买" if 'RSI' in latest and latest['RSI'] > 70 else
+                "超卖" if 'RSI' in latest and latest['RSI'] < 30 else "正常"
             },
             "macd": {
-                "value": float(latest['MACD']) if 'MACD' in df.columns else None,
-                "signal": float(latest['MACD_signal']) if 'MACD_signal' in df.columns else None,
-                "hist": float(latest['MACD_hist']) if 'MACD_hist' in df.columns else None,
-                "signal_text": "金叉看多" if 'MACD_golden_cross' in df.columns and latest['MACD_golden_cross'] else
-                "死叉看空" if 'MACD_death_cross' in df.columns and latest['MACD_death_cross'] else "中性"
+                "value": _finite(latest['MACD']) if 'MACD' in latest else None,
+                "signal": _finite(latest['MACD_signal']) if 'MACD_signal' in latest else None,
+                "hist": _finite(latest['MACD_hist']) if 'MACD_hist' in latest else None,
+                "signal_text": "金叉看多" if 'MACD_golden_cross' in latest and latest['MACD_golden_cross'] else
+                "死叉看空" if 'MACD_death_cross' in latest and latest['MACD_death_cross'] else "中性"
             },
             "kdj": {
-                "K": float(latest['K']) if 'K' in df.columns else None,
-                "D": float(latest['D']) if 'D' in df.columns else None,
-                "J": float(latest['J']) if 'J' in df.columns else None,
-                "status": "超买" if 'K' in df.columns and latest['K'] > 80 else
-                "超卖" if 'K' in df.columns and latest['K'] < 20 else "正常"
+                "K": _finite(latest['K']) if 'K' in latest else None,
+                "D": _finite(latest['D']) if 'D' in latest else None,
+                "J": _finite(latest['J']) if 'J' in latest else None,
+                "status": "超买" if 'K' in latest and latest['K'] > 80 else
+                "超卖" if 'K' in latest and latest['K'] < 20 else "正常"
             }
         }
 
         return summary
 
 
+class _EwmState:
+    """
+    单个指数移动平均的增量状态，逐值更新的结果与 pandas ewm(adjust=False).mean() 一致
+    （包括输入为NaN时沿用上一结果、之后按跳过的步数衰减旧权重的处理）
+    """
+
+    __slots__ = ("alpha", "weighted", "old_wt")
+
+    def __init__(self, span=None, alpha=None):
+        # 与 pandas 相同，先换算为质心（com）再换算回 alpha，alpha=1/3 这类参数才能逐位一致
+        com = (1 - alpha) / alpha if alpha is not None else (span - 1) / 2
+        self.alpha = 1 / (1 + com)
+        self.weighted = np.nan
+        self.old_wt = 1.0
+
+    def update(self, value):
+        if self.weighted == self.weighted:
+            self.old_wt *= 1 - self.alpha
+            if value == value:
+                if self.weighted != value:
+                    self.weighted = (self.old_wt * self.weighted + self.alpha * value) / (self.old_wt + self.alpha)
+                self.old_wt = 1.0
+        elif value == value:
+            self.weighted = value
+        return self.weighted
+
+
+class _WindowMean:
+    """滚动均值 rolling(window, min_periods=1).mean() 的增量状态：直接对窗口内的值求和"""
+
+    __slots__ = ("values",)
+
+    def __init__(self, window):
+        self.values = deque(maxlen=window)
+
+    def update(self, value):
+        self.values.append(value)
+        return sum(self.values) / len(self.values)
+
+
+class IncrementalIndicators:
+    """
+    逐根K线增量计算技术指标（实时推送使用）
+    只保存计算下一根K线所需的窗口和EMA状态，每根新K线的计算量与历史长度无关；
+    结果与对完整历史调用 IndicatorCalculator.calculate_all 的最后一行一致（均线、RSI 的差异在浮点舍入范围内）
+    """
+
+    MA_WINDOWS = (5, 10, 20, 60)
+    RSI_PERIOD = 14
+    KDJ_N = 9
+
+    def __init__(self):
+        self.count = 0
+        self.closes = deque(maxlen=5)
+        self.highs = deque(maxlen=self.KDJ_N)
+        self.lows = deque(maxlen=self.KDJ_N)
+        self.ma = {window: _WindowMean(window) for window in self.MA_WINDOWS}
+        self.avg_gain = _WindowMean(self.RSI_PERIOD)
+        self.avg_loss = _WindowMean(self.RSI_PERIOD)
+        self.ema_fast = _EwmState(span=12)
+        self.ema_slow = _EwmState(span=26)
+        self.ema_signal = _EwmState(span=9)
+        self.ema_k = _EwmState(alpha=1 / 3)
+        self.ema_d = _EwmState(alpha=1 / 3)
+        self.prev = None
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+    def update(self, bar):
+        """
+        追加一根K线
+        Args:
+            bar: 包含 date, open, high, low, close, volume 的字典
+        Returns:
+            与 calculate_all 输出列相同的字典
+        """
+        close = float(bar["close"])
+        prev_close = self.closes[-1] if self.closes else np.nan
+        close_5 = self.closes[0] if len(self.closes) == 5 else np.nan
+
+        self.count += 1
+        self.closes.append(close)
+        self.highs.append(float(bar["high"]))
+        self.lows.append(float(bar["low"]))
+
+        row = dict(bar)
+        for window in self.MA_WINDOWS:
+            row[f"MA{window}"] = self.ma[window].update(close)
+        for window in self.MA_WINDOWS[:3]:
+            row[f"above_MA{window}"] = close > row[f"MA{window}"]
+
+        # RSI（第一根K线的涨跌按0计入；与 calculate_all 一致，未下跌时 loss 为 -0.0）
+        delta = close - prev_close
+        avg_gain = self.avg_gain.update(delta if delta > 0 else 0.0)
+        avg_loss = self.avg_loss.update(-(delta if delta < 0 else 0.0))
+        if avg_loss == 0:
+            rs = np.nan if avg_gain == 0 else 100.0
+        else:
+            rs = avg_gain / avg_loss
+        row["RSI"] = 100 - (100 / (1 + rs))
+        row["RSI_overbought"] = row["RSI"] > 70
+        row["RSI_oversold"] = row["RSI"] < 30
+
+        # MACD
+        macd = self.ema_fast.update(close) - self.ema_slow.update(close)
+        signal = self.ema_signal.update(macd)
+        row["MACD"] = macd
+        row["MACD_signal"] = signal
+        row["MACD_hist"] = macd - signal
+        prev = self.prev or {}
+        row["MACD_golden_cross"] = bool(macd > signal and prev.get("MACD", np.nan) <= prev.get("MACD_signal", np.nan))
+        row["MACD_death_cross"] = bool(macd < signal and prev.get("MACD", np.nan) >= prev.get("MACD_signal", np.nan))
+
+        # KDJ
+        low_min = min(self.lows)
+        high_max = max(self.highs)
+        # 与 calculate_all 相同的运算顺序（先除后乘100），保证逐位一致
+        if high_max == low_min:
+            rsv = np.nan if close == low_min else 50.0
+        else:
+            rsv = (close - low_min) / (high_max - low_min) * 100
+        k = self.ema_k.update(rsv)
+        d = self.ema_d.update(k)
+        row["K"] = k
+        row["D"] = d
+        row["J"] = 3 * k - 2 * d
+        row["KDJ_golden_cross"] = bool(k > d and prev.get("K", np.nan) <= prev.get("D", np.nan))
+        row["KDJ_death_cross"] = bool(k < d and prev.get("K", np.nan) >= prev.get("D", np.nan))
+        row["K_overbought"] = k > 80
+        row["K_oversold"] = k < 20
+
+        row["price_change"] = (close / prev_close - 1) * 100
+        row["price_change_5d"] = (close / close_5 - 1) * 100
+
+        self.prev = row
+        return row
+
+
 # 测试代码
 if __name__ == "__main__":
     import numpy as np
@@ -1,24 +1,83 @@
 # kline_fetcher.py - 获取K线数据（兼容Vercel部署）
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 from datetime import datetime, timedelta
-import random
 import yfinance as yf
 
+from cache import LRUCache
+from log_utils import get_logger
+from shared_cache import create_cache
+from metrics import UPSTREAM_REQUESTS, UPSTREAM_ERRORS, MOCK_FALLBACKS
+from resample import INTERVALS, is_intraday, plan_base, resample_ohlcv
+from synthetic_market import SyntheticMarket
+
+# 市场中文名 -> 指标标签
+MARKET_LABELS = {"A股": "a_share", "港股": "hk_share", "美股": "us_share"}
+
+logger = get_logger(__name__)
+
+# 单次向上游请求的最长自然日数，更长的日线区间拆分为多段并行获取
+CHUNK_DAYS = int(os.environ.get("STOCK_API_FETCH_CHUNK_DAYS", 730))
+# 分段获取，以及横截面等批量接口获取多只股票时的并发数
+FETCH_WORKERS = int(os.environ.get("STOCK_API_FETCH_WORKERS", 4))
+# 单次上游请求的超时（秒）；请求的时间预算只限制调用方等待的时间，见 deadline.run_with_deadline
+UPSTREAM_TIMEOUT = 10
+
+
+def date_chunks(start_date, end_date, chunk_days=CHUNK_DAYS):
+    """把 [start_date, end_date) 拆分为不超过 chunk_days 的连续区间"""
+    chunks = []
+    chunk_start = start_date
+    while chunk_start < end_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), end_date)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    return chunks
+
+
+def merge_bars(frames):
+    """合并多段K线：按日期排序并去重（同一日期保留后出现的一段）"""
+    frames = [df for df in frames if df is not None and len(df) > 0]
+    if not frames:
+        return None
+    df = pd.concat(frames, ignore_index=True)
+    df = df.drop_duplicates(subset="date", keep="last").sort_values("date", kind="stable")
+    return df.reset_index(drop=True)
+
 
 class KlineFetcher:
-    def __init__(self):
+    def __init__(self, offline=False, seed=0):
+        """
+        Args:
+            offline: 为True时不访问yfinance，全部使用模拟行情（压测/离线开发）
+            seed: 模拟行情的随机种子
+        """
         self.code_converter = None
+        self.offline = offline
+        self.synthetic_market = SyntheticMarket(seed=seed)
+        # 基础周期K线缓存：(代码, 基础周期) -> DataFrame，同一只股票的不同周期共用一份基础数据
+        # 设置 STOCK_API_SHARED_CACHE 时与同一主机上的其他worker共享，每只股票只需一个worker向上游获取；
+        # 否则启用磁盘快照时同时写入快照，新容器可以直接恢复
+        self.base_cache = create_cache(maxsize=256, ttl=60, shared_path=os.environ.get("STOCK_API_SHARED_CACHE"),
+                                       name="bars")
+        # 上游历史不足的序列：(代码, 基础周期) -> 当时请求的基础K线数
+        # 请求不超过该数量时直接使用缓存中的全部K线，不再重复向上游获取
+        self._exhausted = LRUCache(maxsize=1024, ttl=60)
 
     def set_converter(self, converter):
         """设置代码转换器"""
         self.code_converter = converter
 
-    def get_kline_data(self, stock_name, days=30):
+    def get_kline_data(self, stock_name, days=30, interval="1d", use_cache=True):
         """
         获取股票的K线数据
         Args:
             stock_name: 股票名称
-            days: 交易天数
+            days: K线数量（日线即交易天数）
+            interval: K线周期，见 resample.INTERVALS
+            use_cache: 为False时忽略基础K线缓存，重新向上游获取（实时推送轮询使用）
         Returns:
             DataFrame with columns: date, open, high, low, close, volume
         """
@@ -28,27 +87,27 @@ class KlineFetcher:
         # 1. 转换股票名称
         stock_code = self.code_converter.name_to_code(stock_name)
         if not stock_code:
-            print(f"错误：未找到股票 {stock_name}")
-            return self._get_mock_data(stock_name, days)
+            logger.warning("未找到股票 %s", stock_name, extra={"stock": stock_name})
+            return self._get_mock_data(stock_name, days, reason="not_found", interval=interval)
 
-        print(f"正在获取 {stock_name}({stock_code}) 的K线数据...")
+        logger.debug("正在获取 %s(%s) 的K线数据", stock_name, stock_code)
 
         try:
             # 2. 根据股票类型获取数据
             if stock_code.isdigit() and len(stock_code) == 6:
                 # A股
-                return self._get_a_stock(stock_code, days)
+                return self._get_a_stock(stock_code, days, interval, use_cache)
             elif stock_code.startswith('0') and len(stock_code) == 5:
                 # 港股
-                return self._get_hk_stock(stock_code, days)
+                return self._get_hk_stock(stock_code, days, interval, use_cache)
             else:
                 # 美股或其他
-                return self._get_other_stock(stock_code, days)
+                return self._get_other_stock(stock_code, days, interval, use_cache)
         except Exception as e:
-            print(f"获取数据失败：{e}")
-            return self._get_mock_data(stock_name, days)  # 返回模拟数据
+            logger.warning("获取数据失败：%s", e, extra={"stock": stock_name, "code": stock_code})
+            return self._get_mock_data(stock_name, days, reason="upstream_error", interval=interval)  # 返回模拟数据
 
-    def _get_a_stock(self, stock_code, days):
+    def _get_a_stock(self, stock_code, days, interval="1d", use_cache=True):
         """获取A股数据（使用yfinance）"""
         # A股在yfinance中的代码格式：代码.SS（上证）或代码.SZ（深证）
         if stock_code.startswith('6'):
@@ -56,103 +115,115 @@ class KlineFetcher:
         else:
             ticker_symbol = f"{stock_code}.SZ"  # 深证
 
-        return self._get_yfinance_data(ticker_symbol, days, "A股")
+        return self._get_yfinance_data(ticker_symbol, days, "A股", interval, use_cache)
 
-    def _get_hk_stock(self, stock_code, days):
+    def _get_hk_stock(self, stock_code, days, interval="1d", use_cache=True):
         """获取港股数据（使用yfinance）"""
         # 港股在yfinance中的代码格式：代码.HK
         ticker_symbol = f"{stock_code}.HK"
-        return self._get_yfinance_data(ticker_symbol, days, "港股")
+        return self._get_yfinance_data(ticker_symbol, days, "港股", interval, use_cache)
 
-    def _get_other_stock(self, stock_code, days):
+    def _get_other_stock(self, stock_code, days, interval="1d", use_cache=True):
         """获取其他股票数据（使用yfinance）"""
-        return self._get_yfinance_data(stock_code, days, "美股")
+        return self._get_yfinance_data(stock_code, days, "美股", interval, use_cache)
 
-    def _get_yfinance_data(self, ticker_symbol, days, market_type):
-        """使用yfinance获取数据"""
+    def _get_yfinance_data(self, ticker_symbol, days, market_type, interval="1d", use_cache=True):
+        """
+        获取 interval 周期的K线
+        只向上游请求基础周期（1d / 1m / 5m / 60m），其他周期由基础K线本地聚合
+        """
+        base, base_bars, calendar_days = plan_base(interval, days)
+
+        key = (ticker_symbol, base)
+        df = self.base_cache.get(key) if use_cache else None
+        if df is None or (len(df) < base_bars and self._exhausted.get(key, 0) < base_bars):
+            df = self._fetch_base_bars(ticker_symbol, base, base_bars, calendar_days, market_type)
+            self.base_cache.set(key, df)
+            if len(df) < base_bars:
+                self._exhausted.set(key, base_bars)
+
+        if interval != base:
+            df = resample_ohlcv(df, interval)
+        # 总是返回新的DataFrame，调用方修改结果不会影响缓存
+        return df.tail(days).reset_index(drop=True)
+
+    def _fetch_base_bars(self, ticker_symbol, base, bars, calendar_days, market_type):
+        """获取基础周期K线（离线模式下生成模拟数据）"""
+        if self.offline:
+            return self.synthetic_market.generate(ticker_symbol, bars, bar_minutes=INTERVALS[base])
+
+        market = MARKET_LABELS.get(market_type, "unknown")
+        UPSTREAM_REQUESTS.inc(market=market)
         try:
-            print(f"使用yfinance获取{market_type}数据，代码: {ticker_symbol}")
-
-            ticker = yf.Ticker(ticker_symbol)
+            logger.debug("使用yfinance获取%s数据，代码: %s", market_type, ticker_symbol)
 
             # 计算日期范围
             end_date = datetime.now()
-            start_date = end_date - timedelta(days=days * 2)  # 多获取一些数据
-
-            # 获取历史数据
-            df = ticker.history(start=start_date, end=end_date)
+            start_date = end_date - timedelta(days=calendar_days)
+
+            # 获取历史数据：多年的日线拆分为多段并行获取，合并后去重
+            chunks = date_chunks(start_date, end_date) if base == "1d" else [(start_date, end_date)]
+            if len(chunks) > 1:
+                UPSTREAM_REQUESTS.inc(len(chunks) - 1, market=market)
+                with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(chunks))) as pool:
+                    frames = list(pool.map(lambda chunk: self._history(ticker_symbol, chunk[0], chunk[1], base),
+                                           chunks))
+            else:
+                frames = [self._history(ticker_symbol, start_date, end_date, base)]
+            df = merge_bars(frames)
 
-            if df.empty:
+            if df is None:
                 raise ValueError(f"未获取到 {ticker_symbol} 的数据")
 
-            # 重置索引，将Date变为列
-            df = df.reset_index()
-
-            # 重命名列
-            df = df.rename(columns={
-                'Date': 'date',
-                'Open': 'open',
-                'High': 'high',
-                'Low': 'low',
-                'Close': 'close',
-                'Volume': 'volume'
-            })
-
-            # 选择需要的列
-            df = df[['date', 'open', 'high', 'low', 'close', 'volume']]
-
-            # 转换日期格式
-            df['date'] = df['date'].dt.strftime('%Y-%m-%d')
-
-            # 排序并取最近的days天
-            df = df.sort_values('date')
-            if len(df) > days:
-                df = df.tail(days)
+            # 取最近的bars根
+            if len(df) > bars:
+                df = df.tail(bars).reset_index(drop=True)
 
-            print(f"成功获取 {len(df)} 条{market_type}数据")
+            logger.debug("成功获取 %d 条%s数据（%d 段）", len(df), market_type, len(chunks))
             return df
 
         except Exception as e:
-            print(f"yfinance获取{market_type}数据失败: {e}")
+            UPSTREAM_ERRORS.inc(market=market)
+            logger.warning("yfinance获取%s数据失败: %s", market_type, e, extra={"ticker": ticker_symbol})
             raise
 
-    def _get_mock_data(self, stock_name, days):
-        """获取模拟数据（当真实API失败时使用）"""
-        print(f"使用模拟数据替代 {stock_name}")
-
-        import random
-        from datetime import datetime, timedelta
-
-        data = []
-        today = datetime.now()
-
-        # 生成模拟数据
-        base_price = 100 + random.uniform(-50, 50)
+    @staticmethod
+    def _history(ticker_symbol, start_date, end_date, base, timeout=UPSTREAM_TIMEOUT):
+        """向yfinance请求一段K线，返回标准列的DataFrame（可能为空）"""
+        df = yf.Ticker(ticker_symbol).history(start=start_date, end=end_date, interval=base, timeout=timeout)
+        if df.empty:
+            return None
 
-        for i in range(days):
-            date = today - timedelta(days=days - i - 1)
+        # 重置索引，将Date变为列
+        df = df.reset_index()
 
-            open_price = base_price + random.uniform(-2, 2)
-            close_price = open_price + random.uniform(-5, 5)
-            high_price = max(open_price, close_price) + random.uniform(0, 3)
-            low_price = min(open_price, close_price) - random.uniform(0, 3)
+        # 重命名列
+        df = df.rename(columns={
+            'Date': 'date',
+            'Datetime': 'date',
+            'Open': 'open',
+            'High': 'high',
+            'Low': 'low',
+            'Close': 'close',
+            'Volume': 'volume'
+        })
 
-            # 确保价格为正数
-            open_price = max(0.01, open_price)
-            close_price = max(0.01, close_price)
-            high_price = max(0.01, high_price)
-            low_price = max(0.01, low_price)
+        # 选择需要的列
+        df = df[['date', 'open', 'high', 'low', 'close', 'volume']]
 
-            data.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'open': round(open_price, 2),
-                'high': round(high_price, 2),
-                'low': round(low_price, 2),
-                'close': round(close_price, 2),
-                'volume': random.randint(1000000, 10000000)
-            })
+        # 转换日期格式
+        df['date'] = df['date'].dt.strftime('%Y-%m-%d %H:%M' if is_intraday(base) else '%Y-%m-%d')
+        return df
 
-        return pd.DataFrame(data)
+    def _get_mock_data(self, stock_name, days, reason="upstream_error", interval="1d"):
+        """获取模拟数据（当真实API失败时使用）"""
+        MOCK_FALLBACKS.inc(reason=reason)
+        logger.warning("使用模拟数据替代 %s", stock_name, extra={"stock": stock_name, "reason": reason})
+        base, base_bars, _ = plan_base(interval, days)
+        df = self.synthetic_market.generate(stock_name, base_bars, bar_minutes=INTERVALS[base])
+        if interval != base:
+            df = resample_ohlcv(df, interval)
+        return df.tail(days).reset_index(drop=True)
 
 
 # 测试代码
@@ -0,0 +1,199 @@
+# live.py - 实时推送：每只股票一个上游轮询任务，增量计算指标后分发给所有订阅者
+"""
+客户端原先通过高频轮询 /api/stock/{name} 获取最新数据，每次轮询都会重新执行完整流程。
+
+LiveHub 为每只被订阅的股票启动一个轮询任务（与订阅者数量无关）：
+- 首次轮询用历史K线初始化 IncrementalIndicators，向订阅者发送 snapshot
+- 之后每次轮询只处理新增的K线（以及盘中仍在变化的最后一根K线），逐根增量计算指标，
+  只把变化的那一行和摘要作为 update 推送
+- 每个订阅者有一个有界队列；消费过慢时丢弃最旧的消息（只保留最新状态），消息中的 dropped 为累计丢弃数
+- 最后一个订阅者断开后停止轮询
+
+轮询间隔: STOCK_API_LIVE_INTERVAL（秒，默认5）；订阅队列长度: STOCK_API_LIVE_QUEUE（默认16）
+"""
+import asyncio
+import contextlib
+import os
+
+from compact import clean_value
+from indicators import IncrementalIndicators
+from log_utils import get_logger
+from metrics import LIVE_SUBSCRIBERS, LIVE_FEEDS, LIVE_POLLS, LIVE_MESSAGES, LIVE_DROPPED
+from warmup import plan_bars
+
+logger = get_logger(__name__)
+
+# 初始化增量指标使用的历史K线数量（最新一根K线加上全部指标的预热期）
+LOOKBACK_BARS = plan_bars(1)
+
+BAR_FIELDS = ("open", "high", "low", "close", "volume")
+
+
+class Subscriber:
+    """一个订阅者的有界消息队列"""
+
+    def __init__(self, stock_name, maxsize):
+        self.stock_name = stock_name
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, message):
+        """放入消息；队列已满时丢弃最旧的一条"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            LIVE_DROPPED.inc()
+        self.queue.put_nowait({**message, "dropped": self.dropped})
+
+    async def get(self, timeout=None):
+        """等待下一条消息，超时返回None（用于发送心跳）"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class _SymbolFeed:
+    """一只股票的轮询状态"""
+
+    def __init__(self, stock_name, stock_code):
+        self.stock_name = stock_name
+        self.stock_code = stock_code
+        self.subscribers = set()
+        self.task = None
+        self.engine = None
+        # 应用最后一根K线之前的状态，最后一根K线盘中变化时从这里重新计算
+        self.engine_before_last = None
+        self.last_date = None
+        self.last_bar = None
+        self.last_message = None
+
+    def apply(self, df, calculator):
+        """
+        用最新的K线更新指标
+        Returns:
+            需要推送的消息列表
+        """
+        records = df[["date", *BAR_FIELDS]].to_dict(orient="records")
+        if not records:
+            return []
+
+        if self.engine is None:
+            engine = IncrementalIndicators()
+            for bar in records[:-1]:
+                engine.update(bar)
+            self.engine = engine
+            return [self._advance(records[-1], "snapshot", calculator)]
+
+        messages = []
+        for bar in records:
+            date = str(bar["date"])
+            if date < self.last_date:
+                continue
+            if date == self.last_date:
+                if tuple(bar[f] for f in BAR_FIELDS) == self.last_bar:
+                    continue
+                # 最后一根K线盘中更新：回到它之前的状态重新计算
+                self.engine = self.engine_before_last
+            messages.append(self._advance(bar, "update", calculator))
+        return messages
+
+    def _advance(self, bar, kind, calculator):
+        self.engine_before_last = self.engine.copy()
+        row = self.engine.update(bar)
+        self.last_date = str(bar["date"])
+        self.last_bar = tuple(bar[f] for f in BAR_FIELDS)
+
+        summary = clean_value(calculator.summarize_row(row))
+        row = clean_value(row)
+        self.last_message = {
+            "type": kind,
+            "stock_name": self.stock_name,
+            "stock_code": self.stock_code,
+            "row": row,
+            "summary": summary,
+        }
+        return self.last_message
+
+
+class LiveHub:
+    """管理所有股票的轮询任务和订阅者"""
+
+    def __init__(self, api, interval=None, queue_size=None, lookback=LOOKBACK_BARS):
+        """
+        Args:
+            api: StockDataAPI（使用其 converter / fetcher / calculator）
+            interval: 轮询间隔（秒）
+            queue_size: 每个订阅者的队列长度
+        """
+        self.api = api
+        self.interval = interval or float(os.environ.get("STOCK_API_LIVE_INTERVAL", 5))
+        self.queue_size = queue_size or int(os.environ.get("STOCK_API_LIVE_QUEUE", 16))
+        self.lookback = lookback
+        self.feeds = {}
+
+    def _update_gauges(self):
+        LIVE_FEEDS.set(len(self.feeds))
+        LIVE_SUBSCRIBERS.set(sum(len(feed.subscribers) for feed in self.feeds.values()))
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, stock_name):
+        """
+        订阅一只股票
+            async with hub.subscribe("贵州茅台") as subscriber:
+                message = await subscriber.get()
+        股票不存在时抛出 KeyError
+        """
+        stock_code = self.api.converter.name_to_code(stock_name)
+        if not stock_code:
+            raise KeyError(stock_name)
+
+        feed = self.feeds.get(stock_code)
+        if feed is None:
+            feed = self.feeds[stock_code] = _SymbolFeed(stock_name, stock_code)
+        subscriber = Subscriber(stock_name, self.queue_size)
+        feed.subscribers.add(subscriber)
+        if feed.last_message is not None:
+            subscriber.offer({**feed.last_message, "type": "snapshot"})
+        if feed.task is None:
+            feed.task = asyncio.create_task(self._poll(feed))
+        self._update_gauges()
+        logger.info("新增订阅", extra={"stock": stock_name, "subscribers": len(feed.subscribers)})
+
+        try:
+            yield subscriber
+        finally:
+            feed.subscribers.discard(subscriber)
+            if not feed.subscribers:
+                feed.task.cancel()
+                self.feeds.pop(stock_code, None)
+            self._update_gauges()
+            logger.info("取消订阅", extra={"stock": stock_name, "subscribers": len(feed.subscribers)})
+
+    async def _poll(self, feed):
+        """轮询一只股票，直到没有订阅者时被取消"""
+        while True:
+            try:
+                LIVE_POLLS.inc()
+                df = await asyncio.to_thread(
+                    self.api.fetcher.get_kline_data, feed.stock_name, self.lookback, use_cache=False
+                )
+                if df is not None and len(df) > 0:
+                    for message in feed.apply(df, self.api.calculator):
+                        for subscriber in list(feed.subscribers):
+                            subscriber.offer(message)
+                            LIVE_MESSAGES.inc()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("实时轮询失败", extra={"stock": feed.stock_name})
+            await asyncio.sleep(self.interval)
+
+    async def close(self):
+        """停止所有轮询任务"""
+        tasks = [feed.task for feed in self.feeds.values() if feed.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.feeds.clear()
+        self._update_gauges()
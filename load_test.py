@@ -0,0 +1,272 @@
+# load_test.py - 端到端HTTP压测工具
+"""
+用法:
+    # 进程内启动 web_api:app（离线模拟行情），32并发压测20秒
+    python load_test.py --concurrency 32 --duration 20
+
+    # 使用uvicorn启动4个worker
+    python load_test.py --mode uvicorn --workers 4 --concurrency 64
+
+    # 自定义流量配比，并把报告保存为JSON
+    python load_test.py --mix stock=50,simple=40,list=5,search=5 --json report.json
+
+流量类型:
+    stock   GET /api/stock/{name}?days=N
+    simple  GET /api/stock/{name}/simple
+    list    GET /api/stock
+    search  GET /api/stock?search=关键词
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import quote
+
+import numpy as np
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    print("压测工具依赖 httpx，请先执行: pip install httpx")
+    raise
+
+DEFAULT_MIX = "stock=60,simple=25,list=10,search=5"
+SEARCH_KEYWORDS = ["茅台", "银行", "腾讯", "AAPL", "60", "证券"]
+
+
+def parse_mix(text):
+    """解析流量配比字符串，如 'stock=60,simple=40'"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("stock", "simple", "list", "search"):
+            raise ValueError(f"未知的流量类型: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class RequestPlanner:
+    """按配比随机生成请求路径（固定随机种子，可复现）"""
+
+    def __init__(self, mix, symbols, days_choices, seed=0):
+        self.kinds = list(mix.keys())
+        self.weights = list(mix.values())
+        self.symbols = symbols
+        self.days_choices = days_choices
+        self.random = random.Random(seed)
+
+    def next(self):
+        kind = self.random.choices(self.kinds, self.weights)[0]
+        if kind == "stock":
+            symbol = self.random.choice(self.symbols)
+            days = self.random.choice(self.days_choices)
+            return kind, f"/api/stock/{quote(symbol)}?days={days}"
+        if kind == "simple":
+            return kind, f"/api/stock/{quote(self.random.choice(self.symbols))}/simple"
+        if kind == "search":
+            return kind, f"/api/stock?search={quote(self.random.choice(SEARCH_KEYWORDS))}"
+        return kind, "/api/stock"
+
+
+class LoadStats:
+    """收集每个请求的耗时、状态和缓存命中情况"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.cache_hits = 0
+        self.cache_lookups = 0
+
+    def record(self, kind, latency, ok, cache_header):
+        self.latencies.setdefault(kind, []).append(latency)
+        if not ok:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+        if cache_header:
+            self.cache_lookups += 1
+            if cache_header.upper() == "HIT":
+                self.cache_hits += 1
+
+    @staticmethod
+    def _summarize(latencies, errors, elapsed):
+        arr = np.asarray(latencies) * 1000
+        count = len(arr)
+        return {
+            "requests": count,
+            "throughput_rps": count / elapsed if elapsed else 0.0,
+            "error_rate": errors / count if count else 0.0,
+            "latency_ms": {
+                "mean": float(arr.mean()) if count else None,
+                "p50": float(np.percentile(arr, 50)) if count else None,
+                "p95": float(np.percentile(arr, 95)) if count else None,
+                "p99": float(np.percentile(arr, 99)) if count else None,
+                "max": float(arr.max()) if count else None,
+            },
+        }
+
+    def report(self, elapsed):
+        all_latencies = [x for values in self.latencies.values() for x in values]
+        report = self._summarize(all_latencies, sum(self.errors.values()), elapsed)
+        report["elapsed_s"] = elapsed
+        report["cache_hit_ratio"] = self.cache_hits / self.cache_lookups if self.cache_lookups else None
+        report["by_endpoint"] = {
+            kind: self._summarize(values, self.errors.get(kind, 0), elapsed)
+            for kind, values in self.latencies.items()
+        }
+        return report
+
+
+async def _worker(client, planner, stats, stop_at, remaining):
+    while time.perf_counter() < stop_at:
+        if remaining is not None:
+            if remaining[0] <= 0:
+                return
+            remaining[0] -= 1
+
+        kind, path = planner.next()
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            ok = response.status_code < 400
+            cache_header = response.headers.get("x-cache")
+        except httpx.HTTPError:
+            ok, cache_header = False, None
+        stats.record(kind, time.perf_counter() - start, ok, cache_header)
+
+
+async def run_load(client, planner, concurrency, duration, total_requests=None, warmup=0):
+    """以固定并发驱动请求，返回压测报告"""
+    if warmup:
+        await run_load(client, planner, concurrency, duration=warmup)
+
+    stats = LoadStats()
+    remaining = [total_requests] if total_requests else None
+    start = time.perf_counter()
+    stop_at = start + duration
+    await asyncio.gather(*[
+        _worker(client, planner, stats, stop_at, remaining) for _ in range(concurrency)
+    ])
+    return stats.report(time.perf_counter() - start)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_uvicorn(app_path, workers, env):
+    """以子进程方式启动uvicorn，等待健康检查通过后返回 (进程, base_url)"""
+    port = _free_port()
+    cmd = [sys.executable, "-m", "uvicorn", app_path, "--host", "127.0.0.1",
+           "--port", str(port), "--workers", str(workers), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("uvicorn 启动失败")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return proc, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+
+    proc.terminate()
+    raise RuntimeError("等待uvicorn启动超时")
+
+
+def load_app(app_path):
+    """导入 'module:attr' 形式的ASGI应用"""
+    import importlib
+
+    module_name, _, attr = app_path.partition(":")
+    return getattr(importlib.import_module(module_name), attr or "app")
+
+
+def print_report(report):
+    lat = report["latency_ms"]
+    print("\n" + "=" * 60)
+    print("压测报告")
+    print("=" * 60)
+    print(f"请求总数: {report['requests']}，耗时 {report['elapsed_s']:.1f}s")
+    print(f"吞吐量:   {report['throughput_rps']:.1f} req/s")
+    print(f"错误率:   {report['error_rate']:.2%}")
+    if report["cache_hit_ratio"] is not None:
+        print(f"缓存命中: {report['cache_hit_ratio']:.2%}")
+    if report["requests"]:
+        print(f"延迟(ms): p50={lat['p50']:.1f}  p95={lat['p95']:.1f}  p99={lat['p99']:.1f}  max={lat['max']:.1f}")
+
+    print(f"\n{'类型':8} {'请求数':>8} {'错误率':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for kind, item in sorted(report["by_endpoint"].items()):
+        lat = item["latency_ms"]
+        print(f"{kind:8} {item['requests']:8d} {item['error_rate']:8.2%} "
+              f"{lat['p50']:8.1f} {lat['p95']:8.1f} {lat['p99']:8.1f}")
+
+
+async def main_async(args):
+    from stock_code import StockCodeConverter
+
+    symbols = args.symbols or list(StockCodeConverter().stock_dict.keys())
+    planner = RequestPlanner(parse_mix(args.mix), symbols, args.days, seed=args.seed)
+
+    env = dict(os.environ)
+    if not args.online:
+        env["STOCK_API_OFFLINE"] = "1"
+
+    proc = None
+    try:
+        if args.mode == "uvicorn":
+            proc, base_url = start_uvicorn(args.app, args.workers, env)
+            transport = None
+        else:
+            os.environ.update(env)
+            transport = httpx.ASGITransport(app=load_app(args.app))
+            base_url = "http://loadtest"
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, transport=transport,
+                                     limits=limits, timeout=args.timeout) as client:
+            return await run_load(client, planner, args.concurrency, args.duration,
+                                  total_requests=args.requests, warmup=args.warmup)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="股票数据API端到端压测")
+    parser.add_argument("--app", default="web_api:app", help="ASGI应用路径")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker数量")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发请求数")
+    parser.add_argument("--duration", type=float, default=10.0, help="压测时长（秒）")
+    parser.add_argument("--requests", type=int, default=None, help="总请求数上限")
+    parser.add_argument("--warmup", type=float, default=0.0, help="预热时长（秒），不计入报告")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"流量配比，默认 {DEFAULT_MIX}")
+    parser.add_argument("--days", type=int, nargs="+", default=[10, 30, 100], help="days参数候选值")
+    parser.add_argument("--symbols", nargs="+", default=None, help="股票名称，默认使用全部支持的股票")
+    parser.add_argument("--timeout", type=float, default=30.0, help="单请求超时（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="流量随机种子")
+    parser.add_argument("--online", action="store_true", help="访问真实yfinance（默认使用离线模拟行情）")
+    parser.add_argument("--json", default=None, help="把报告保存为JSON文件")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n报告已保存到 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
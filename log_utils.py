@@ -0,0 +1,172 @@
+# log_utils.py - 结构化、分级、可采样的日志（替代热点路径上的 print）
+"""
+    from log_utils import get_logger
+    logger = get_logger(__name__)
+    logger.info("处理完成", extra={"stock": "贵州茅台", "rows": 30})
+
+- 日志通过 QueueHandler 放入内存队列，由后台线程写出，请求线程不等待IO
+- 每条日志自动带上当前请求的 request_id（见 request_id_var）
+- DEBUG 日志按请求采样：同一请求的调试日志要么全部保留，要么全部丢弃
+
+环境变量:
+    LOG_LEVEL              日志级别，默认 INFO
+    LOG_FORMAT             json（默认）或 text
+    LOG_DEBUG_SAMPLE_RATE  DEBUG日志采样比例 0~1，默认 1
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+import zlib
+from contextvars import ContextVar
+
+ROOT_LOGGER_NAME = "stock_api"
+
+# 当前请求的关联ID，由Web层中间件设置
+request_id_var = ContextVar("request_id", default="-")
+
+# LogRecord 自带的属性，其余属性视为通过 extra 传入的结构化字段
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_listener = None
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+
+class RequestContextFilter(logging.Filter):
+    """为日志记录附加 request_id，并对DEBUG日志按请求采样"""
+
+    def __init__(self, debug_sample_rate=1.0):
+        super().__init__()
+        self.debug_sample_rate = debug_sample_rate
+
+    def _sampled(self, request_id):
+        if self.debug_sample_rate >= 1:
+            return True
+        if self.debug_sample_rate <= 0:
+            return False
+        if request_id == "-":
+            return random.random() < self.debug_sample_rate
+        # 同一请求的采样结果固定
+        return zlib.crc32(request_id.encode()) % 10000 < self.debug_sample_rate * 10000
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        if record.levelno <= logging.DEBUG and not self._sampled(record.request_id):
+            return False
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行JSON"""
+
+    def format(self, record):
+        payload = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """便于本地阅读的文本格式，结构化字段追加在消息后面"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = {k: v for k, v in vars(record).items() if k not in _RESERVED_ATTRS and not k.startswith("_")}
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """只把原始记录放入队列，格式化全部在后台线程完成"""
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(level=None, fmt=None, debug_sample_rate=None, stream=None):
+    """
+    配置 stock_api 日志（可重复调用，后一次配置覆盖前一次）
+    只配置 stock_api 命名空间，不影响 uvicorn 等其他日志
+    """
+    global _listener
+
+    level = level or os.environ.get("LOG_LEVEL", "INFO")
+    fmt = fmt or os.environ.get("LOG_FORMAT", "json")
+    if debug_sample_rate is None:
+        debug_sample_rate = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", 1.0))
+
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter(debug_sample_rate))
+
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return root
+
+
+def shutdown_logging():
+    """停止后台线程并写出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+async def request_id_middleware(request, call_next):
+    """
+    FastAPI HTTP中间件：读取或生成 X-Request-ID，写入上下文并回传给客户端
+    用法: app.middleware("http")(request_id_middleware)
+    """
+    request_id = request.headers.get("x-request-id") or new_request_id()
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+def get_logger(name):
+    """获取 stock_api 命名空间下的logger，首次调用时自动完成配置"""
+    if _listener is None:
+        setup_logging()
+    if name == "__main__" or not name:
+        name = "main"
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,236 @@
+# materialize.py - 收盘后预渲染：批量计算整个股票池，写出预压缩的静态响应
+"""
+收盘后到下一个交易时段开盘前，日线K线和指标都不会再变，但每个请求仍然按需获取和计算。
+本工具在各市场收盘后遍历 StockCodeConverter 的股票池，批量获取K线、计算指标和摘要，
+把响应渲染为与接口完全相同的JSON并预先压缩（zstd / br / gzip），写入静态输出目录：
+
+    manifest.json                          市场有效期、schema 和每个文件对应的请求
+    stock/{股票名称}/days-{N}.json          GET /api/stock/{name}?days=N
+    stock/{股票名称}/simple-{N}.json        GET /api/stock/{name}/simple?days=N
+
+API 设置 STOCK_API_STATIC_DIR 为该目录后由 static_files.static_middleware 直接返回（X-Cache: STATIC），
+也可以把目录同步到CDN。非交易时段的请求因此不经过 pandas 和 yfinance。
+
+用法:
+    # 生成当前已收盘的全部市场（适合在每个市场收盘后由定时任务执行）
+    python materialize.py --out static
+
+    # 只生成美股，K线 30/100 根，使用4个进程计算指标
+    python materialize.py --out static --market us_share --days 30 100 --workers 4
+
+    # 使用离线模拟行情（本地验证）
+    python materialize.py --out static --offline
+
+- 交易时段内的市场会被跳过（数据还在变化）；每个市场的文件有效期到下一个交易时段开盘，
+  过期后中间件不再返回，请求回到动态计算
+- 交易时段按工作日和固定的开收盘时间计算，不包含节假日：节假日只会让文件提前失效，不会返回过期数据
+- 只为每个代码的第一个名称生成文件（与 screener.default_universe 相同），用别名请求时照常动态处理
+- 多次执行时 manifest 按市场合并，只替换本次生成的市场
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, time as dtime, timedelta
+from zoneinfo import ZoneInfo
+
+from fastapi.encoders import jsonable_encoder
+
+from compression import COMPRESSORS, LEVELS
+from snapshot import SCHEMA
+from static_files import MANIFEST, MANIFEST_VERSION, SUFFIXES, request_key
+
+# 市场 -> (时区, 开盘时间, 收盘时间)
+SESSIONS = {
+    "a_share": (ZoneInfo("Asia/Shanghai"), dtime(9, 30), dtime(15, 0)),
+    "hk_share": (ZoneInfo("Asia/Hong_Kong"), dtime(9, 30), dtime(16, 0)),
+    "us_share": (ZoneInfo("America/New_York"), dtime(9, 30), dtime(16, 0)),
+}
+
+DEFAULT_OUT = os.environ.get("STOCK_API_STATIC_DIR", "static")
+
+
+def in_session(market, now=None):
+    """market 当前是否处于交易时段（工作日开盘到收盘之间）"""
+    tz, open_time, close_time = SESSIONS[market]
+    local = (now or datetime.now(tz)).astimezone(tz)
+    return local.weekday() < 5 and open_time <= local.time() < close_time
+
+
+def next_open(market, now=None):
+    """market 下一个交易时段的开盘时间（带时区的 datetime）"""
+    tz, open_time, _ = SESSIONS[market]
+    local = (now or datetime.now(tz)).astimezone(tz)
+    candidate = datetime.combine(local.date(), open_time, tzinfo=tz)
+    while candidate <= local or candidate.weekday() >= 5:
+        candidate = datetime.combine(candidate.date() + timedelta(days=1), open_time, tzinfo=tz)
+    return candidate
+
+
+def render_json(payload):
+    """与 FastAPI 的 JSONResponse 相同的序列化方式，保证静态文件与动态响应逐字节一致"""
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def write_response(root, rel_path, payload, encodings):
+    """
+    写出一个响应的JSON和预压缩版本（离线生成，使用最高压缩级别）
+    Returns:
+        (写出的压缩算法列表, 未压缩字节数, 压缩后字节数合计)
+    """
+    body = render_json(payload)
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_atomic(path, body)
+    compressed_bytes = 0
+    for encoding in encodings:
+        compressed = COMPRESSORS[encoding](body, LEVELS["best"][encoding])
+        _write_atomic(path + SUFFIXES[encoding], compressed)
+        compressed_bytes += len(compressed)
+    return list(encodings), len(body), compressed_bytes
+
+
+def load_manifest(root):
+    """读取已有的 manifest；不存在或与当前版本不一致时返回空清单"""
+    try:
+        with open(os.path.join(root, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION and manifest.get("schema") == SCHEMA:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": MANIFEST_VERSION, "schema": SCHEMA, "markets": {}, "files": {}}
+
+
+def materialize(api, root, markets, days_list=(30,), simple_days=(10,), workers=None, encodings=None,
+                now=None):
+    """
+    为 markets 中的股票生成静态响应并更新 manifest
+    Args:
+        api: StockDataAPI
+        root: 输出目录
+        markets: 要生成的市场列表
+        days_list: /api/stock/{name} 的 days 取值
+        simple_days: /api/stock/{name}/simple 的 days 取值
+        workers: 大于1时使用多进程计算指标（get_multiple_stocks）
+        encodings: 预压缩算法，默认全部可用算法
+    Returns:
+        统计信息字典
+    """
+    encodings = list(COMPRESSORS) if encodings is None else encodings
+    now = now or datetime.now().astimezone()
+    stats = {"markets": list(markets), "files": 0, "failed": 0, "bytes": 0, "compressed_bytes": 0}
+    if not markets:
+        return stats
+
+    from screener import default_universe
+
+    universe = {name: api.converter.get_market(code) for name, code in default_universe(api.converter)}
+    universe = {name: market for name, market in universe.items()
+                if market in markets and "/" not in name and not name.startswith(".")}
+    names = list(universe)
+
+    manifest = load_manifest(root)
+    manifest["files"] = {key: entry for key, entry in manifest["files"].items()
+                         if entry["market"] not in markets}
+
+    def record(name, days, simple, payload):
+        rel_path = f"stock/{name}/{'simple' if simple else 'days'}-{days}.json"
+        written, raw, compressed = write_response(root, rel_path, payload, encodings)
+        path = f"/api/stock/{name}/simple" if simple else f"/api/stock/{name}"
+        manifest["files"][request_key(path, days)] = {
+            "path": rel_path, "market": universe[name], "encodings": written}
+        stats["files"] += 1
+        stats["bytes"] += raw
+        stats["compressed_bytes"] += compressed
+
+    for days in days_list:
+        results = api.get_multiple_stocks(names, days, workers=workers)
+        for name, result in results.items():
+            if result.get("success"):
+                record(name, days, False, result)
+            else:
+                stats["failed"] += 1
+
+    from stock_api import simple_response
+
+    for days in simple_days:
+        for name in names:
+            result = api.get_stock_summary(name, days)
+            if result.get("success"):
+                record(name, days, True, simple_response(result, name))
+            else:
+                stats["failed"] += 1
+
+    generated_at = now.timestamp()
+    for market in markets:
+        valid_until = next_open(market, now)
+        manifest["markets"][market] = {
+            "generated_at": generated_at,
+            "valid_until": valid_until.timestamp(),
+            "valid_until_local": valid_until.isoformat(),
+        }
+    manifest["generated_at"] = generated_at
+
+    # 所有文件写完后再替换 manifest，服务端不会看到指向未写完文件的条目
+    os.makedirs(root, exist_ok=True)
+    _write_atomic(os.path.join(root, MANIFEST),
+                  json.dumps(manifest, ensure_ascii=False, indent=1).encode("utf-8"))
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="收盘后预渲染整个股票池的静态响应")
+    parser.add_argument("--out", default=DEFAULT_OUT, help=f"输出目录，默认 {DEFAULT_OUT}（STOCK_API_STATIC_DIR）")
+    parser.add_argument("--market", nargs="+", choices=list(SESSIONS), default=list(SESSIONS),
+                        help="要生成的市场，默认全部；交易时段内的市场总会被跳过")
+    parser.add_argument("--days", type=int, nargs="+", default=[30], help="/api/stock/{name} 的 days 取值")
+    parser.add_argument("--simple-days", type=int, nargs="+", default=[10],
+                        help="/api/stock/{name}/simple 的 days 取值（最大30）")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="指标计算进程数，默认读取 STOCK_API_BATCH_WORKERS")
+    parser.add_argument("--encodings", nargs="+", choices=list(COMPRESSORS), default=list(COMPRESSORS),
+                        help="预压缩算法，默认全部可用算法")
+    parser.add_argument("--offline", action="store_true", help="使用离线模拟行情")
+    args = parser.parse_args(argv)
+
+    if any(days > 30 for days in args.simple_days):
+        parser.error("--simple-days 不能超过30（/simple 接口的上限）")
+
+    from stock_api import StockDataAPI
+
+    now = datetime.now().astimezone()
+    markets = []
+    for market in args.market:
+        if in_session(market, now):
+            print(f"跳过 {market}: 交易时段内")
+        else:
+            markets.append(market)
+
+    start = time.perf_counter()
+    api = StockDataAPI(offline=True if args.offline else None)
+    try:
+        stats = materialize(api, args.out, markets, args.days, args.simple_days, args.workers,
+                            args.encodings, now)
+    finally:
+        api.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"市场: {', '.join(stats['markets']) or '无'}")
+    print(f"文件: {stats['files']} 个（失败 {stats['failed']}），JSON {stats['bytes'] / 1024:.1f} KB，"
+          f"压缩版本合计 {stats['compressed_bytes'] / 1024:.1f} KB，耗时 {elapsed:.1f}s")
+    print(f"输出目录: {os.path.abspath(args.out)}")
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+# metrics.py - 轻量级Prometheus指标（无第三方依赖）
+"""
+提供 Counter / Gauge / Histogram 三种指标，以及 /metrics 端点使用的文本格式输出。
+记录一次指标只是一次加锁的字典更新，可以在生产环境常开。
+
+    from metrics import STAGE_SECONDS, time_stage
+
+    with time_stage("fetch", "a_share"):
+        ...
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 当前请求的阶段耗时列表 [(stage, seconds)]，由 Server-Timing 中间件设置
+request_timings_var = ContextVar("request_timings", default=None)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs)
+    return "{" + body + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, key, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        self._function = None
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_function(self, func):
+        """使用回调函数提供当前值（用于已有统计的对象，如缓存）"""
+        self._function = func
+
+    def _samples(self):
+        if self._function is not None:
+            return [("", (), None, self._function())]
+        with self._lock:
+            return [("", key, None, value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """可增可减的当前值"""
+
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """分桶直方图，默认桶适合以秒为单位的请求阶段耗时"""
+
+    type_name = "histogram"
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # key -> [每个桶的计数..., +Inf桶计数, 总和]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            state[index] += 1
+            state[-1] += value
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                samples.append(("_bucket", key, ("le", _format_value(bound)), cumulative))
+            samples.append(("_sum", key, None, state[-1]))
+            samples.append(("_count", key, None, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """输出Prometheus文本格式"""
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "stock_api_stage_seconds", "请求处理各阶段耗时（fetch/indicators/summary/compact/serialize）",
+    ("stage", "market")))
+UPSTREAM_REQUESTS = REGISTRY.register(Counter(
+    "stock_api_upstream_requests_total", "上游行情接口调用次数", ("market",)))
+UPSTREAM_ERRORS = REGISTRY.register(Counter(
+    "stock_api_upstream_errors_total", "上游行情接口调用失败次数", ("market",)))
+MOCK_FALLBACKS = REGISTRY.register(Counter(
+    "stock_api_mock_fallback_total", "回退到模拟数据的次数", ("reason",)))
+CACHE_HITS = REGISTRY.register(Counter("stock_api_cache_hits_total", "结果缓存命中次数"))
+CACHE_MISSES = REGISTRY.register(Counter("stock_api_cache_misses_total", "结果缓存未命中次数"))
+CACHE_EVICTIONS = REGISTRY.register(Counter("stock_api_cache_evictions_total", "结果缓存淘汰次数"))
+CACHE_SIZE = REGISTRY.register(Gauge("stock_api_cache_size", "结果缓存当前条目数"))
+LIVE_SUBSCRIBERS = REGISTRY.register(Gauge("stock_api_live_subscribers", "实时推送当前订阅数"))
+LIVE_FEEDS = REGISTRY.register(Gauge("stock_api_live_feeds", "实时推送当前轮询的股票数"))
+LIVE_POLLS = REGISTRY.register(Counter("stock_api_live_polls_total", "实时推送上游轮询次数"))
+LIVE_MESSAGES = REGISTRY.register(Counter("stock_api_live_messages_total", "实时推送发出的消息数"))
+LIVE_DROPPED = REGISTRY.register(Counter(
+    "stock_api_live_dropped_total", "订阅者消费过慢时丢弃的旧消息数"))
+COMPRESSED_RESPONSES = REGISTRY.register(Counter(
+    "stock_api_compressed_responses_total", "压缩的响应数（cache=hit 表示复用了缓存的压缩结果）",
+    ("encoding", "cache")))
+COMPRESSION_BYTES = REGISTRY.register(Counter(
+    "stock_api_compression_bytes_total", "压缩前(in)/后(out)的响应字节数", ("direction",)))
+DEADLINE_EXCEEDED = REGISTRY.register(Counter(
+    "stock_api_deadline_exceeded_total", "超过请求时间预算的次数", ("stage",)))
+DEADLINE_FALLBACKS = REGISTRY.register(Counter(
+    "stock_api_deadline_fallback_total", "超时后的处理结果（stale=返回过期缓存，timeout=无可用缓存）",
+    ("outcome",)))
+
+
+def bind_cache(cache):
+    """将 LRUCache 的统计接入缓存相关指标"""
+    CACHE_HITS.set_function(lambda: cache.hits)
+    CACHE_MISSES.set_function(lambda: cache.misses)
+    CACHE_EVICTIONS.set_function(lambda: cache.evictions)
+    CACHE_SIZE.set_function(lambda: len(cache))
+
+
+class time_stage:
+    """
+    记录一个处理阶段耗时的上下文管理器
+    用类而不是 contextlib.contextmanager 实现，开销更低
+    """
+
+    __slots__ = ("stage", "market", "start")
+
+    def __init__(self, stage, market="unknown"):
+        self.stage = stage
+        self.market = market
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(elapsed, stage=self.stage, market=self.market)
+        timings = request_timings_var.get()
+        if timings is not None:
+            timings.append((self.stage, elapsed))
+        return False
+
+
+def render():
+    return REGISTRY.render()
@@ -0,0 +1,199 @@
+# profiling.py - 单请求采样分析和 Server-Timing 响应头
+"""
+1. server_timing_middleware: 为每个响应添加 Server-Timing 头，列出
+   fetch / indicators / summary / compact / serialize 等阶段耗时，浏览器开发者工具和网关可直接查看
+2. SamplingProfiler: 以固定间隔采样指定线程的调用栈，生成火焰图可用的 collapsed 格式
+
+单请求分析需要设置环境变量 STOCK_API_PROFILE_TOKEN，请求时携带相同的 X-Profile-Token 头，
+分析结果保存在 STOCK_API_PROFILE_DIR（默认系统临时目录下的 stock_api_profiles）。
+"""
+import hmac
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+from metrics import request_timings_var
+
+PROFILE_TOKEN_ENV = "STOCK_API_PROFILE_TOKEN"
+
+
+def format_server_timing(timings, total=None):
+    """把 [(stage, seconds)] 转换为 Server-Timing 头，同名阶段的耗时累加"""
+    merged = {}
+    for stage, seconds in timings:
+        merged[stage] = merged.get(stage, 0.0) + seconds
+    parts = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in merged.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+async def server_timing_middleware(request, call_next):
+    """
+    FastAPI HTTP中间件：收集本次请求的阶段耗时并写入 Server-Timing 头
+    用法: app.middleware("http")(server_timing_middleware)
+    """
+    timings = []
+    token = request_timings_var.set(timings)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_timings_var.reset(token)
+    response.headers["Server-Timing"] = format_server_timing(timings, time.perf_counter() - start)
+    return response
+
+
+class SamplingProfiler:
+    """
+    采样式CPU分析器
+    后台线程每隔 interval 秒读取一次目标线程的调用栈，开销与被分析代码的调用次数无关
+    """
+
+    def __init__(self, interval=0.001, thread_id=None, max_depth=64, root_frame=None):
+        """
+        Args:
+            interval: 采样间隔（秒）
+            thread_id: 被采样的线程，默认当前线程
+            max_depth: 调用栈最大深度
+            root_frame: 只保留该栈帧以下的调用（去掉框架和事件循环的外层栈帧）
+        """
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.max_depth = max_depth
+        self.root_frame = root_frame
+        self.stacks = Counter()
+        self.samples = 0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = 0.0
+
+    @staticmethod
+    def _frame_label(frame):
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        stack = []
+        while frame is not None and frame is not self.root_frame and len(stack) < self.max_depth:
+            stack.append(self._frame_label(frame))
+            frame = frame.f_back
+        if self.root_frame is not None and frame is None:
+            return  # 采样时目标线程不在被分析的调用内
+        if not stack:
+            return
+        self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stock-api-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self._started
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def collapsed(self):
+        """火焰图工具（flamegraph.pl / speedscope）使用的 collapsed stack 文本"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit=20):
+        """按采样次数统计函数的 self / total 占比"""
+        self_counts = Counter()
+        total_counts = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            self_counts[frames[-1]] += count
+            for frame in set(frames):
+                total_counts[frame] += count
+
+        samples = self.samples or 1
+        return [
+            {
+                "function": name,
+                "total_pct": round(count / samples * 100, 1),
+                "self_pct": round(self_counts[name] / samples * 100, 1),
+            }
+            for name, count in total_counts.most_common(limit)
+        ]
+
+
+def profiling_allowed(token):
+    """校验分析令牌；未配置 STOCK_API_PROFILE_TOKEN 时一律拒绝"""
+    expected = os.environ.get(PROFILE_TOKEN_ENV)
+    if not expected or not token:
+        return False
+    return hmac.compare_digest(expected, token)
+
+
+def _profile_dir():
+    path = os.environ.get("STOCK_API_PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "stock_api_profiles")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def save_profile(profiler, metadata):
+    """保存分析结果，返回可在响应中直接返回的摘要"""
+    profile_id = uuid.uuid4().hex[:12]
+    path = os.path.join(_profile_dir(), f"{profile_id}.json")
+    summary = {
+        "id": profile_id,
+        "samples": profiler.samples,
+        "interval_ms": profiler.interval * 1000,
+        "duration_ms": round(profiler.duration * 1000, 2),
+        "top": profiler.top_functions(),
+        **metadata,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({**summary, "collapsed": profiler.collapsed()}, f, ensure_ascii=False)
+    return summary
+
+
+def load_profile(profile_id):
+    """读取已保存的分析结果，不存在时返回None"""
+    if not profile_id.isalnum():
+        return None
+    path = os.path.join(_profile_dir(), f"{profile_id}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run_profiled(func, *args, sample_interval=None, metadata=None, **kwargs):
+    """
+    在采样分析下执行 func(*args, **kwargs)
+
+    采样间隔用 sample_interval 指定，避免与被分析函数自己的 interval 参数冲突
+    Returns:
+        (func的返回值, 分析摘要)
+    """
+    sample_interval = sample_interval or float(os.environ.get("STOCK_API_PROFILE_INTERVAL", 0.001))
+    with SamplingProfiler(interval=sample_interval, root_frame=sys._getframe()) as profiler:
+        result = func(*args, **kwargs)
+    return result, save_profile(profiler, metadata or {})
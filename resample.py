@@ -0,0 +1,187 @@
+# resample.py - K线周期定义和向量化的OHLCV重采样
+"""
+支持的周期: 1m / 5m / 15m / 60m / 1d / 1wk / 1mo
+
+较粗的周期不单独向上游请求，而是从能覆盖所需时间范围的最细基础周期本地聚合：
+- 1wk / 1mo 由 1d 聚合
+- 15m / 60m 由 5m（或 1m）聚合；只使用能整除目标周期的基础周期，不会用较粗的K线冒充较细的周期
+- 超出上游可回溯范围时把基础K线数截断到该范围（max_bars 给出每个分钟周期最多能提供的K线数）
+聚合规则: open取第一根，high取最大，low取最小，close取最后一根，volume求和
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+# 周期 -> 每根K线的分钟数（日线及以上为None）
+INTERVALS = {
+    "1m": 1,
+    "5m": 5,
+    "15m": 15,
+    "60m": 60,
+    "1d": None,
+    "1wk": None,
+    "1mo": None,
+}
+
+INTRADAY_INTERVALS = ("1m", "5m", "15m", "60m")
+
+# 分钟线基础周期及其上游（yfinance）可回溯的自然日数
+INTRADAY_BASES = (("1m", 7), ("5m", 60), ("60m", 730))
+
+# 每根日线以上周期K线大约包含的交易日数
+DAYS_PER_BAR = {"1d": 1, "1wk": 5, "1mo": 21}
+
+# 按最短交易时段（A股每天4小时）估算分钟线需要的自然日数
+MIN_SESSION_MINUTES = 240
+
+
+def validate_interval(interval):
+    if interval not in INTERVALS:
+        raise ValueError(f"不支持的周期: {interval}，可选: {', '.join(INTERVALS)}")
+    return interval
+
+
+def is_intraday(interval):
+    return interval in INTRADAY_INTERVALS
+
+
+def _intraday_bases(interval):
+    """能整除 interval 的分钟线基础周期（从细到粗）"""
+    minutes = INTERVALS[interval]
+    return [(base, max_days) for base, max_days in INTRADAY_BASES if minutes % INTERVALS[base] == 0]
+
+
+def _base_capacity(base, max_days):
+    """基础周期在 max_days 自然日内最多能提供的K线数（plan_base 中 calendar_days 估算的反函数）"""
+    return (max_days - 3) * 5 * MIN_SESSION_MINUTES // (7 * INTERVALS[base])
+
+
+def max_bars(interval):
+    """
+    上游可回溯范围内 interval 周期最多能提供的K线数
+    Returns:
+        K线数；日线及以上周期不受限制，返回None
+    """
+    validate_interval(interval)
+    if not is_intraday(interval):
+        return None
+    minutes = INTERVALS[interval]
+    return max(_base_capacity(base, max_days) * INTERVALS[base] // minutes
+               for base, max_days in _intraday_bases(interval))
+
+
+def check_bars(interval, bars):
+    """bars 超过 interval 周期的可回溯范围时抛出 ValueError"""
+    limit = max_bars(interval)
+    if limit is not None and bars > limit:
+        raise ValueError(f"{interval} 周期最多可获取 {limit} 根K线（上游分钟线的回溯范围有限）")
+    return bars
+
+
+def plan_base(interval, bars):
+    """
+    选择基础周期并估算需要的基础K线数量和回溯自然日数
+    超出所有可用基础周期的回溯范围时，使用回溯范围最长的基础周期并把K线数截断到该范围
+    （返回的K线会少于 bars，例如预热K线被截短；调用方应先用 check_bars 校验请求的K线数）
+    Returns:
+        (base_interval, base_bars, calendar_days)
+    """
+    validate_interval(interval)
+
+    if not is_intraday(interval):
+        base_bars = bars * DAYS_PER_BAR[interval] + DAYS_PER_BAR[interval]
+        return "1d", base_bars, base_bars * 2  # 多获取一些数据，覆盖节假日
+
+    minutes = INTERVALS[interval]
+    bases = _intraday_bases(interval)
+    for base, max_days in bases:
+        base_minutes = INTERVALS[base]
+        base_bars = bars * (minutes // base_minutes)
+        calendar_days = math.ceil(base_bars * base_minutes / MIN_SESSION_MINUTES * 7 / 5) + 3
+        if calendar_days <= max_days:
+            return base, base_bars, calendar_days
+
+    base, max_days = bases[-1]
+    return base, _base_capacity(base, max_days), max_days
+
+
+def estimate_bars(interval, start, end):
+    """
+    估算 start 到 end（datetime）之间 interval 周期的K线数量（偏多估计，用于决定向上游获取多少根）
+    """
+    validate_interval(interval)
+    calendar_days = max((end - start).days, 0) + 1
+    trading_days = math.ceil(calendar_days * 5 / 7) + 1
+    if not is_intraday(interval):
+        return math.ceil(trading_days / DAYS_PER_BAR[interval]) + 1
+    # 按最长交易时段（美股每天390分钟）估算
+    return math.ceil(trading_days * 390 / INTERVALS[interval])
+
+
+def _bucket_starts(times, interval):
+    """
+    计算每根K线所属的聚合桶，返回每个桶第一根K线的下标
+    Args:
+        times: datetime64[m] 数组（已排序）
+    """
+    minutes = times.astype("datetime64[m]").astype(np.int64)
+
+    if interval == "1d":
+        keys = minutes // 1440
+    elif interval == "1wk":
+        # 1970-01-01 是星期四，+3 后按周一对齐
+        keys = (minutes // 1440 + 3) // 7
+    elif interval == "1mo":
+        keys = times.astype("datetime64[M]").astype(np.int64)
+    else:
+        step = INTERVALS[interval]
+        day = minutes // 1440
+        # 以每个交易日第一根K线的时间为起点切分，避免9:30开盘的60分钟线被切成9:00-10:00
+        day_change = np.flatnonzero(np.diff(day)) + 1
+        day_starts = np.concatenate([[0], day_change])
+        session_open = np.repeat(minutes[day_starts], np.diff(np.concatenate([day_starts, [len(minutes)]])))
+        keys = day * 1440 + (minutes - session_open) // step
+
+    return np.concatenate([[0], np.flatnonzero(np.diff(keys)) + 1])
+
+
+def resample_ohlcv(df, interval):
+    """
+    把较细周期的K线聚合为 interval 周期
+    Args:
+        df: 包含 date(str), open, high, low, close, volume 的DataFrame，按日期升序
+        interval: 目标周期
+    Returns:
+        同样格式的DataFrame，date 为每个聚合桶第一根K线的时间
+    """
+    validate_interval(interval)
+    if df is None or len(df) == 0:
+        return df
+
+    times = pd.to_datetime(df["date"]).to_numpy(dtype="datetime64[m]")
+    return aggregate_ohlcv(df, _bucket_starts(times, interval))
+
+
+def aggregate_ohlcv(df, starts):
+    """
+    按给定的桶起点聚合K线
+    Args:
+        df: 包含 date, open, high, low, close, volume 的DataFrame
+        starts: 每个桶第一根K线的下标（升序，从0开始）
+    """
+    ends = np.concatenate([starts[1:], [len(df)]]) - 1
+
+    high = df["high"].to_numpy()
+    low = df["low"].to_numpy()
+    volume = df["volume"].to_numpy()
+
+    result = pd.DataFrame({
+        "date": df["date"].to_numpy()[starts],
+        "open": df["open"].to_numpy()[starts],
+        "high": np.maximum.reduceat(high, starts),
+        "low": np.minimum.reduceat(low, starts),
+        "close": df["close"].to_numpy()[ends],
+        "volume": np.add.reduceat(volume, starts),
+    })
+    return result
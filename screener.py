@@ -0,0 +1,317 @@
+# screener.py - 全市场选股：最新指标表 + 条件表达式筛选
+"""
+"哪些股票超卖且MACD金叉"这类问题原先只能对每只股票调用一次 /api/stock/{name}。
+
+LatestIndicatorTable 为股票池中每只股票保存最新一根K线的指标值（列式 numpy 矩阵）：
+- 每行记录过期时间，refresh() 只重新计算已过期的行（增量刷新）；过期时间在 max_age 的
+  75%~100% 之间随机分布，各行不会同时过期
+- 筛选时不在请求中刷新：过期的行由后台线程刷新，筛选直接使用当前的表（响应中的 pending 为待刷新的行数）；
+  只有表中还没有任何数据（冷启动）时，最多等待 wait 秒让后台刷新先完成一部分
+- 筛选时条件表达式直接在整列上向量化求值，全市场筛选只需要毫秒级
+
+条件表达式使用 Python 比较/布尔语法，只允许列名、数字和 and / or / not，例如:
+    RSI < 30 and MACD_golden_cross
+    K < 20 and not above_MA20 or price_change_5d > 5
+"""
+import ast
+import random
+import threading
+import time
+
+import numpy as np
+
+from log_utils import get_logger
+from warmup import plan_bars
+
+logger = get_logger(__name__)
+
+# 表中保存的数值列
+FLOAT_COLUMNS = (
+    "close", "volume", "price_change", "price_change_5d",
+    "MA5", "MA10", "MA20", "MA60",
+    "RSI", "MACD", "MACD_signal", "MACD_hist", "K", "D", "J",
+)
+
+# 表中保存的信号列（布尔）
+FLAG_COLUMNS = (
+    "above_MA5", "above_MA10", "above_MA20",
+    "RSI_overbought", "RSI_oversold",
+    "MACD_golden_cross", "MACD_death_cross",
+    "KDJ_golden_cross", "KDJ_death_cross",
+    "K_overbought", "K_oversold",
+)
+
+COLUMNS = FLOAT_COLUMNS + FLAG_COLUMNS
+
+# 计算最新指标使用的K线数量（最新一根K线加上表中各列的预热期，与请求的 days 无关）
+LOOKBACK_BARS = plan_bars(1, COLUMNS)
+
+# 行的有效期在 max_age 的 (1 - EXPIRY_JITTER) ~ 1 倍之间随机分布
+EXPIRY_JITTER = 0.25
+
+_COMPARE_OPS = {
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+}
+
+
+def compile_filter(expression, columns=COLUMNS):
+    """
+    解析条件表达式，返回 AST；包含不允许的语法或未知列名时抛出 ValueError
+    Args:
+        columns: 允许使用的列名
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"条件表达式语法错误: {e.msg}")
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if node.id not in columns:
+                raise ValueError(f"未知的列: {node.id}")
+        elif isinstance(node, ast.Constant):
+            if not isinstance(node.value, (int, float, bool)):
+                raise ValueError(f"不支持的常量: {node.value!r}")
+        elif isinstance(node, ast.Compare):
+            for op in node.ops:
+                if type(op) not in _COMPARE_OPS:
+                    raise ValueError("只支持 < <= > >= == != 比较")
+        elif isinstance(node, ast.UnaryOp):
+            if not isinstance(node.op, (ast.Not, ast.USub)):
+                raise ValueError("只支持 not 和负号")
+        elif not isinstance(node, (ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.Load,
+                                   ast.Not, ast.USub) + tuple(_COMPARE_OPS)):
+            raise ValueError(f"不支持的语法: {type(node).__name__}")
+    if not _is_condition(tree.body):
+        raise ValueError("条件表达式的结果必须是布尔值（比较、信号列或它们的 and / or / not 组合）")
+    return tree
+
+
+def _is_condition(node):
+    """节点的值是否为布尔条件：比较、信号列、布尔常量，以及它们的 and / or / not 组合"""
+    if isinstance(node, ast.Compare):
+        return True
+    if isinstance(node, ast.Name):
+        return node.id in FLAG_COLUMNS
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, bool)
+    if isinstance(node, ast.BoolOp):
+        return all(_is_condition(value) for value in node.values)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return _is_condition(node.operand)
+    return False
+
+
+def evaluate_filter(node, columns):
+    """
+    在列数组上向量化求值（NaN参与比较时结果为False）
+    Args:
+        node: compile_filter 返回的 AST
+        columns: 列名 -> 数组（一维或二维均可，按numpy广播规则计算）
+    """
+    if isinstance(node, ast.Expression):
+        return evaluate_filter(node.body, columns)
+    if isinstance(node, ast.Name):
+        return columns[node.id]
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.UnaryOp):
+        value = evaluate_filter(node.operand, columns)
+        if isinstance(node.op, ast.Not):
+            return ~np.asarray(value, dtype=bool)
+        return -np.asarray(value, dtype=np.float64)
+    if isinstance(node, ast.BoolOp):
+        values = [np.asarray(evaluate_filter(v, columns), dtype=bool) for v in node.values]
+        reduce = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return reduce.reduce(values)
+    if isinstance(node, ast.Compare):
+        left = evaluate_filter(node.left, columns)
+        mask = True
+        for op, comparator in zip(node.ops, node.comparators):
+            right = evaluate_filter(comparator, columns)
+            mask = np.logical_and(mask, _COMPARE_OPS[type(op)](left, right))
+            left = right
+        return mask
+    raise ValueError(f"不支持的语法: {type(node).__name__}")
+
+
+class LatestIndicatorTable:
+    """股票池中每只股票最新一根K线的指标表"""
+
+    def __init__(self, fetcher, calculator, universe, max_age=300.0, lookback=LOOKBACK_BARS, wait=1.0):
+        """
+        Args:
+            fetcher: KlineFetcher
+            calculator: IndicatorCalculator
+            universe: [(股票名称, 股票代码)]
+            max_age: 行的最长有效时间（秒），过期后由后台线程重新计算
+            lookback: 计算指标使用的K线数量
+            wait: 表中还没有数据时，筛选最多等待后台刷新的秒数
+        """
+        self.fetcher = fetcher
+        self.calculator = calculator
+        self.max_age = max_age
+        self.lookback = lookback
+        self.wait = wait
+        self.names = [name for name, _ in universe]
+        self.codes = [code for _, code in universe]
+
+        n = len(self.names)
+        self.values = np.full((n, len(COLUMNS)), np.nan)
+        self.dates = [None] * n
+        self.expires_at = np.zeros(n)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def _update_row(self, i):
+        df = self.fetcher.get_kline_data(self.names[i], self.lookback)
+        row = np.full(len(COLUMNS), np.nan)
+        date = None
+        if df is not None and len(df) > 0:
+            result = self.calculator.calculate_all(df)
+            latest = result.iloc[-1]
+            for j, col in enumerate(COLUMNS):
+                if col in result.columns:
+                    row[j] = float(latest[col])
+            date = str(latest["date"])
+        self.values[i] = row
+        self.dates[i] = date
+        self.expires_at[i] = time.time() + self.max_age * (1 - EXPIRY_JITTER * random.random())
+
+    def stale_rows(self, now=None):
+        """已过期（或从未计算）的行号，最早过期的在前"""
+        stale = np.flatnonzero(self.expires_at <= (now or time.time()))
+        return stale[np.argsort(self.expires_at[stale], kind="stable")]
+
+    def refresh(self, force=False):
+        """
+        重新计算过期的行（在调用线程中执行，筛选时由后台线程调用）
+        Returns:
+            本次刷新的行数
+        """
+        with self._lock:
+            now = time.time()
+            stale = np.arange(len(self)) if force else self.stale_rows(now)
+            for i in stale.tolist():
+                try:
+                    self._update_row(i)
+                except Exception:
+                    logger.exception("更新选股指标失败", extra={"stock": self.names[i]})
+                    # 失败的行稍后再试，避免每次刷新都卡在同一只股票上
+                    self.expires_at[i] = time.time() + self.max_age * (1 - EXPIRY_JITTER)
+            if len(stale):
+                logger.info("选股指标表已刷新", extra={"rows": len(stale), "elapsed_ms":
+                                                    round((time.time() - now) * 1000, 2)})
+            return len(stale)
+
+    def refresh_in_background(self):
+        """
+        有过期的行时启动后台刷新线程（已在刷新时不重复启动）
+        Returns:
+            正在运行的刷新线程，没有需要刷新的行时返回None
+        """
+        with self._worker_lock:
+            if self._worker is not None and self._worker.is_alive():
+                return self._worker
+            if not len(self.stale_rows()):
+                return None
+            self._worker = threading.Thread(target=self.refresh, name="screener-refresh", daemon=True)
+            self._worker.start()
+            return self._worker
+
+    def ready(self):
+        """已有数据的行数"""
+        return sum(1 for d in self.dates if d is not None)
+
+    def columns(self):
+        """列名 -> 整列数组（信号列为bool）"""
+        result = {}
+        for j, col in enumerate(COLUMNS):
+            values = self.values[:, j]
+            result[col] = np.nan_to_num(values, nan=0.0).astype(bool) if col in FLAG_COLUMNS else values
+        return result
+
+    def screen(self, expression=None, sort=None, ascending=False, limit=50, fields=None):
+        """
+        按条件表达式筛选
+        Args:
+            expression: 条件表达式，为空时返回全部
+            sort: 排序列
+            ascending: 是否升序
+            limit: 最多返回的行数
+            fields: 返回的列，默认全部
+        Returns:
+            (总匹配数, [行字典])
+        """
+        tree = compile_filter(expression) if expression else None
+        if sort is not None and sort not in COLUMNS:
+            raise ValueError(f"未知的排序列: {sort}")
+        fields = list(fields) if fields else list(COLUMNS)
+        unknown = [f for f in fields if f not in COLUMNS]
+        if unknown:
+            raise ValueError(f"未知的列: {', '.join(unknown)}")
+
+        worker = self.refresh_in_background()
+        if worker is not None and self.wait and not self.ready():
+            worker.join(self.wait)
+        columns = self.columns()
+        valid = np.array([d is not None for d in self.dates], dtype=bool)
+        mask = valid if tree is None else valid & np.broadcast_to(evaluate_filter(tree, columns), valid.shape)
+        matched = np.flatnonzero(mask)
+
+        if sort is not None:
+            keys = columns[sort][matched].astype(np.float64)
+            keys = np.where(np.isnan(keys), np.inf, keys if ascending else -keys)
+            matched = matched[np.argsort(keys, kind="stable")]
+
+        rows = []
+        for i in matched[:limit].tolist():
+            row = {"stock_name": self.names[i], "stock_code": self.codes[i], "date": self.dates[i]}
+            for col in fields:
+                value = columns[col][i]
+                if col in FLAG_COLUMNS:
+                    row[col] = bool(value)
+                else:
+                    row[col] = float(value) if np.isfinite(value) else None
+            rows.append(row)
+        return len(matched), rows
+
+
+def default_universe(converter):
+    """股票池：converter 中的全部股票代码，别名只保留第一个名称"""
+    seen = {}
+    for name, code in converter.stock_dict.items():
+        seen.setdefault(code, name)
+    return [(name, code) for code, name in seen.items()]
+
+
+# 测试代码
+if __name__ == "__main__":
+    from indicators import IndicatorCalculator
+    from kline_fetcher import KlineFetcher
+    from stock_code import StockCodeConverter
+
+    converter = StockCodeConverter()
+    fetcher = KlineFetcher(offline=True)
+    fetcher.set_converter(converter)
+    table = LatestIndicatorTable(fetcher, IndicatorCalculator(), default_universe(converter))
+
+    start = time.perf_counter()
+    table.refresh()
+    print(f"建表: {len(table)} 只股票，{(time.perf_counter() - start) * 1000:.1f}ms，待刷新 {len(table.stale_rows())} 行")
+
+    start = time.perf_counter()
+    total, rows = table.screen("RSI < 50 and not above_MA20", sort="RSI", ascending=True,
+                               fields=["RSI", "K", "MACD_hist"])
+    print(f"筛选: {total} 只，{(time.perf_counter() - start) * 1000:.2f}ms")
+    for row in rows:
+        print(row)
@@ -0,0 +1,219 @@
+# shared_cache.py - 同一主机多个worker进程共享的缓存（SQLite + 进程内LRU）
+"""
+uvicorn 多worker部署时，每个进程各自持有 StockDataAPI.cache，命中率随worker数下降，
+同一只股票会被每个worker重复从yfinance获取。
+
+TieredCache 在进程内 LRUCache（L1）后面加一层基于SQLite文件的共享缓存（L2）：
+- L1 未命中时查询 L2，命中后按L2条目的剩余有效期回填 L1
+- 写入时同时写 L1 和 L2，其他worker随后即可直接命中
+- SQLite 使用 WAL 模式，读写互不阻塞；每个线程使用独立连接
+
+设置环境变量 STOCK_API_SHARED_CACHE=/path/to/cache.db 即可启用（结果缓存和基础K线缓存共用同一个文件）。
+缓存文件只应放在服务自身可写的目录（值使用pickle序列化）。
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from cache import LRUCache
+
+
+class SQLiteCache:
+    """基于SQLite文件的键值缓存，可被同一主机上的多个进程同时使用"""
+
+    def __init__(self, path, ttl=None, max_entries=10000, timeout=5.0):
+        self.path = path
+        self.ttl = ttl or None
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._local = threading.local()
+        self._writes = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL, created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_created ON cache(created_at)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, default=None):
+        entry = self.get_with_ttl(key)
+        return default if entry is None else entry[0]
+
+    @staticmethod
+    def _key(key):
+        """非字符串的键（如基础K线缓存的 (代码, 周期) 元组）按 repr 保存"""
+        return key if isinstance(key, str) else repr(key)
+
+    def get_with_ttl(self, key):
+        """
+        读取未过期的条目
+        Returns:
+            (value, 剩余有效秒数)；不过期的条目剩余秒数为None，不存在或已过期时返回None
+        """
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (self._key(key),)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        remaining = expires_at - time.time() if expires_at is not None else None
+        if remaining is not None and remaining < 0:
+            return None
+        try:
+            return pickle.loads(value), remaining
+        except Exception:
+            # 代码版本变化导致无法反序列化时视为未命中
+            return None
+
+    def get_stale(self, key):
+        """读取缓存（包括已过期但尚未被清理的条目），返回 (value, 已过期秒数) 或None"""
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (self._key(key),)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        try:
+            value = pickle.loads(value)
+        except Exception:
+            return None
+        return value, max(time.time() - expires_at, 0.0) if expires_at is not None else 0.0
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at, created_at) VALUES (?, ?, ?, ?)",
+            (self._key(key), blob, expires_at, now)
+        )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.trim()
+
+    def trim(self):
+        """删除过期条目，并在超过容量时删除最早写入的条目"""
+        conn = self._conn()
+        conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+        count = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY created_at LIMIT ?)",
+                (excess,)
+            )
+            self.evictions += excess
+
+    def __contains__(self, key):
+        row = self._conn().execute(
+            "SELECT expires_at FROM cache WHERE key = ?", (self._key(key),)
+        ).fetchone()
+        return row is not None and (row[0] is None or row[0] >= time.time())
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache")
+
+
+class TieredCache:
+    """
+    两级缓存：进程内 LRUCache（L1） + 跨进程 SQLiteCache（L2）
+    接口与 LRUCache 一致，可直接替换 StockDataAPI.cache
+    """
+
+    def __init__(self, l1, l2):
+        self.l1 = l1
+        self.l2 = l2
+        self.l2_hits = 0
+        self.misses = 0
+
+    @property
+    def hits(self):
+        return self.l1.hits + self.l2_hits
+
+    @property
+    def evictions(self):
+        """两级的淘汰次数之和（L2 为SQLite容量裁剪或快照目录清理）"""
+        return self.l1.evictions + self.l2.evictions
+
+    def get(self, key, default=None):
+        value = self.l1.get(key)
+        if value is not None:
+            return value
+        # L1未命中已计入 l1.misses，这里单独统计最终结果
+        entry = self.l2.get_with_ttl(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.l2_hits += 1
+        # 按L2条目的剩余有效期回填，条目在两级之间来回时不会延长寿命
+        value, remaining = entry
+        self.l1.set(key, value, ttl=remaining)
+        return value
+
+    def get_stale(self, key):
+        return self.l1.get_stale(key) or self.l2.get_stale(key)
+
+    def set(self, key, value):
+        self.l1.set(key, value)
+        self.l2.set(key, value)
+
+    def __contains__(self, key):
+        return key in self.l1 or key in self.l2
+
+    def __len__(self):
+        return len(self.l1)
+
+    def clear(self):
+        self.l1.clear()
+        self.l2.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self.l1),
+            "maxsize": self.l1.maxsize,
+            "hits": self.hits,
+            "l1_hits": self.l1.hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "l1_evictions": self.l1.evictions,
+            "l2_evictions": self.l2.evictions,
+            "shared_size": len(self.l2),
+            "hit_ratio": self.hits / total if total else 0.0
+        }
+
+
+def create_cache(maxsize=512, ttl=None, shared_path=None, name="results"):
+    """
+    创建缓存：指定 shared_path 时返回 LRUCache + SQLite 两级缓存；
+    否则启用了磁盘快照（snapshot.snapshot_dir）时返回 LRUCache + 快照两级缓存，都未启用时返回进程内 LRUCache
+    Args:
+        name: 快照子目录名（结果缓存 results，基础K线缓存 bars）
+    """
+    l1 = LRUCache(maxsize=maxsize, ttl=ttl)
+    if not shared_path:
+        from snapshot import snapshot_cache
+        return snapshot_cache(l1, name, ttl)
+    return TieredCache(l1, SQLiteCache(shared_path, ttl=ttl))
@@ -0,0 +1,363 @@
+# snapshot.py - 磁盘快照：新容器从临时目录按需恢复缓存，冷启动也能命中
+"""
+Vercel 上每个冷启动的容器缓存都是空的，api/index.py 的每个请求都要重新计算。
+同一台主机上回收后重建的容器仍能看到 /tmp 中的文件，SnapshotStore 把缓存写成快照文件：
+
+- 结果缓存（CompactResult）和基础K线缓存（KlineFetcher.base_cache 中的 DataFrame）
+  写入时同时保存为快照，每个缓存键一个文件，先写临时文件再原子替换
+- 新容器不在启动时加载，而是在内存缓存未命中时才按键打开对应文件并 mmap，
+  数值列直接用 np.frombuffer 引用映射的内存（不复制，按页读入）
+- 文件头包含魔数、格式版本、schema 指纹（指标列、预热设置和部署版本）、缓存键、写入时间和校验和；
+  版本或 schema 不一致、超过有效期、被截断或校验失败的文件都视为未命中并删除
+
+文件布局:
+    MAGIC(8字节) | 头长度(uint32) | 头CRC32(uint32) | 头JSON | 对齐填充 | 数组1 | 数组2 | ...
+
+STOCK_API_SNAPSHOT_DIR 指定目录时启用（在 Vercel 上默认使用系统临时目录），STOCK_API_SNAPSHOT=0 时关闭。
+快照文件只应放在服务自身可写的目录。
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from compact import CompactFrame, CompactResult
+from log_utils import get_logger
+from warmup import ALL_COLUMNS, ENABLED as WARMUP_ENABLED, TOLERANCE as WARMUP_TOLERANCE
+
+logger = get_logger(__name__)
+
+MAGIC = b"STKSNAP\x00"
+FORMAT_VERSION = 1
+_PREFIX = struct.Struct("<8sII")
+# 数组在文件中的对齐字节数
+ALIGN = 64
+
+# 快照内容依赖的代码和配置：指标列或预热设置变化、重新部署后旧快照自动失效
+SCHEMA = hashlib.blake2b(json.dumps([
+    ALL_COLUMNS, WARMUP_ENABLED, WARMUP_TOLERANCE,
+    os.environ.get("STOCK_API_SNAPSHOT_VERSION") or os.environ.get("VERCEL_GIT_COMMIT_SHA", "")
+]).encode(), digest_size=8).hexdigest()
+
+
+def snapshot_dir():
+    """
+    快照目录：STOCK_API_SNAPSHOT_DIR，在 Vercel 上默认使用系统临时目录
+    Returns:
+        目录路径；未启用时返回None
+    """
+    if os.environ.get("STOCK_API_SNAPSHOT", "1").lower() in ("0", "false", "no"):
+        return None
+    path = os.environ.get("STOCK_API_SNAPSHOT_DIR")
+    if not path and os.environ.get("VERCEL"):
+        path = os.path.join(tempfile.gettempdir(), "stock_api_snapshots")
+    return path or None
+
+
+def _frame_arrays(frame):
+    """CompactFrame -> (可映射的数组, 布局元数据)"""
+    arrays = {"floats": frame.floats, "ints": frame.ints, "flags": frame.flags}
+    meta = {
+        "length": frame.length,
+        "columns": list(frame.columns),
+        "kinds": list(frame.kinds),
+        "date_unit": frame.date_unit,
+    }
+    if frame.dates is not None and frame.date_unit is not None:
+        arrays["dates"] = frame.dates
+    elif frame.dates is not None:
+        # 无法用整数表示的日期保留为字符串列表
+        meta["date_strings"] = list(frame.dates)
+    return arrays, meta
+
+
+def _restore_frame(meta, arrays):
+    dates = arrays.get("dates")
+    if dates is None and "date_strings" in meta:
+        dates = np.asarray(meta["date_strings"], dtype=object)
+    return CompactFrame(meta["length"], tuple(meta["columns"]), tuple(meta["kinds"]), dates,
+                        meta["date_unit"], arrays["floats"], arrays["ints"], arrays["flags"])
+
+
+def encode_value(value):
+    """
+    缓存值 -> (类型, 数组, 元数据)
+    支持 CompactResult（结果缓存）和 DataFrame（基础K线缓存）；其他类型返回None
+    """
+    if isinstance(value, CompactResult):
+        arrays, frame_meta = _frame_arrays(value.frame)
+        return "result", arrays, {
+            "frame": frame_meta,
+            "stock_name": value.stock_name,
+            "stock_code": value.stock_code,
+            "data_columns": list(value.data_columns),
+            "summary": value.summary,
+            "metadata": value.metadata,
+        }
+    if isinstance(value, pd.DataFrame):
+        arrays, frame_meta = _frame_arrays(CompactFrame.from_dataframe(value))
+        return "bars", arrays, {"frame": frame_meta}
+    return None
+
+
+def decode_value(kind, meta, arrays):
+    frame = _restore_frame(meta["frame"], arrays)
+    if kind == "bars":
+        return frame.to_dataframe()
+    return CompactResult(meta["stock_name"], meta["stock_code"], frame, tuple(meta["data_columns"]),
+                         meta["summary"], meta["metadata"])
+
+
+class SnapshotError(ValueError):
+    """快照文件无效（版本不符、已损坏或不属于该缓存键）"""
+
+
+def write_snapshot(path, key, value, created=None):
+    """
+    把缓存值写为快照文件（先写临时文件再原子替换）
+    Returns:
+        写入的字节数；不支持的类型返回0
+    """
+    encoded = encode_value(value)
+    if encoded is None:
+        return 0
+    kind, arrays, meta = encoded
+
+    layout, offset, chunks = {}, 0, []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        pad = -offset % ALIGN
+        chunks.append(b"\x00" * pad)
+        offset += pad
+        layout[name] = [array.dtype.str, list(array.shape), offset]
+        chunks.append(array.tobytes())
+        offset += array.nbytes
+    payload = b"".join(chunks)
+
+    header = json.dumps({
+        "format": FORMAT_VERSION,
+        "schema": SCHEMA,
+        "kind": kind,
+        "key": repr(key),
+        "created": created or time.time(),
+        "payload_bytes": len(payload),
+        "payload_crc": zlib.crc32(payload),
+        "arrays": layout,
+        "meta": meta,
+    }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    start = _PREFIX.size + len(header)
+    padding = b"\x00" * (-start % ALIGN)
+
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, len(header), zlib.crc32(header)))
+        f.write(header)
+        f.write(padding)
+        f.write(payload)
+    os.replace(tmp, path)
+    return start + len(padding) + len(payload)
+
+
+def read_snapshot(path, key):
+    """
+    用 mmap 打开快照文件并校验
+    Returns:
+        (缓存值, 写入时间)
+    Raises:
+        OSError: 文件不存在或无法读取
+        SnapshotError: 文件无效
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < _PREFIX.size:
+            raise SnapshotError("文件被截断")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, header_len, header_crc = _PREFIX.unpack_from(mm, 0)
+    if magic != MAGIC:
+        raise SnapshotError("不是快照文件")
+    start = _PREFIX.size + header_len
+    if start > size:
+        raise SnapshotError("文件头被截断")
+    raw = mm[_PREFIX.size:start]
+    if zlib.crc32(raw) != header_crc:
+        raise SnapshotError("文件头校验失败")
+    header = json.loads(raw.decode("utf-8"))
+    if header.get("format") != FORMAT_VERSION or header.get("schema") != SCHEMA:
+        raise SnapshotError("快照版本不一致")
+    if header.get("key") != repr(key):
+        raise SnapshotError("快照不属于该缓存键")
+
+    base = start + (-start % ALIGN)
+    if base + header["payload_bytes"] != size:
+        raise SnapshotError("数据长度不一致")
+    view = memoryview(mm)[base:]
+    if zlib.crc32(view) != header["payload_crc"]:
+        raise SnapshotError("数据校验失败")
+
+    # 数组直接引用映射的内存（只读），numpy 数组持有 mmap 的引用
+    arrays = {}
+    for name, (dtype, shape, offset) in header["arrays"].items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape)) if shape else 1
+        arrays[name] = np.frombuffer(mm, dtype=dtype, count=count, offset=base + offset).reshape(shape)
+    view.release()
+    return decode_value(header["kind"], header["meta"], arrays), header["created"]
+
+
+class SnapshotStore:
+    """
+    基于快照文件的键值存储，接口与 SQLiteCache 一致，可作为 TieredCache 的第二级
+    """
+
+    def __init__(self, path, ttl=None, max_age=None, max_bytes=None):
+        """
+        Args:
+            path: 快照目录（不存在时创建）
+            ttl: 条目有效期（秒），与所在缓存一致；0或None表示不过期
+            max_age: 快照文件的最长保留时间（秒），默认 STOCK_API_SNAPSHOT_MAX_AGE（1天）
+            max_bytes: 目录总大小上限，默认 STOCK_API_SNAPSHOT_MAX_BYTES（256MB），超出时删除最早的文件
+        """
+        self.path = path
+        self.ttl = ttl or None
+        self.max_age = max_age or float(os.environ.get("STOCK_API_SNAPSHOT_MAX_AGE", 86400))
+        self.max_bytes = max_bytes or int(os.environ.get("STOCK_API_SNAPSHOT_MAX_BYTES", 256 * 1024 * 1024))
+        self.evictions = 0
+        self.invalid = 0
+        self._writes = 0
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        digest = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.path, f"{digest}.snap")
+
+    def _load(self, key):
+        """读取快照，返回 (value, 写入时间)；不存在或无效时返回None（无效文件会被删除）"""
+        path = self._file(key)
+        try:
+            value, created = read_snapshot(path, key)
+        except FileNotFoundError:
+            return None
+        except (OSError, SnapshotError, ValueError, KeyError, TypeError) as e:
+            self.invalid += 1
+            logger.info("忽略无效的快照: %s", e, extra={"path": path})
+            self._remove(path)
+            return None
+        if time.time() - created > self.max_age:
+            self._remove(path)
+            return None
+        return value, created
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get(self, key, default=None):
+        entry = self.get_with_ttl(key)
+        return default if entry is None else entry[0]
+
+    def get_with_ttl(self, key):
+        """读取未超过 ttl 的快照，返回 (value, 剩余有效秒数) 或None；不过期时剩余秒数为None"""
+        loaded = self._load(key)
+        if loaded is None:
+            return None
+        value, created = loaded
+        if not self.ttl:
+            return value, None
+        remaining = created + self.ttl - time.time()
+        return (value, remaining) if remaining >= 0 else None
+
+    def get_stale(self, key):
+        """读取快照（包括已超过 ttl 的），返回 (value, 已过期秒数) 或None"""
+        loaded = self._load(key)
+        if loaded is None:
+            return None
+        value, created = loaded
+        return value, max(time.time() - created - self.ttl, 0.0) if self.ttl else 0.0
+
+    def set(self, key, value):
+        try:
+            write_snapshot(self._file(key), key, value)
+        except OSError as e:
+            logger.warning("写入快照失败: %s", e, extra={"path": self.path})
+            return
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.trim()
+
+    def trim(self):
+        """删除超过保留时间的文件，总大小超出上限时从最早写入的文件开始删除"""
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".snap"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            self.evictions += 1
+
+    def __contains__(self, key):
+        try:
+            created = os.stat(self._file(key)).st_mtime
+        except OSError:
+            return False
+        return not self.ttl or time.time() - created <= self.ttl
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.path) if name.endswith(".snap"))
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            if name.endswith(".snap"):
+                self._remove(os.path.join(self.path, name))
+
+
+def snapshot_cache(l1, name, ttl=None):
+    """
+    启用快照时返回 TieredCache(l1, SnapshotStore)，否则原样返回 l1
+    Args:
+        name: 快照子目录名（不同缓存的快照分开保存）
+    """
+    path = snapshot_dir()
+    if not path:
+        return l1
+    from shared_cache import TieredCache
+    return TieredCache(l1, SnapshotStore(os.path.join(path, name), ttl=ttl))
+
+
+# 测试代码
+if __name__ == "__main__":
+    from indicators import IndicatorCalculator
+    from synthetic_market import SyntheticMarket
+
+    bars = SyntheticMarket(seed=4).generate("SNAP", 250)
+    full = IndicatorCalculator().calculate_all(bars)
+    result = CompactResult("测试", "000000", CompactFrame.from_dataframe(full), tuple(bars.columns),
+                           IndicatorCalculator().get_indicators_summary(full), {"days": len(bars)})
+
+    store = SnapshotStore(os.path.join(tempfile.gettempdir(), "stock_api_snapshots_demo"))
+    store.set("测试_250", result)
+    store.set(("SNAP", "1d"), bars)
+
+    start = time.perf_counter()
+    restored = store.get("测试_250")
+    print(f"恢复结果: {(time.perf_counter() - start) * 1000:.2f}ms，一致: {restored.render() == result.render()}")
+    print("恢复K线一致:", store.get(("SNAP", "1d")).equals(bars))
+    print("错误的键:", store.get("其他_250"))
+    store.clear()
@@ -0,0 +1,195 @@
+# static_files.py - 直接返回收盘后预渲染的静态响应（由 materialize.py 生成）
+"""
+materialize.py 在收盘后把整个股票池的响应预先渲染并压缩，写入 STOCK_API_STATIC_DIR：
+
+    manifest.json                          每个市场的有效期和每个文件对应的请求
+    stock/{股票名称}/days-{N}.json          GET /api/stock/{name}?days=N
+    stock/{股票名称}/simple-{N}.json        GET /api/stock/{name}/simple?days=N
+    以及对应的 .json.zst / .json.br / .json.gz 预压缩版本
+
+static_middleware 在请求进入路由之前查找 manifest：
+- 只处理没有其他参数的 GET 请求（interval 只能是1d；分页、降采样、性能分析等请求照常动态处理）
+- 所属市场的有效期（下一个交易时段开盘）未过且 schema 与当前代码一致时，按 Accept-Encoding
+  直接返回对应的预压缩文件（X-Cache: STATIC），不经过 pandas 和 yfinance
+- Cache-Control 的 max-age 为距离有效期的剩余秒数，CDN 可以缓存到下一次开盘
+- manifest.json 按修改时间重新加载，materialize.py 重新生成后无需重启服务
+
+目录结构与URL一一对应，也可以把整个目录同步到CDN直接提供。
+
+用法: app.middleware("http")(static_middleware)
+"""
+import json
+import os
+import threading
+import time
+
+from fastapi import Response
+
+from compression import negotiate
+from log_utils import get_logger
+from metrics import time_stage
+from snapshot import SCHEMA
+
+logger = get_logger(__name__)
+
+MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+
+# 压缩算法 -> 文件后缀
+SUFFIXES = {"zstd": ".zst", "br": ".br", "gzip": ".gz"}
+
+# 与路由的默认参数一致
+STOCK_DAYS = 30
+SIMPLE_DAYS = 10
+SIMPLE_MAX_DAYS = 30
+
+_STOCK_PREFIX = "/api/stock/"
+
+
+def request_key(path, days):
+    """manifest 中文件对应的请求（路径 + 规范化后的 days）"""
+    return f"{path}?days={days}"
+
+
+def lookup_key(path, query_params):
+    """
+    把请求规范化为 manifest 的键
+    Returns:
+        键；请求带有静态文件不支持的参数时返回None
+    """
+    if not path.startswith(_STOCK_PREFIX):
+        return None
+    name = path[len(_STOCK_PREFIX):]
+    simple = name.endswith("/simple")
+    if simple:
+        name = name[:-len("/simple")]
+    if not name or "/" in name:
+        return None
+
+    params = dict(query_params)
+    if params.pop("interval", "1d") != "1d":
+        return None
+    days = params.pop("days", None)
+    if params:
+        return None
+    try:
+        days = int(days) if days is not None else (SIMPLE_DAYS if simple else STOCK_DAYS)
+    except ValueError:
+        return None
+    if simple:
+        days = min(days, SIMPLE_MAX_DAYS)
+    return request_key(path, days)
+
+
+class StaticResponses:
+    """静态输出目录（manifest.json 按修改时间自动重新加载）"""
+
+    def __init__(self, root):
+        self.root = root
+        self._manifest = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def manifest(self):
+        """当前的 manifest；不存在、版本或 schema 不一致时返回None"""
+        path = os.path.join(self.root, MANIFEST)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._manifest = self._load(path)
+                    self._mtime = mtime
+        return self._manifest
+
+    def _load(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            logger.warning("静态文件清单无法读取", extra={"path": path})
+            return None
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("schema") != SCHEMA:
+            logger.info("静态文件清单与当前版本不一致，忽略", extra={"path": path})
+            return None
+        return manifest
+
+    def lookup(self, key, now=None):
+        """
+        Returns:
+            (文件条目, 有效期的 epoch 秒)；没有对应文件或已过期时返回None
+        """
+        manifest = self.manifest()
+        if manifest is None:
+            return None
+        entry = manifest["files"].get(key)
+        if entry is None:
+            return None
+        valid_until = manifest["markets"].get(entry["market"], {}).get("valid_until", 0)
+        if valid_until <= (now or time.time()):
+            return None
+        return entry, valid_until
+
+    def read(self, entry, encoding):
+        """读取文件内容，encoding 为None或没有对应的预压缩版本时读取未压缩的JSON"""
+        path = os.path.join(self.root, entry["path"])
+        if encoding is not None and encoding in entry.get("encodings", ()):
+            path += SUFFIXES[encoding]
+        else:
+            encoding = None
+        with open(path, "rb") as f:
+            return f.read(), encoding
+
+
+_static = None
+
+
+def get_static():
+    """STOCK_API_STATIC_DIR 对应的 StaticResponses，未设置时返回None"""
+    global _static
+    root = os.environ.get("STOCK_API_STATIC_DIR")
+    if not root:
+        return None
+    if _static is None or _static.root != root:
+        _static = StaticResponses(root)
+    return _static
+
+
+async def static_middleware(request, call_next):
+    """FastAPI HTTP中间件：命中预渲染文件时直接返回"""
+    static = get_static()
+    if static is None or request.method != "GET":
+        return await call_next(request)
+
+    key = lookup_key(request.url.path, request.query_params.multi_items())
+    found = static.lookup(key) if key is not None else None
+    if found is None:
+        return await call_next(request)
+
+    entry, valid_until = found
+    try:
+        with time_stage("static"):
+            body, encoding = static.read(entry, negotiate(request.headers.get("accept-encoding")))
+    except OSError:
+        logger.warning("静态文件缺失，改为动态处理", extra={"path": entry["path"]})
+        return await call_next(request)
+
+    headers = {
+        "Cache-Control": f"public, max-age={max(int(valid_until - time.time()), 0)}",
+        "Vary": "Accept-Encoding",
+        "X-Cache": "STATIC",
+    }
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# 测试代码
+if __name__ == "__main__":
+    for path, query in (("/api/stock/贵州茅台", []), ("/api/stock/贵州茅台", [("days", "100")]),
+                        ("/api/stock/贵州茅台/simple", [("days", "60")]),
+                        ("/api/stock/贵州茅台", [("max_points", "50")]),
+                        ("/api/stock/贵州茅台", [("interval", "1wk")])):
+        print(path, query, "->", lookup_key(path, query))
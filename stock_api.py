@@ -1,23 +1,77 @@
 # stock_api.py - 主数据API
 from stock_code import StockCodeConverter
-from kline_fetcher import KlineFetcher
+from kline_fetcher import FETCH_WORKERS, KlineFetcher
 from indicators import IndicatorCalculator
+from shared_cache import create_cache
+from cache import LRUCache
+from compact import CompactFrame, CompactResult
+from resample import check_bars, validate_interval
+from downsample import render_downsampled
+from deadline import DeadlineExceeded, run_with_deadline
+from warmup import plan_bars, trim
+import metrics
+from metrics import time_stage
+from log_utils import get_logger
+import ast
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np  # 新增导入，用于处理特殊数值
 
+logger = get_logger(__name__)
+
+KLINE_COLUMNS = ["date", "open", "high", "low", "close", "volume"]
+
+# 完整响应（data + indicators）中每根K线大约占用的JSON字节数，用于按响应大小限制行数
+RESPONSE_ROW_BYTES = 800
+
 
 class StockDataAPI:
-    def __init__(self):
-        print("初始化股票数据API...")
+    def __init__(self, offline=None):
+        """
+        Args:
+            offline: 是否使用离线模拟行情，默认读取环境变量 STOCK_API_OFFLINE
+        """
+        logger.info("初始化股票数据API")
+
+        if offline is None:
+            offline = os.environ.get("STOCK_API_OFFLINE", "").lower() in ("1", "true", "yes")
 
         # 初始化各个模块
         self.converter = StockCodeConverter()
-        self.fetcher = KlineFetcher()
+        self.fetcher = KlineFetcher(offline=offline)
         self.fetcher.set_converter(self.converter)
         self.calculator = IndicatorCalculator()
 
-        # 缓存
-        self.cache = {}
+        # 缓存（容量和过期时间可通过环境变量配置，TTL为0表示不过期）
+        # 设置 STOCK_API_SHARED_CACHE 时启用跨worker共享的两级缓存
+        self.cache = create_cache(
+            maxsize=int(os.environ.get("STOCK_API_CACHE_SIZE", 512)),
+            ttl=float(os.environ.get("STOCK_API_CACHE_TTL", 0)),
+            shared_path=os.environ.get("STOCK_API_SHARED_CACHE")
+        )
+        metrics.bind_cache(self.cache)
+        # /simple 使用的摘要缓存（只保存摘要，与结果缓存使用相同的过期时间）
+        self.summary_cache = LRUCache(
+            maxsize=int(os.environ.get("STOCK_API_SUMMARY_CACHE_SIZE", 2048)),
+            ttl=float(os.environ.get("STOCK_API_CACHE_TTL", 0))
+        )
+
+        # 响应的 Cache-Control max-age（秒），客户端缓存据此对齐；默认与结果缓存TTL一致，不过期时为60秒
+        cache_ttl = float(os.environ.get("STOCK_API_CACHE_TTL", 0))
+        self.cache_max_age = int(os.environ.get("STOCK_API_CLIENT_MAX_AGE", cache_ttl or 60))
+
+        # 单次请求的行数和响应大小上限（替代固定的天数上限）
+        self.max_rows = int(os.environ.get("STOCK_API_MAX_ROWS", 6000))
+        self.max_response_bytes = int(os.environ.get("STOCK_API_MAX_RESPONSE_BYTES", 8 * 1024 * 1024))
+
+        # 多进程批量计算引擎（首次批量请求时创建）
+        self._batch_engine = None
+        # 全市场选股使用的最新指标表（首次筛选时创建）
+        self._screener = None
+        # 按日期区间/游标分页读取的K线存储（首次分页请求时创建）
+        self._bar_store = None
 
     def _clean_dataframe(self, df):
         """
@@ -35,10 +89,11 @@ class StockDataAPI:
         numeric_columns = df_cleaned.select_dtypes(include=[np.number]).columns
 
         for col in numeric_columns:
-            # 将无穷大值替换为None
-            df_cleaned[col] = df_cleaned[col].replace([np.inf, -np.inf], None)
-            # 将NaN值替换为None
-            df_cleaned[col] = df_cleaned[col].where(pd.notnull(df_cleaned[col]), None)
+            # 将无穷大和NaN值替换为None
+            # 先转为object类型，否则新版pandas会把None重新转换回NaN
+            finite = np.isfinite(df_cleaned[col])
+            if not finite.all():
+                df_cleaned[col] = df_cleaned[col].astype(object).where(finite, None)
 
         # 2. 确保日期列为字符串（如果存在）
         if 'date' in df_cleaned.columns:
@@ -46,103 +101,529 @@ class StockDataAPI:
 
         return df_cleaned
 
-    def get_stock_data(self, stock_name, days=30):
+    def _cache_key(self, stock_name, days, interval="1d"):
+        if interval == "1d":
+            return f"{stock_name}_{days}"
+        return f"{stock_name}_{days}_{interval}"
+
+    def is_cached(self, stock_name, days=30, interval="1d", summary=False):
+        """判断请求是否能直接命中缓存（summary 为True时判断 get_stock_summary）"""
+        key = self._cache_key(stock_name, days, interval)
+        return (summary and key in self.summary_cache) or key in self.cache
+
+    def cache_stats(self):
+        """返回缓存统计信息"""
+        return self.cache.stats()
+
+    def get_stock_data(self, stock_name, days=30, use_cache=True, interval="1d", max_points=None, deadline=None):
         """
         获取股票数据的完整流程
         Args:
             stock_name: 股票名称
-            days: 天数
+            days: K线数量（日线即天数）
+            interval: K线周期（1m/5m/15m/60m/1d/1wk/1mo），指标在该周期的K线上计算
+            use_cache: 为False时跳过缓存读取，强制重新计算（用于性能分析）
+            max_points: 每个序列最多返回的点数，超出时降采样（缓存中仍保存完整结果）
+            deadline: 请求的 Deadline，只限制等待的时间；预算用尽时返回过期的缓存结果（metadata.stale），
+                      没有缓存时返回 timeout 为True的失败结果。获取和计算不受预算限制，在后台继续完成并写入缓存；
+                      同一缓存键的后台计算尚未完成时，后到的请求等待它而不是再启动一份
         Returns:
             字典，包含数据、指标和摘要
         """
+        validate_interval(interval)
+
         # 检查缓存
-        cache_key = f"{stock_name}_{days}"
-        if cache_key in self.cache:
-            print(f"使用缓存数据: {cache_key}")
-            return self.cache[cache_key]
+        cache_key = self._cache_key(stock_name, days, interval)
+        cached = self.cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            logger.debug("使用缓存数据: %s", cache_key)
+            return self._render(cached, max_points)
 
-        print(f"\n{'=' * 50}")
-        print(f"处理请求: {stock_name}, {days}天")
+        logger.debug("处理请求: %s, %s根%s K线", stock_name, days, interval)
 
-        result = {
-            "success": False,
-            "stock_name": stock_name,
-            "message": "",
-            "data": None,
-            "indicators": None,
-            "summary": None,
-            "metadata": None
-        }
+        result = self._new_result(stock_name)
 
-        try:
-            # 1. 获取K线数据
-            print("1. 获取K线数据...")
-            kline_data = self.fetcher.get_kline_data(stock_name, days)
+        # 股票代码和所属市场（用于指标标签）
+        stock_code = self.converter.name_to_code(stock_name)
+        market = self.converter.get_market(stock_code)
 
-            if kline_data is None or len(kline_data) == 0:
+        try:
+            compact = run_with_deadline(deadline, self._compute, stock_name, stock_code, market, days,
+                                        interval, cache_key, key=cache_key)
+            if compact is None:
                 result["message"] = "获取K线数据失败"
                 return result
+            result = self._render(compact, max_points)
+
+        except DeadlineExceeded:
+            return self._deadline_result(stock_name, cache_key, max_points)
+        except Exception as e:
+            result["message"] = f"处理数据时出错: {str(e)}"
+            logger.exception("处理数据时出错", extra={"stock": stock_name, "days": days})
+
+        return result
 
-            # 2. 计算技术指标
-            print("2. 计算技术指标...")
-            data_with_indicators = self.calculator.calculate_all(kline_data)
+    def _compute(self, stock_name, stock_code, market, days, interval, cache_key):
+        """
+        获取K线、计算指标并写入缓存，返回 CompactResult（获取失败时返回None）
+        多获取指标预热期的K线（warmup.plan_bars），计算后只保留最后 days 根；
+        K线存储中已有覆盖预热期的新鲜序列时直接从中切片，不再获取和计算
+        """
+        stored = self._bar_store.peek(stock_name, stock_code, interval, plan_bars(days)) \
+            if self._bar_store is not None else None
+        if stored is not None:
+            data_with_indicators = trim(stored.frame, days)
+            kline_data = data_with_indicators[KLINE_COLUMNS]
+        else:
+            # 1. 获取K线数据（含预热期）
+            with time_stage("fetch", market):
+                kline_data = self.fetcher.get_kline_data(stock_name, plan_bars(days), interval)
 
-            # 3. 获取股票代码
-            stock_code = self.converter.name_to_code(stock_name)
+            if kline_data is None or len(kline_data) == 0:
+                return None
+
+            # 2. 计算技术指标，再去掉预热部分
+            with time_stage("indicators", market):
+                data_with_indicators = trim(self.calculator.calculate_all(kline_data), days)
+            kline_data = trim(kline_data, days)
 
-            # 4. 获取技术指标摘要
-            print("3. 生成技术指标摘要...")
+        # 3. 获取技术指标摘要
+        with time_stage("summary", market):
             indicators_summary = self.calculator.get_indicators_summary(data_with_indicators)
 
-            # 5. 准备返回结果（关键修改部分）
-            result["success"] = True
-            result["message"] = "获取数据成功"
-            result["stock_code"] = stock_code
-
-            # 清理数据中的特殊值（NaN, Infinity等）后再转换为字典
-            kline_data_cleaned = self._clean_dataframe(kline_data)
-            data_with_indicators_cleaned = self._clean_dataframe(data_with_indicators)
-
-            result["data"] = kline_data_cleaned.to_dict(orient='records')
-            result["indicators"] = data_with_indicators_cleaned.to_dict(orient='records')
-            result["summary"] = indicators_summary
-            result["metadata"] = {
-                "days": len(kline_data),
-                "date_range": {
-                    "start": str(kline_data['date'].iloc[0]) if len(kline_data) > 0 else None,
-                    "end": str(kline_data['date'].iloc[-1]) if len(kline_data) > 0 else None
-                }
-            }
+        # 4. 转换为紧凑的列式结构放入缓存，响应时再渲染为JSON结构
+        compact = self._compact_result(stock_name, stock_code, market, kline_data,
+                                       data_with_indicators, indicators_summary, interval)
+        self.cache.set(cache_key, compact)
+
+        logger.info("处理完成", extra={"stock": stock_name, "days": days, "interval": interval,
+                                     "rows": len(kline_data)})
+        return compact
+
+    def _deadline_result(self, stock_name, cache_key, max_points=None):
+        """预算用尽时的结果：有缓存（即使已过期）时返回缓存并标记 stale，否则返回超时失败"""
+        stale = self.cache.get_stale(cache_key)
+        if stale is None:
+            metrics.DEADLINE_FALLBACKS.inc(outcome="timeout")
+            logger.warning("请求超时且没有可用缓存", extra={"stock": stock_name})
+            result = self._new_result(stock_name)
+            result["message"] = "数据源响应超时，请稍后重试"
+            result["timeout"] = True
+            return result
+
+        compact, age = stale
+        metrics.DEADLINE_FALLBACKS.inc(outcome="stale")
+        logger.warning("请求超时，返回过期缓存", extra={"stock": stock_name, "stale_seconds": round(age, 1)})
+        result = self._render(compact, max_points)
+        result["message"] = "数据源响应超时，返回缓存数据"
+        result["metadata"] = {**result["metadata"], "stale": True, "stale_seconds": round(age, 1)}
+        return result
 
-            # 添加到缓存
-            self.cache[cache_key] = result
+    def get_stock_summary(self, stock_name, days=10, interval="1d", deadline=None):
+        """
+        只获取最新的指标摘要（/simple 使用的轻量路径）
+        不计算完整的指标表，也不生成 data / indicators，只用 IndicatorCalculator.get_latest_summary
+        计算最后一行；完整结果已在缓存中时直接使用其摘要
+        Returns:
+            {"success", "stock_name", "stock_code", "message", "summary", "metadata"}；
+            超过 deadline 时与 get_stock_data 相同，返回过期缓存（metadata.stale）或 timeout 为True的失败结果；
+            未找到股票时 success 为False、not_found 为True
+        """
+        validate_interval(interval)
+        cache_key = self._cache_key(stock_name, days, interval)
+        cached = self.summary_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-            print(f"处理完成: 获取{len(kline_data)}条数据")
+        # 完整结果已缓存（例如刚请求过 /api/stock/{name}）
+        if cache_key in self.cache:
+            compact = self.cache.get(cache_key)
+            if compact is not None:
+                result = self._summary_result(stock_name, compact.stock_code, compact.summary,
+                                              compact.metadata["days"], interval)
+                self.summary_cache.set(cache_key, result)
+                return result
 
+        stock_code = self.converter.name_to_code(stock_name)
+        if not stock_code:
+            return {**self._summary_result(stock_name, None, None, 0, interval, False),
+                    "message": f"未找到股票: {stock_name}", "not_found": True}
+        market = self.converter.get_market(stock_code)
+        try:
+            result = run_with_deadline(deadline, self._compute_summary, stock_name, stock_code, market, days,
+                                       interval, cache_key, key=cache_key)
+        except DeadlineExceeded:
+            stale = self.summary_cache.get_stale(cache_key)
+            if stale is None:
+                metrics.DEADLINE_FALLBACKS.inc(outcome="timeout")
+                return {**self._summary_result(stock_name, stock_code, None, 0, interval, False),
+                        "message": "数据源响应超时，请稍后重试", "timeout": True}
+            metrics.DEADLINE_FALLBACKS.inc(outcome="stale")
+            result, age = stale
+            return {**result, "message": "数据源响应超时，返回缓存数据",
+                    "metadata": {**result["metadata"], "stale": True, "stale_seconds": round(age, 1)}}
         except Exception as e:
-            result["message"] = f"处理数据时出错: {str(e)}"
-            print(f"错误: {e}")
+            logger.exception("计算摘要时出错", extra={"stock": stock_name, "days": days})
+            return {**self._summary_result(stock_name, stock_code, None, 0, interval, False),
+                    "message": f"处理数据时出错: {str(e)}"}
+        return result
 
+    def _compute_summary(self, stock_name, stock_code, market, days, interval, cache_key):
+        # 摘要只使用最后 summary_bars() 根K线（与 days 无关）
+        bars = max(plan_bars(days), self.calculator.summary_bars() or 0)
+        with time_stage("fetch", market):
+            kline_data = self.fetcher.get_kline_data(stock_name, bars, interval)
+        if kline_data is None or len(kline_data) == 0:
+            return {**self._summary_result(stock_name, stock_code, None, 0, interval, False),
+                    "message": "获取K线数据失败"}
+
+        with time_stage("summary", market):
+            summary = self.calculator.get_latest_summary(kline_data)
+        result = self._summary_result(stock_name, stock_code, summary, min(len(kline_data), days), interval)
+        self.summary_cache.set(cache_key, result)
         return result
 
-    def get_multiple_stocks(self, stock_names, days=30):
+    def _summary_result(self, stock_name, stock_code, summary, rows, interval, success=True):
+        return {
+            "success": success,
+            "stock_name": stock_name,
+            "stock_code": stock_code,
+            "message": "获取数据成功" if success else "",
+            "summary": summary,
+            "metadata": {"days": rows, "interval": interval}
+        }
+
+    def _new_result(self, stock_name):
+        return {
+            "success": False,
+            "stock_name": stock_name,
+            "message": "",
+            "data": None,
+            "indicators": None,
+            "summary": None,
+            "metadata": None
+        }
+
+    def _compact_result(self, stock_name, stock_code, market, kline_data, data_with_indicators,
+                        indicators_summary, interval="1d"):
+        """把K线和指标转换为缓存使用的 CompactResult（K线列只保存一份）"""
+        with time_stage("compact", market):
+            frame = CompactFrame.from_dataframe(data_with_indicators)
+        metadata = {
+            "days": len(kline_data),
+            "interval": interval,
+            "date_range": {
+                "start": str(kline_data['date'].iloc[0]) if len(kline_data) > 0 else None,
+                "end": str(kline_data['date'].iloc[-1]) if len(kline_data) > 0 else None
+            }
+        }
+        return CompactResult(stock_name, stock_code, frame, tuple(kline_data.columns),
+                             indicators_summary, metadata)
+
+    def _render(self, compact, max_points=None):
+        """渲染为接口返回的JSON结构（NaN/Infinity在渲染时替换为None），指定 max_points 时降采样"""
+        market = self.converter.get_market(compact.stock_code)
+        if max_points is not None and compact.frame.length > max_points:
+            with time_stage("downsample", market):
+                return render_downsampled(compact, max_points)
+        with time_stage("serialize", market):
+            return compact.render()
+
+    def get_multiple_stocks(self, stock_names, days=30, workers=None, interval="1d", deadline=None):
         """
         获取多只股票数据
         Args:
             stock_names: 股票名称列表
-            days: 天数
+            days: K线数量
+            interval: K线周期
+            workers: 大于1时使用多进程计算指标（批量/全市场扫描场景），
+                     默认读取环境变量 STOCK_API_BATCH_WORKERS
+            deadline: 整个批量请求共用的 Deadline；预算用尽后剩余的股票只返回缓存（可能已过期）
+                      或超时结果，已完成的股票照常返回
         Returns:
             每只股票的数据字典
         """
+        if workers is None:
+            workers = int(os.environ.get("STOCK_API_BATCH_WORKERS", 0))
+
+        if workers > 1 and len(stock_names) > 1:
+            try:
+                return self._get_multiple_stocks_parallel(stock_names, days, workers, interval, deadline)
+            except Exception:
+                logger.exception("多进程计算失败，改为逐只计算", extra={"workers": workers})
+
         results = {}
 
         for name in stock_names:
-            print(f"\n处理股票: {name}")
-            data = self.get_stock_data(name, days)
+            logger.debug("处理股票: %s", name)
+            data = self.get_stock_data(name, days, interval=interval, deadline=deadline)
             results[name] = data
 
         return results
 
+    def _fetch_many(self, stock_names, bars, interval="1d"):
+        """
+        用线程池并行获取多只股票的K线（等待上游为主，线程数为 STOCK_API_FETCH_WORKERS）
+        Returns:
+            (名称 -> K线DataFrame, 名称 -> 股票代码, 无法识别的股票名称列表)
+        """
+        codes, missing = {}, []
+        for name in stock_names:
+            stock_code = self.converter.name_to_code(name)
+            if stock_code:
+                codes[name] = stock_code
+            else:
+                missing.append(name)
+
+        def fetch(name):
+            with time_stage("fetch", self.converter.get_market(codes[name])):
+                return self.fetcher.get_kline_data(name, bars, interval)
+
+        if len(codes) <= 1:
+            return {name: fetch(name) for name in codes}, codes, missing
+        with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(codes))) as pool:
+            # 复制上下文，各线程的阶段耗时计入当前请求的 Server-Timing
+            futures = {name: pool.submit(contextvars.copy_context().run, fetch, name) for name in codes}
+            return {name: future.result() for name, future in futures.items()}, codes, missing
+
+    def _get_batch_engine(self, workers):
+        """延迟创建多进程计算引擎，worker数量变化时重建"""
+        engine = self._batch_engine
+        if engine is None or engine.workers != workers:
+            from batch_compute import BatchIndicatorEngine
+            if engine is not None:
+                engine.close()
+            engine = self._batch_engine = BatchIndicatorEngine(workers)
+        return engine
+
+    def _get_multiple_stocks_parallel(self, stock_names, days, workers, interval="1d", deadline=None):
+        """先获取全部K线，再用进程池批量计算指标，最后逐只组装结果"""
+        results = {}
+        frames = {}
+        codes = {}
+
+        for name in stock_names:
+            cache_key = self._cache_key(name, days, interval)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                results[name] = self._render(cached)
+                continue
+
+            stock_code = self.converter.name_to_code(name)
+            market = self.converter.get_market(stock_code)
+            codes[name] = (stock_code, market)
+            try:
+                # 只限制等待时间，超时的获取在后台完成并写入基础K线缓存
+                with time_stage("fetch", market):
+                    kline_data = run_with_deadline(deadline, self.fetcher.get_kline_data, name, plan_bars(days),
+                                                   interval, key=(name, plan_bars(days), interval))
+            except DeadlineExceeded:
+                results[name] = self._deadline_result(name, cache_key)
+                continue
+
+            if kline_data is None or len(kline_data) == 0:
+                results[name] = self._new_result(name)
+                results[name]["message"] = "获取K线数据失败"
+                continue
+            frames[name] = kline_data
+
+        with time_stage("indicators", "batch"):
+            computed, summaries = self._get_batch_engine(workers).compute(frames)
+
+        for name, data_with_indicators in computed.items():
+            stock_code, market = codes[name]
+            compact = self._compact_result(name, stock_code, market, trim(frames[name], days),
+                                           trim(data_with_indicators, days), summaries[name], interval)
+            self.cache.set(self._cache_key(name, days, interval), compact)
+            results[name] = self._render(compact)
+
+        logger.info("批量处理完成", extra={"stocks": len(stock_names), "computed": len(computed),
+                                           "workers": workers})
+        return {name: results[name] for name in stock_names}
+
+    def row_limit(self, series=1):
+        """
+        单次请求每只股票最多返回的K线数：所有股票合计不超过 max_rows，
+        且估算的响应大小不超过 max_response_bytes
+        """
+        total = min(self.max_rows, self.max_response_bytes // RESPONSE_ROW_BYTES)
+        return max(total // max(series, 1), 1)
+
+    def check_rows(self, days, series=1, interval="1d"):
+        """days 小于1、超过 row_limit 或 interval 周期的可回溯范围（resample.max_bars）时抛出 ValueError"""
+        if days < 1:
+            raise ValueError("K线数量必须大于0")
+        limit = self.row_limit(series)
+        if days > limit:
+            raise ValueError(f"请求的K线数量超过上限: 每只股票最多 {limit} 根")
+        return check_bars(interval, days)
+
+    def get_bar_store(self):
+        """
+        延迟创建K线存储
+        序列的有效期可通过 STOCK_API_BAR_STORE_TTL（秒）配置，总内存上限通过 STOCK_API_BAR_STORE_BYTES 配置
+        """
+        if self._bar_store is None:
+            from bar_store import BarStore
+            self._bar_store = BarStore(
+                self.fetcher, self.calculator,
+                max_age=float(os.environ.get("STOCK_API_BAR_STORE_TTL", 60)),
+                max_bytes=int(os.environ.get("STOCK_API_BAR_STORE_BYTES", 256 * 1024 * 1024))
+            )
+        return self._bar_store
+
+    def get_stock_history(self, stock_name, interval="1d", start=None, end=None, cursor=None, limit=100,
+                          max_points=None):
+        """
+        按日期区间或游标分页获取K线和指标（从K线存储切片，不重新计算整个窗口）
+        Args:
+            start / end: 日期区间（含两端）
+            cursor: 上一页返回的 metadata.next_cursor，只返回之后的K线
+            limit: 每页最多K线数
+            max_points: 每个序列最多返回的点数，超出时降采样
+        Returns:
+            与 get_stock_data 相同结构的字典，metadata 中包含 next_cursor / has_more；
+            参数不合法时抛出 ValueError
+        """
+        result = self._new_result(stock_name)
+        stock_code = self.converter.name_to_code(stock_name)
+        market = self.converter.get_market(stock_code)
+
+        with time_stage("fetch", market):
+            frame, page = self.get_bar_store().page(stock_name, stock_code, interval, start=start, end=end,
+                                                    cursor=cursor, limit=limit)
+        if frame is None:
+            result["message"] = "获取K线数据失败"
+            return result
+
+        with time_stage("summary", market):
+            summary = self.calculator.get_indicators_summary(frame)
+        compact = self._compact_result(stock_name, stock_code, market, frame[KLINE_COLUMNS], frame, summary, interval)
+        compact.metadata.update(page)
+        result = self._render(compact, max_points)
+        if len(frame) == 0:
+            result["message"] = "没有新的K线"
+        return result
+
+    def get_screener(self):
+        """
+        延迟创建选股指标表，行的有效期可通过 STOCK_API_SCREENER_TTL（秒）配置，
+        冷启动时筛选等待后台刷新的最长时间通过 STOCK_API_SCREENER_WAIT（秒）配置
+        """
+        if self._screener is None:
+            from screener import LatestIndicatorTable, default_universe
+            self._screener = LatestIndicatorTable(
+                self.fetcher, self.calculator, default_universe(self.converter),
+                max_age=float(os.environ.get("STOCK_API_SCREENER_TTL", 300)),
+                wait=float(os.environ.get("STOCK_API_SCREENER_WAIT", 1.0))
+            )
+        return self._screener
+
+    def screen(self, expression=None, sort=None, ascending=False, limit=50, fields=None):
+        """
+        全市场选股
+        Args:
+            expression: 条件表达式，如 "RSI < 30 and MACD_golden_cross"
+            sort / ascending: 排序列和方向
+            limit: 最多返回的股票数
+            fields: 返回的指标列
+        Returns:
+            结果字典（ready 为已有数据的股票数，pending 为正在后台刷新的股票数）；表达式不合法时抛出 ValueError
+        """
+        table = self.get_screener()
+        total, rows = table.screen(expression, sort=sort, ascending=ascending, limit=limit, fields=fields)
+        return {
+            "success": True,
+            "message": f"共 {total} 只股票符合条件",
+            "filter": expression,
+            "universe": len(table),
+            "ready": table.ready(),
+            "pending": len(table.stale_rows()),
+            "count": total,
+            "data": rows
+        }
+
+    def cross_section(self, stock_names=None, days=60, sort_by=None, top=None, window=20, matrix="corr"):
+        """
+        横截面分析：涨跌幅排名、相对强弱排名和收益率相关/协方差矩阵
+        Args:
+            stock_names: 股票名称列表，默认全部股票
+            days: 每只股票获取的交易日数
+            其余参数见 cross_section.cross_section
+        Returns:
+            结果字典；参数不合法时抛出 ValueError
+        """
+        from cross_section import cross_section
+        from screener import default_universe
+
+        if not stock_names:
+            stock_names = [name for name, _ in default_universe(self.converter)]
+
+        frames, codes, missing = self._fetch_many(stock_names, days)
+
+        with time_stage("cross_section", "batch"):
+            result = cross_section(frames, codes, sort_by=sort_by, top=top, window=window, matrix=matrix)
+        result["message"] = f"共分析 {result['symbols']} 只股票"
+        result["missing"] = missing
+        return result
+
+    def backtest(self, entry, exit, stock_names=None, days=250, fee=0.0003, slippage=0.0005,
+                 equity=False, workers=None):
+        """
+        按买入/卖出条件回测一组股票
+        Args:
+            entry / exit: 买入、卖出条件表达式（语法同选股接口）
+            stock_names: 股票名称列表，默认全部股票
+            days: 回测使用的K线数量
+            fee / slippage: 单边手续费率和滑点
+            equity: 是否返回净值曲线
+            workers: 大于1时使用多进程计算指标，默认读取 STOCK_API_BATCH_WORKERS
+        Returns:
+            结果字典；表达式不合法时抛出 ValueError
+        """
+        from backtest import Backtester
+        from screener import compile_filter, default_universe
+
+        # 只为条件中用到的指标列预热
+        columns = {node.id for tree in (compile_filter(entry), compile_filter(exit))
+                   for node in ast.walk(tree) if isinstance(node, ast.Name)}
+        bars = plan_bars(days, columns)
+        if not stock_names:
+            stock_names = [name for name, _ in default_universe(self.converter)]
+        if workers is None:
+            workers = int(os.environ.get("STOCK_API_BATCH_WORKERS", 0))
+
+        frames, codes, missing = self._fetch_many(stock_names, bars)
+        frames = {name: df for name, df in frames.items() if df is not None and len(df) > 0}
+        codes = {name: codes[name] for name in frames}
+
+        with time_stage("indicators", "batch"):
+            if workers > 1 and len(frames) > 1:
+                computed, _ = self._get_batch_engine(workers).compute(frames)
+            else:
+                computed = {name: self.calculator.calculate_all(df) for name, df in frames.items()}
+            computed = {name: trim(df, days) for name, df in computed.items()}
+
+        with time_stage("backtest", "batch"):
+            result = Backtester(computed, fee=fee, slippage=slippage).run(entry, exit, equity=equity)
+
+        for row in result["symbols"]:
+            row["stock_code"] = codes.get(row["stock_name"])
+        return {
+            "success": True,
+            "message": f"共回测 {len(result['symbols'])} 只股票",
+            "fee": fee,
+            "slippage": slippage,
+            **result,
+            "missing": missing
+        }
+
+    def close(self):
+        """释放进程池等资源"""
+        if self._batch_engine is not None:
+            self._batch_engine.close()
+            self._batch_engine = None
+
     def search_stock(self, keyword):
         """
         搜索股票
@@ -165,6 +646,37 @@ class StockDataAPI:
         return matches
 
 
+def simple_response(result, stock_name):
+    """
+    把 get_stock_summary 的结果转换为 /api/stock/{name}/simple 的响应结构
+    （web_api.py、api/index.py 和 materialize.py 共用，保证静态文件与动态响应一致）
+    """
+    if not result.get("success", False):
+        return {
+            "success": False,
+            "message": result.get("message", "获取数据失败"),
+            "stock_name": stock_name
+        }
+
+    summary = result.get("summary", {})
+    price_info = summary.get("price", {})
+
+    return {
+        "success": True,
+        "stock_name": result.get("stock_name"),
+        "stock_code": result.get("stock_code"),
+        "price": price_info.get("close"),
+        "change": price_info.get("change"),
+        "summary": {
+            "rsi": summary.get("rsi", {}).get("value"),
+            "rsi_status": summary.get("rsi", {}).get("status"),
+            "macd_signal": summary.get("macd", {}).get("signal_text"),
+            "above_ma20": summary.get("moving_averages", {}).get("above_MA20")
+        },
+        "data_points": result.get("metadata", {}).get("days", 0)
+    }
+
+
 # 测试代码
 if __name__ == "__main__":
     api = StockDataAPI()
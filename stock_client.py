@@ -0,0 +1,383 @@
+# stock_client.py - 股票API客户端SDK（连接池、重试、合并请求、本地缓存）
+"""
+调用方原先每次都用 requests.get 新建连接，没有超时和重试，查询多只股票时逐只串行请求。
+
+StockClient / AsyncStockClient（基于 httpx，同步和异步接口一致）:
+- 复用一个 keep-alive 连接池，所有请求带超时
+- 网络错误和 502/503/504 按指数退避重试
+- get_many() 把多只股票合并成 /api/batch 请求（每批最多 batch_size 只）；
+  AsyncStockClient 还会把短时间内并发的 get_stock() 自动合并成一次批量请求
+- 本地TTL缓存，有效期取自服务端响应的 Cache-Control: max-age（no-store / no-cache 不缓存）
+
+    with StockClient("http://localhost:8000") as client:
+        data = client.get_stock("贵州茅台", days=30)
+        results = client.get_many(["腾讯", "苹果"], summary_only=True)
+"""
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    print("客户端SDK依赖 httpx，请先执行: pip install httpx")
+    raise
+
+# 需要重试的HTTP状态码
+RETRY_STATUS = (502, 503, 504)
+
+# 服务端 /api/batch 单次最多的股票数量
+MAX_BATCH = 50
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class StockAPIError(Exception):
+    """API返回错误或多次重试后仍无法访问"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def cache_ttl(headers, default=0.0):
+    """
+    根据响应头决定本地缓存时间（秒）
+    Cache-Control 含 no-store / no-cache 时为0，有 max-age 时取其值，否则为 default
+    """
+    value = headers.get("cache-control", "")
+    if "no-store" in value or "no-cache" in value:
+        return 0.0
+    match = _MAX_AGE.search(value)
+    return float(match.group(1)) if match else default
+
+
+class TTLCache:
+    """按条目过期时间淘汰的LRU缓存（线程安全）"""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def _error_message(response):
+    try:
+        body = response.json()
+    except ValueError:
+        return response.text or f"HTTP {response.status_code}"
+    if isinstance(body, dict):
+        return str(body.get("detail") or body.get("message") or body)
+    return str(body)
+
+
+class _ClientBase:
+    """同步/异步客户端共用的参数、缓存和响应处理"""
+
+    def __init__(self, base_url="http://localhost:8000", timeout=10.0, retries=2, backoff=0.2,
+                 cache_size=256, default_ttl=0.0, batch_size=20, max_connections=10):
+        """
+        Args:
+            base_url: API地址
+            timeout: 单次请求超时（秒）
+            retries: 失败后的重试次数
+            backoff: 第一次重试前的等待时间（秒），之后每次翻倍
+            cache_size: 本地缓存条目数，0表示不缓存
+            default_ttl: 响应没有 Cache-Control 时的缓存时间（秒）
+            batch_size: 批量请求每批的股票数量（不超过50）
+            max_connections: 连接池大小
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.default_ttl = default_ttl
+        self.batch_size = max(1, min(batch_size, MAX_BATCH))
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections)
+        self.cache = TTLCache(cache_size)
+
+    @staticmethod
+    def _stock_key(name, days, interval, summary_only):
+        return ("stock", name, days, interval, summary_only)
+
+    def _should_retry(self, attempt, response=None):
+        if attempt >= self.retries:
+            return False
+        return response is None or response.status_code in RETRY_STATUS
+
+    def _delay(self, attempt):
+        return self.backoff * (2 ** attempt)
+
+    def _parse(self, response):
+        """非2xx响应抛出 StockAPIError，否则返回JSON"""
+        if response.status_code >= 400:
+            raise StockAPIError(_error_message(response), response.status_code)
+        return response.json()
+
+    def _pending_names(self, names, days, interval, summary_only):
+        """返回 (已缓存的结果, 需要请求的股票名称)"""
+        results = {}
+        missing = []
+        for name in dict.fromkeys(names):
+            cached = self.cache.get(self._stock_key(name, days, interval, summary_only))
+            if cached is not None:
+                results[name] = cached
+            else:
+                missing.append(name)
+        return results, missing
+
+    def _store_batch(self, response, data, days, interval, summary_only):
+        """把批量结果按股票写入缓存（与 get_stock 共用缓存键），返回 {名称: 结果}"""
+        ttl = cache_ttl(response.headers, self.default_ttl)
+        results = data.get("results", {})
+        for name, result in results.items():
+            if result.get("success"):
+                self.cache.set(self._stock_key(name, days, interval, summary_only), result, ttl)
+        return results
+
+    def _batch_params(self, names, days, interval, summary_only):
+        return {"names": ",".join(names), "days": days, "interval": interval,
+                "summary_only": str(summary_only).lower()}
+
+    def _chunks(self, names):
+        return [names[i:i + self.batch_size] for i in range(0, len(names), self.batch_size)]
+
+
+class StockClient(_ClientBase):
+    """同步客户端（线程安全，可在多个线程间共享）"""
+
+    def __init__(self, base_url="http://localhost:8000", transport=None, **kwargs):
+        """
+        Args:
+            transport: 自定义 httpx 传输层（如测试时的 httpx.WSGITransport）
+            其余参数见 _ClientBase
+        """
+        super().__init__(base_url, **kwargs)
+        self._client = httpx.Client(base_url=self.base_url, timeout=self.timeout,
+                                    limits=self.limits, transport=transport)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._client.close()
+
+    def _send(self, path, params=None):
+        """发送GET请求（带重试），返回 httpx.Response"""
+        attempt = 0
+        while True:
+            try:
+                response = self._client.get(path, params=params)
+            except httpx.TransportError as e:
+                if not self._should_retry(attempt):
+                    raise StockAPIError(f"请求失败: {e}")
+            else:
+                if not self._should_retry(attempt, response):
+                    return response
+            time.sleep(self._delay(attempt))
+            attempt += 1
+
+    def _get(self, path, params=None):
+        """带本地缓存的GET请求，返回JSON"""
+        key = (path, tuple(sorted((params or {}).items())))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        response = self._send(path, params)
+        data = self._parse(response)
+        self.cache.set(key, data, cache_ttl(response.headers, self.default_ttl))
+        return data
+
+    def get_stock(self, name, days=30, interval="1d"):
+        """获取单只股票的K线、指标和摘要；股票不存在时抛出 StockAPIError(404)"""
+        key = self._stock_key(name, days, interval, False)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        response = self._send(f"/api/stock/{name}", {"days": days, "interval": interval})
+        data = self._parse(response)
+        self.cache.set(key, data, cache_ttl(response.headers, self.default_ttl))
+        return data
+
+    def get_simple(self, name, days=10):
+        """获取简化版数据"""
+        return self._get(f"/api/stock/{name}/simple", {"days": days})
+
+    def get_many(self, names, days=30, interval="1d", summary_only=False):
+        """
+        获取多只股票，合并为 /api/batch 请求
+        Args:
+            summary_only: 只返回摘要和元数据
+        Returns:
+            {名称: 结果}，获取失败的股票 success 为 False
+        """
+        results, missing = self._pending_names(names, days, interval, summary_only)
+        for chunk in self._chunks(missing):
+            response = self._send("/api/batch", self._batch_params(chunk, days, interval, summary_only))
+            results.update(self._store_batch(response, self._parse(response), days, interval, summary_only))
+        return {name: results[name] for name in dict.fromkeys(names) if name in results}
+
+    def list_stocks(self, search=None):
+        """获取支持的股票列表（可按关键词搜索）"""
+        return self._get("/api/stock", {"search": search} if search else None)
+
+
+class AsyncStockClient(_ClientBase):
+    """
+    异步客户端
+    batch_window 秒内并发的 get_stock() 调用（参数相同）会合并成一次 /api/batch 请求
+    """
+
+    def __init__(self, base_url="http://localhost:8000", transport=None, batch_window=0.005, **kwargs):
+        super().__init__(base_url, **kwargs)
+        self.batch_window = batch_window
+        self._client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout,
+                                         limits=self.limits, transport=transport)
+        # (days, interval, summary_only) -> {名称: [Future]}
+        self._pending = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def _send(self, path, params=None):
+        attempt = 0
+        while True:
+            try:
+                response = await self._client.get(path, params=params)
+            except httpx.TransportError as e:
+                if not self._should_retry(attempt):
+                    raise StockAPIError(f"请求失败: {e}")
+            else:
+                if not self._should_retry(attempt, response):
+                    return response
+            await asyncio.sleep(self._delay(attempt))
+            attempt += 1
+
+    async def _get(self, path, params=None):
+        key = (path, tuple(sorted((params or {}).items())))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        response = await self._send(path, params)
+        data = self._parse(response)
+        self.cache.set(key, data, cache_ttl(response.headers, self.default_ttl))
+        return data
+
+    async def get_stock(self, name, days=30, interval="1d", summary_only=False):
+        """获取单只股票（与同一时间窗口内的其他调用合并请求）；失败时抛出 StockAPIError"""
+        cached = self.cache.get(self._stock_key(name, days, interval, summary_only))
+        if cached is not None:
+            return cached
+
+        group_key = (days, interval, summary_only)
+        group = self._pending.get(group_key)
+        if group is None:
+            group = self._pending[group_key] = {}
+            asyncio.get_running_loop().call_later(
+                self.batch_window, lambda: asyncio.ensure_future(self._flush(group_key))
+            )
+        future = asyncio.get_running_loop().create_future()
+        group.setdefault(name, []).append(future)
+
+        result = await future
+        if not result.get("success"):
+            raise StockAPIError(result.get("message") or f"获取 {name} 失败", 404)
+        return result
+
+    async def _flush(self, group_key):
+        group = self._pending.pop(group_key, {})
+        days, interval, summary_only = group_key
+        names = list(group)
+        await asyncio.gather(*(self._flush_chunk(chunk, group, days, interval, summary_only)
+                               for chunk in self._chunks(names)))
+
+    async def _flush_chunk(self, chunk, group, days, interval, summary_only):
+        try:
+            response = await self._send("/api/batch", self._batch_params(chunk, days, interval, summary_only))
+            results = self._store_batch(response, self._parse(response), days, interval, summary_only)
+        except Exception as e:
+            for name in chunk:
+                for future in group[name]:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for name in chunk:
+            result = results.get(name) or {"success": False, "message": f"未返回 {name} 的数据"}
+            for future in group[name]:
+                if not future.done():
+                    future.set_result(result)
+
+    async def get_simple(self, name, days=10):
+        return await self._get(f"/api/stock/{name}/simple", {"days": days})
+
+    async def get_many(self, names, days=30, interval="1d", summary_only=False):
+        """获取多只股票，返回 {名称: 结果}，获取失败的股票 success 为 False"""
+        results, missing = self._pending_names(names, days, interval, summary_only)
+        responses = await asyncio.gather(*(
+            self._send("/api/batch", self._batch_params(chunk, days, interval, summary_only))
+            for chunk in self._chunks(missing)
+        ))
+        for response in responses:
+            results.update(self._store_batch(response, self._parse(response), days, interval, summary_only))
+        return {name: results[name] for name in dict.fromkeys(names) if name in results}
+
+    async def list_stocks(self, search=None):
+        return await self._get("/api/stock", {"search": search} if search else None)
+
+
+# 测试代码
+if __name__ == "__main__":
+    # 确保Web服务正在运行（python web_api.py）
+    with StockClient() as client:
+        data = client.get_stock("贵州茅台", days=20)
+        print("贵州茅台:", data["summary"]["price"])
+
+        start = time.perf_counter()
+        results = client.get_many(["腾讯", "苹果", "阿里巴巴"], days=20, summary_only=True)
+        print(f"批量获取 {len(results)} 只: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    async def main():
+        async with AsyncStockClient() as client:
+            results = await asyncio.gather(*(client.get_stock(name, days=20) for name in ["腾讯", "苹果", "比亚迪"]))
+            for result in results:
+                print(result["stock_name"], result["summary"]["rsi"])
+
+    asyncio.run(main())
@@ -53,6 +53,17 @@ class StockCodeConverter:
         # 没找到返回None
         return None
 
+    @staticmethod
+    def get_market(code):
+        """根据股票代码判断市场：a_share / hk_share / us_share"""
+        if not code:
+            return "unknown"
+        if code.isdigit() and len(code) == 6:
+            return "a_share"
+        if code.startswith('0') and len(code) == 5:
+            return "hk_share"
+        return "us_share"
+
     def add_stock(self, name, code):
         """添加新的股票映射"""
         self.stock_dict[name] = code
@@ -0,0 +1,164 @@
+# synthetic_market.py - 向量化的模拟行情生成器（用于离线数据源和性能测试）
+import zlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+class SyntheticMarket:
+    """
+    基于几何随机游走的模拟K线生成器
+    - 同一 symbol + seed 生成的价格序列完全确定
+    - 全部使用NumPy向量化计算，单次可生成百万级K线
+    """
+
+    TRADING_DAYS_PER_YEAR = 252
+    # 模拟分钟线的交易时段：09:30 开盘，共 390 分钟
+    SESSION_OPEN_MINUTE = 9 * 60 + 30
+    SESSION_MINUTES = 390
+
+    def __init__(self, seed=0):
+        self.seed = int(seed)
+
+    def _rng(self, symbol):
+        """根据 symbol 和 seed 构造确定性的随机数发生器"""
+        symbol_hash = zlib.crc32(str(symbol).encode("utf-8"))
+        return np.random.default_rng([self.seed, symbol_hash])
+
+    def generate_arrays(self, symbol, bars, end_date=None, freq="B", bar_minutes=None):
+        """
+        生成模拟K线的原始数组
+        Args:
+            symbol: 股票代码或名称（决定随机种子）
+            bars: K线数量（不大于0时返回空数组）
+            end_date: 最后一根K线的日期，默认今天
+            freq: pandas频率字符串，默认工作日
+            bar_minutes: 设置时生成分钟线（每根K线的分钟数），忽略 freq
+        Returns:
+            dict: date(datetime64), open, high, low, close(float64), volume(int64)
+        """
+        bars = int(bars)
+        if bars <= 0:
+            return {
+                "date": np.array([], dtype="datetime64[m]" if bar_minutes else "datetime64[D]"),
+                **{column: np.array([], dtype=np.float64) for column in ("open", "high", "low", "close")},
+                "volume": np.array([], dtype=np.int64),
+            }
+        rng = self._rng(symbol)
+
+        # 每个symbol固定的基础参数：起始价格、年化波动率、漂移、平均成交量
+        base_price = float(np.exp(rng.uniform(np.log(5), np.log(500))))
+        annual_vol = rng.uniform(0.15, 0.6)
+        annual_drift = rng.uniform(-0.05, 0.15)
+        base_volume = float(np.exp(rng.uniform(np.log(2e5), np.log(5e7))))
+
+        sigma = annual_vol / np.sqrt(self.TRADING_DAYS_PER_YEAR)
+        mu = annual_drift / self.TRADING_DAYS_PER_YEAR - 0.5 * sigma ** 2
+        if bar_minutes:
+            # 分钟线的波动率和成交量按时间比例缩放
+            fraction = bar_minutes / self.SESSION_MINUTES
+            sigma *= np.sqrt(fraction)
+            mu *= fraction
+            base_volume *= fraction
+
+        # 隔夜跳空：常规小幅跳空 + 少量大幅跳空（消息面）
+        gap = rng.normal(0.0, sigma * 0.3, bars)
+        jumps = rng.random(bars) < 0.02
+        gap[jumps] += rng.normal(0.0, sigma * 4, int(jumps.sum()))
+        gap[0] = 0.0
+
+        # 日内收益
+        intraday = rng.normal(mu, sigma * 0.9, bars)
+
+        # 收盘价 = 起始价 * exp(累计(跳空 + 日内))
+        log_close = np.log(base_price) + np.cumsum(gap + intraday)
+        close = np.exp(log_close)
+        open_ = np.exp(log_close - intraday)
+
+        # 最高/最低价在开收盘价基础上向外扩展
+        body_high = np.maximum(open_, close)
+        body_low = np.minimum(open_, close)
+        high = body_high * np.exp(np.abs(rng.normal(0.0, sigma * 0.5, bars)))
+        low = body_low * np.exp(-np.abs(rng.normal(0.0, sigma * 0.5, bars)))
+
+        # 成交量与价格波动幅度正相关
+        move = np.abs(gap + intraday) / sigma
+        volume = base_volume * np.exp(rng.normal(0.0, 0.3, bars)) * (1 + 0.5 * move)
+
+        # 价格保留两位小数，且必须为正数
+        open_ = np.maximum(np.round(open_, 2), 0.01)
+        close = np.maximum(np.round(close, 2), 0.01)
+        high = np.maximum(np.round(high, 2), 0.01)
+        low = np.maximum(np.round(low, 2), 0.01)
+
+        if bar_minutes:
+            dates = self._make_intraday_times(bars, end_date, bar_minutes)
+        else:
+            dates = self._make_dates(bars, end_date, freq)
+
+        return {
+            "date": dates,
+            "open": open_,
+            "high": high,
+            "low": low,
+            "close": close,
+            "volume": volume.astype(np.int64),
+        }
+
+    @staticmethod
+    def _make_dates(bars, end_date, freq):
+        """生成K线日期序列（工作日使用 np.busday_offset，比 pd.date_range 快两个数量级）"""
+        end = pd.Timestamp(end_date if end_date is not None else datetime.now()).normalize()
+        if freq == "B":
+            end_day = np.datetime64(end.date(), "D")
+            offsets = np.arange(-(bars - 1), 1)
+            return np.busday_offset(end_day, offsets, roll="backward")
+        return pd.date_range(end=end, periods=bars, freq=freq).values
+
+    @classmethod
+    def _make_intraday_times(cls, bars, end_date, bar_minutes):
+        """生成分钟线时间序列：最近若干个工作日交易时段内的K线时间"""
+        per_day = max(cls.SESSION_MINUTES // bar_minutes, 1)
+        n_days = -(-bars // per_day)
+        end = pd.Timestamp(end_date if end_date is not None else datetime.now()).normalize()
+        days = np.busday_offset(np.datetime64(end.date(), "D"), np.arange(-(n_days - 1), 1), roll="backward")
+        offsets = cls.SESSION_OPEN_MINUTE + np.arange(per_day) * bar_minutes
+        minutes = days.astype(np.int64)[:, None] * 1440 + offsets[None, :]
+        return minutes.ravel()[-bars:].astype("datetime64[m]")
+
+    def generate(self, symbol, bars, end_date=None, freq="B", bar_minutes=None):
+        """
+        生成与 KlineFetcher 输出格式一致的DataFrame
+        Returns:
+            DataFrame with columns: date(str), open, high, low, close, volume
+            分钟线的 date 格式为 "%Y-%m-%d %H:%M"
+        """
+        arrays = self.generate_arrays(symbol, bars, end_date=end_date, freq=freq, bar_minutes=bar_minutes)
+        df = pd.DataFrame(arrays)
+        df["date"] = df["date"].dt.strftime("%Y-%m-%d %H:%M" if bar_minutes else "%Y-%m-%d")
+        return df
+
+    def generate_universe(self, symbols, bars, end_date=None, freq="B"):
+        """批量生成多只股票的模拟数据，返回 {symbol: DataFrame}"""
+        return {symbol: self.generate(symbol, bars, end_date=end_date, freq=freq) for symbol in symbols}
+
+
+# 测试代码
+if __name__ == "__main__":
+    import time
+
+    market = SyntheticMarket(seed=42)
+
+    df = market.generate("600519", 10)
+    print(df)
+
+    # 确定性检查
+    assert df.equals(market.generate("600519", 10))
+
+    # 吞吐量测试
+    n = 2_000_000
+    start = time.perf_counter()
+    market.generate_arrays("AAPL", n)
+    elapsed = time.perf_counter() - start
+    print(f"生成 {n} 根K线耗时 {elapsed:.3f}s（{n / elapsed / 1e6:.1f}M 根/秒）")
@@ -0,0 +1,33 @@
+# conftest.py - 测试环境：使用离线模拟行情，不读写磁盘快照和静态文件
+import os
+import sys
+
+os.environ["STOCK_API_OFFLINE"] = "1"
+os.environ["STOCK_API_SNAPSHOT"] = "0"
+os.environ.pop("STOCK_API_STATIC_DIR", None)
+os.environ.pop("STOCK_API_SHARED_CACHE", None)
+
+# 模块都在仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def client():
+    """web_api.app 的测试客户端（进程内共用一个 StockDataAPI）"""
+    from web_api import app
+    return TestClient(app)
+
+
+@pytest.fixture
+def fresh_api(monkeypatch):
+    """替换 web_api 使用的 StockDataAPI，缓存从空开始"""
+    import web_api
+    from stock_api import StockDataAPI
+
+    api = StockDataAPI(offline=True)
+    monkeypatch.setattr(web_api, "api", api)
+    yield api
+    api.close()
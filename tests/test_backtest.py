@@ -0,0 +1,34 @@
+# test_backtest.py - 信号回测接口：并行获取K线，结果与逐只获取一致，条件不合法返回400
+from backtest import Backtester
+from indicators import IndicatorCalculator
+from stock_api import StockDataAPI
+from warmup import plan_bars, trim
+
+STOCKS = ["贵州茅台", "五粮液", "招商银行"]
+ENTRY = "MACD_golden_cross"
+EXIT = "MACD_death_cross"
+
+
+def test_matches_serial_fetch(fresh_api):
+    result = fresh_api.backtest(ENTRY, EXIT, stock_names=STOCKS + ["不存在的股票"], days=120, workers=0)
+    assert result["missing"] == ["不存在的股票"]
+
+    serial = StockDataAPI(offline=True)
+    try:
+        bars = plan_bars(120, {ENTRY, EXIT})
+        computed = {name: trim(IndicatorCalculator().calculate_all(serial.fetcher.get_kline_data(name, bars)), 120)
+                    for name in STOCKS}
+    finally:
+        serial.close()
+    expected = Backtester(computed, fee=0.0003, slippage=0.0005).run(ENTRY, EXIT)
+    assert [row.pop("stock_code") for row in result["symbols"]] == [
+        fresh_api.converter.name_to_code(row["stock_name"]) for row in result["symbols"]]
+    assert result["symbols"] == expected["symbols"]
+
+
+def test_endpoint(client, fresh_api):
+    params = {"entry": ENTRY, "exit": EXIT, "symbols": ",".join(STOCKS), "days": 120}
+    response = client.get("/api/backtest", params=params)
+    assert response.status_code == 200
+    assert len(response.json()["symbols"]) == len(STOCKS)
+    assert client.get("/api/backtest", params={**params, "entry": "RSI"}).status_code == 400
@@ -0,0 +1,76 @@
+# test_compact.py - 列式缓存结果的渲染必须与原先的 DataFrame.to_dict 输出一致
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from compact import CompactFrame, CompactResult, clean_value, finite_list
+from indicators import IndicatorCalculator
+from stock_api import KLINE_COLUMNS, StockDataAPI
+from synthetic_market import SyntheticMarket
+from warmup import plan_bars, trim
+
+STOCK = "贵州茅台"
+
+
+@pytest.fixture(scope="module")
+def legacy_api():
+    """只用于调用原先的 _clean_dataframe"""
+    api = StockDataAPI(offline=True)
+    yield api
+    api.close()
+
+
+def legacy_records(api, df):
+    return api._clean_dataframe(df).to_dict(orient="records")
+
+
+@pytest.mark.parametrize("bars", [5, 30, 250])
+def test_to_records_matches_to_dict(legacy_api, bars):
+    full = IndicatorCalculator().calculate_all(SyntheticMarket(seed=6).generate("COMPACT", bars))
+    frame = CompactFrame.from_dataframe(full)
+    assert frame.to_records() == legacy_records(legacy_api, full)
+    assert frame.to_records(KLINE_COLUMNS) == legacy_records(legacy_api, full[KLINE_COLUMNS])
+
+
+def test_non_finite_values_become_none(legacy_api):
+    df = pd.DataFrame({
+        "date": ["2024-01-02", "2024-01-03", "2024-01-04"],
+        "close": [1.5, np.nan, np.inf],
+        "volume": np.array([1, 2, 3], dtype=np.int64),
+        "flag": [True, False, True],
+    })
+    records = CompactFrame.from_dataframe(df).to_records()
+    assert records == legacy_records(legacy_api, df)
+    assert records[1]["close"] is None and records[2]["close"] is None
+
+
+def test_intraday_dates_round_trip():
+    bars = SyntheticMarket(seed=6).generate("MINUTE", 50, bar_minutes=5)
+    frame = CompactFrame.from_dataframe(bars)
+    assert [row["date"] for row in frame.to_records()] == bars["date"].tolist()
+    pd.testing.assert_frame_equal(frame.to_dataframe(), bars)
+
+
+def test_cached_result_survives_pickle():
+    full = IndicatorCalculator().calculate_all(SyntheticMarket(seed=6).generate("PICKLE", 60))
+    result = CompactResult("测试", "000000", CompactFrame.from_dataframe(full), tuple(KLINE_COLUMNS), {}, {"days": 60})
+    assert pickle.loads(pickle.dumps(result)).render() == result.render()
+
+
+def test_endpoint_matches_legacy_render(client, fresh_api, legacy_api):
+    days = 30
+    body = client.get(f"/api/stock/{STOCK}", params={"days": days}).json()
+
+    bars = fresh_api.fetcher.get_kline_data(STOCK, plan_bars(days))
+    full = trim(IndicatorCalculator().calculate_all(bars), days)
+    assert body["indicators"] == legacy_records(legacy_api, full)
+    assert body["data"] == legacy_records(legacy_api, trim(bars, days))
+
+
+def test_clean_helpers():
+    assert finite_list(np.array([1.0, np.nan, -np.inf])) == [1.0, None, None]
+    assert finite_list(np.array([[1.0, np.nan], [np.inf, 2.0]])) == [[1.0, None], [None, 2.0]]
+    value = {"a": np.float64("nan"), "b": {"c": np.int64(3), "d": np.inf}}
+    assert clean_value(value) == {"a": None, "b": {"c": 3, "d": None}}
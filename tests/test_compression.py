@@ -0,0 +1,46 @@
+# test_compression.py - 响应压缩：较大的响应在线程池中压缩，不阻塞事件循环
+import threading
+
+import pytest
+
+import compression
+
+STOCK = "贵州茅台"
+
+
+@pytest.fixture
+def threads(monkeypatch):
+    """记录中间件（事件循环）所在的线程和每次压缩所在的线程"""
+    recorded = {"loop": [], "compress": []}
+    route_level, compress = compression.route_level, compression.compress
+
+    def record(name, func):
+        def wrapper(*args, **kwargs):
+            recorded[name].append(threading.current_thread())
+            return func(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(compression, "route_level", record("loop", route_level))
+    monkeypatch.setattr(compression, "compress", record("compress", compress))
+    return recorded
+
+
+def get(client, encoding):
+    return client.get(f"/api/stock/{STOCK}", params={"days": 60}, headers={"Accept-Encoding": encoding})
+
+
+def test_large_body_compressed_in_threadpool(client, threads, monkeypatch):
+    monkeypatch.setattr(compression, "THREAD_SIZE", 0)
+    plain = get(client, "identity")
+    response = get(client, "gzip")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.content == plain.content
+    assert len(threads["compress"]) == 1
+    assert threads["compress"][0] is not threads["loop"][0]
+
+
+def test_small_body_compressed_inline(client, threads, monkeypatch):
+    monkeypatch.setattr(compression, "THREAD_SIZE", 1 << 30)
+    response = get(client, "gzip")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert threads["compress"] == threads["loop"][-1:]
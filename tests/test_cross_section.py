@@ -0,0 +1,49 @@
+# test_cross_section.py - 横截面分析：并行获取多只股票的K线，结果与逐只获取一致
+import threading
+import time
+
+from cross_section import cross_section
+from stock_api import StockDataAPI
+
+STOCKS = ["贵州茅台", "五粮液", "招商银行", "宁德时代"]
+
+
+def test_parallel_fetch_matches_serial(fresh_api):
+    result = fresh_api.cross_section(STOCKS + ["不存在的股票"], days=60)
+    assert result["missing"] == ["不存在的股票"]
+
+    serial = StockDataAPI(offline=True)
+    try:
+        frames = {name: serial.fetcher.get_kline_data(name, 60) for name in STOCKS}
+        codes = {name: serial.converter.name_to_code(name) for name in STOCKS}
+    finally:
+        serial.close()
+    expected = cross_section(frames, codes)
+    for key in ("symbols", "date_range", "rankings", "matrix"):
+        assert result[key] == expected[key], key
+
+
+def test_fetches_run_concurrently(fresh_api, monkeypatch):
+    fetch = fresh_api.fetcher.get_kline_data
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow(*args, **kwargs):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.1)
+        with lock:
+            active[0] -= 1
+        return fetch(*args, **kwargs)
+
+    monkeypatch.setattr(fresh_api.fetcher, "get_kline_data", slow)
+    assert fresh_api.cross_section(STOCKS, days=60)["symbols"] == len(STOCKS)
+    assert peak[0] > 1
+
+
+def test_endpoint(client, fresh_api):
+    response = client.get("/api/cross-section", params={"symbols": ",".join(STOCKS), "days": 60})
+    assert response.status_code == 200
+    assert response.json()["symbols"] == len(STOCKS)
+    assert "fetch" in response.headers.get("Server-Timing", "")
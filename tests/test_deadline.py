@@ -0,0 +1,178 @@
+# test_deadline.py - 请求时间预算：超时返回过期缓存或504，后台任务继续完成并写入缓存
+import threading
+import time
+
+import pytest
+
+import deadline as deadline_module
+from deadline import DeadlineExceeded, request_deadline, run_with_deadline
+from stock_api import StockDataAPI
+
+# 模拟上游响应时间远超预算
+SLOW = 0.5
+BUDGET = 0.05
+
+
+@pytest.fixture
+def short_ttl_api(monkeypatch):
+    """结果缓存0.2秒过期的 StockDataAPI，替换 web_api 使用的实例"""
+    import web_api
+
+    monkeypatch.setenv("STOCK_API_CACHE_TTL", "0.2")
+    api = StockDataAPI(offline=True)
+    monkeypatch.setattr(web_api, "api", api)
+    yield api
+    api.close()
+
+
+class Background:
+    """统计已在后台执行完的获取和计算任务"""
+
+    def __init__(self):
+        self.finished = 0
+        self.condition = threading.Condition()
+
+    def wrap(self, func):
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self.condition:
+                    self.finished += 1
+                    self.condition.notify_all()
+        return wrapper
+
+    def wait(self, count=1, timeout=2):
+        """等待 count 个任务执行完（包括写入缓存）"""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.finished >= count, timeout)
+
+
+def slow_upstream(monkeypatch, api):
+    """让 api 获取K线变慢并把请求预算设为 BUDGET，返回统计后台任务的 Background"""
+    fetch = api.fetcher.get_kline_data
+
+    def slow(*args, **kwargs):
+        time.sleep(SLOW)
+        return fetch(*args, **kwargs)
+
+    background = Background()
+    monkeypatch.setattr(api.fetcher, "get_kline_data", slow)
+    monkeypatch.setattr(api, "_compute", background.wrap(api._compute))
+    monkeypatch.setattr(api, "_compute_summary", background.wrap(api._compute_summary))
+    monkeypatch.setattr(deadline_module, "DEFAULT_BUDGET", BUDGET)
+    return background
+
+
+def test_run_with_deadline_finishes_in_background():
+    finished = threading.Event()
+
+    def work():
+        time.sleep(0.2)
+        finished.set()
+        return "完成"
+
+    assert run_with_deadline(request_deadline(1), work) == "完成"
+    finished.clear()
+    with pytest.raises(DeadlineExceeded):
+        run_with_deadline(request_deadline(BUDGET), work)
+    assert not finished.is_set()
+    assert finished.wait(2)
+
+
+def test_same_key_shares_background_task():
+    calls = []
+
+    def work(value):
+        calls.append(value)
+        time.sleep(0.2)
+        return value
+
+    for _ in range(3):
+        with pytest.raises(DeadlineExceeded):
+            run_with_deadline(request_deadline(BUDGET), work, "a", key="同一个")
+    # 仍在执行的任务直接等待它的结果
+    assert run_with_deadline(request_deadline(1), work, "b", key="同一个") == "a"
+    assert run_with_deadline(request_deadline(1), work, "c", key="同一个") == "c"
+    assert calls == ["a", "c"]
+    assert not deadline_module._inflight
+
+
+def test_zero_budget_disables_deadline():
+    assert request_deadline(0) is None
+    assert run_with_deadline(None, lambda: 1) == 1
+
+
+def test_stale_result_on_timeout(client, short_ttl_api, monkeypatch):
+    fresh = client.get("/api/stock/贵州茅台", params={"days": 30})
+    assert fresh.status_code == 200 and fresh.headers["X-Cache"] == "MISS"
+    time.sleep(0.3)
+
+    background = slow_upstream(monkeypatch, short_ttl_api)
+    response = client.get("/api/stock/贵州茅台", params={"days": 30})
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "STALE"
+    assert response.headers["Cache-Control"] == "no-cache"
+    body = response.json()
+    assert body["metadata"]["stale"] and body["metadata"]["stale_seconds"] >= 0
+    assert body["data"] == fresh.json()["data"]
+
+    # 超时的计算在后台完成并刷新缓存
+    assert background.wait()
+    again = client.get("/api/stock/贵州茅台", params={"days": 30})
+    assert again.headers["X-Cache"] == "HIT"
+    assert "stale" not in again.json()["metadata"]
+
+
+def test_timeout_without_cache(client, short_ttl_api, monkeypatch):
+    background = slow_upstream(monkeypatch, short_ttl_api)
+    assert client.get("/api/stock/五粮液", params={"days": 30}).status_code == 504
+    assert client.get("/api/stock/招商银行/simple").status_code == 504
+
+    assert background.wait(2)
+    response = client.get("/api/stock/五粮液", params={"days": 30})
+    assert response.status_code == 200 and response.headers["X-Cache"] == "HIT"
+
+
+def test_simple_stale_and_not_found(client, short_ttl_api, monkeypatch):
+    fresh = client.get("/api/stock/贵州茅台/simple")
+    assert fresh.status_code == 200
+    assert fresh.headers["Cache-Control"].startswith("public, max-age=")
+    time.sleep(0.3)
+
+    background = slow_upstream(monkeypatch, short_ttl_api)
+    response = client.get("/api/stock/贵州茅台/simple")
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "STALE"
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert response.json()["summary"] == fresh.json()["summary"]
+
+    assert client.get("/api/stock/不存在的股票/simple").status_code == 404
+    assert background.wait()
+
+
+def test_batch_returns_partial_results(client, short_ttl_api, monkeypatch):
+    monkeypatch.setenv("STOCK_API_BATCH_WORKERS", "0")
+    cached = client.get("/api/stock/贵州茅台", params={"days": 30}).json()
+
+    background = slow_upstream(monkeypatch, short_ttl_api)
+    response = client.get("/api/batch", params={"names": "贵州茅台,宁德时代", "days": 30})
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-cache"
+    body = response.json()
+    assert body["partial"] and body["count"] == 1
+    assert body["results"]["贵州茅台"]["data"] == cached["data"]
+    assert body["results"]["宁德时代"]["timeout"]
+    assert background.wait()
+
+
+def test_repeated_timeouts_compute_once(client, short_ttl_api, monkeypatch):
+    background = slow_upstream(monkeypatch, short_ttl_api)
+    for _ in range(3):
+        assert client.get("/api/stock/宁德时代", params={"days": 30}).status_code == 504
+        assert client.get("/api/stock/宁德时代/simple").status_code == 504
+
+    # 完整结果和摘要各只在后台计算一次
+    assert background.wait(count=2)
+    assert not background.wait(count=3, timeout=SLOW)
+    assert background.finished == 2
@@ -0,0 +1,80 @@
+# test_downsample.py - max_points 降采样：K线按桶聚合OHLC，指标用LTTB选点
+import numpy as np
+import pytest
+
+from downsample import MIN_POINTS, bucket_starts, downsample_frame, lttb_indices
+from indicators import IndicatorCalculator
+from stock_api import KLINE_COLUMNS
+from synthetic_market import SyntheticMarket
+
+STOCK = "贵州茅台"
+
+
+def reference_lttb(y, n_out):
+    """逐桶循环的LTTB（与 lttb_indices 相同，左顶点取上一个桶的平均点）"""
+    n = len(y)
+    starts = [1 + (i * (n - 2)) // (n_out - 2) for i in range(n_out - 2)] + [n - 1]
+    averages = [(np.mean(np.arange(a, b)), np.mean(y[a:b])) for a, b in zip(starts, starts[1:])]
+    selected = [0]
+    for i, (a, b) in enumerate(zip(starts, starts[1:])):
+        left = (0.0, y[0]) if i == 0 else averages[i - 1]
+        right = averages[i + 1] if i + 1 < len(averages) else (n - 1.0, y[-1])
+        areas = [abs((left[0] - right[0]) * (y[j] - left[1]) - (left[0] - j) * (right[1] - left[1]))
+                 for j in range(a, b)]
+        selected.append(a + int(np.argmax(areas)))
+    return np.array(selected + [n - 1])
+
+
+@pytest.mark.parametrize("n, n_out", [(100, 10), (1000, 37), (5000, 500), (7, 5)])
+def test_lttb_matches_reference(n, n_out):
+    y = SyntheticMarket(seed=n).generate("LTTB", n)["close"].to_numpy()
+    indices = lttb_indices(y, n_out)
+    assert len(indices) == n_out
+    assert indices[0] == 0 and indices[-1] == n - 1
+    assert np.all(np.diff(indices) > 0)
+    np.testing.assert_array_equal(indices, reference_lttb(y, n_out))
+
+
+def test_lttb_short_input_unchanged():
+    np.testing.assert_array_equal(lttb_indices(np.arange(5.0), 10), np.arange(5))
+
+
+def test_ohlc_buckets():
+    df = IndicatorCalculator().calculate_all(SyntheticMarket(seed=8).generate("OHLC", 1003))
+    candles, lines = downsample_frame(df, 100, KLINE_COLUMNS)
+    assert len(candles) == 100 and len(lines) == 100
+
+    starts = bucket_starts(len(df), 100)
+    ends = np.append(starts[1:], len(df))
+    for row, (a, b) in zip(candles.itertuples(), zip(starts, ends)):
+        bucket = df.iloc[a:b]
+        assert row.date == bucket["date"].iloc[0]
+        assert row.open == bucket["open"].iloc[0]
+        assert row.high == bucket["high"].max()
+        assert row.low == bucket["low"].min()
+        assert row.close == bucket["close"].iloc[-1]
+        assert row.volume == bucket["volume"].sum()
+    assert candles["volume"].sum() == df["volume"].sum()
+
+
+def test_endpoint_downsamples(client):
+    full = client.get(f"/api/stock/{STOCK}", params={"days": 500}).json()
+    response = client.get(f"/api/stock/{STOCK}", params={"days": 500, "max_points": 50})
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["data"]) == 50 and len(body["indicators"]) == 50
+    assert body["metadata"]["downsampled"] == {"max_points": 50, "rows": 500}
+    assert sum(bar["volume"] for bar in body["data"]) == sum(bar["volume"] for bar in full["data"])
+    assert max(bar["high"] for bar in body["data"]) == max(bar["high"] for bar in full["data"])
+    # LTTB 选出的行是原始行，保留首尾两行
+    assert body["indicators"][0] == full["indicators"][0]
+    assert body["indicators"][-1] == full["indicators"][-1]
+    assert all(row in full["indicators"] for row in body["indicators"][:5])
+    # 完整结果仍在缓存中，没有被降采样覆盖
+    assert client.get(f"/api/stock/{STOCK}", params={"days": 500}).json() == full
+
+
+def test_endpoint_max_points_bounds(client):
+    assert client.get(f"/api/stock/{STOCK}", params={"max_points": MIN_POINTS - 1}).status_code == 400
+    small = client.get(f"/api/stock/{STOCK}", params={"days": 20, "max_points": 100}).json()
+    assert len(small["data"]) == 20 and "downsampled" not in small["metadata"]
@@ -0,0 +1,125 @@
+# test_history.py - 日期区间和游标分页（BarStore）
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from bar_store import BarStore, decode_cursor, encode_cursor
+from indicators import IndicatorCalculator
+from synthetic_market import SyntheticMarket
+
+STOCK = "贵州茅台"
+
+
+class FakeFetcher:
+    """返回固定序列前 n 根中的最后若干根，n 增加即模拟新K线到达"""
+
+    def __init__(self, bars, n):
+        self.bars = bars
+        self.n = n
+        self.calls = []
+
+    def get_kline_data(self, stock_name, days, interval="1d"):
+        self.calls.append(days)
+        return self.bars.iloc[:self.n].tail(days).reset_index(drop=True)
+
+
+def test_cursor_round_trip(client):
+    first = client.get(f"/api/stock/{STOCK}", params={"start": "2024-01-01", "limit": 5})
+    assert first.status_code == 200
+    page = first.json()
+    assert len(page["data"]) == 5
+    assert page["data"][0]["date"] >= "2024-01-01"
+    assert page["metadata"]["has_more"]
+
+    second = client.get(f"/api/stock/{STOCK}", params={"cursor": page["metadata"]["next_cursor"], "limit": 5})
+    assert second.status_code == 200
+    both = client.get(f"/api/stock/{STOCK}", params={"start": "2024-01-01", "limit": 10}).json()
+    dates = [bar["date"] for bar in page["data"] + second.json()["data"]]
+    assert dates == [bar["date"] for bar in both["data"]]
+
+
+def test_cursor_at_end_returns_empty_page(client):
+    latest = client.get(f"/api/stock/{STOCK}", params={"start": "2020-01-01", "limit": 1}).json()
+    cursor = encode_cursor(latest["stock_code"], "1d", latest["metadata"]["available"]["end"])
+    response = client.get(f"/api/stock/{STOCK}", params={"cursor": cursor})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["data"] == []
+    assert body["metadata"]["next_cursor"] == cursor
+    assert not body["metadata"]["has_more"]
+
+
+def test_cursor_rejected_for_other_series(client):
+    cursor = client.get(f"/api/stock/{STOCK}", params={"start": "2024-01-01", "limit": 5}).json()
+    cursor = cursor["metadata"]["next_cursor"]
+    assert client.get("/api/stock/腾讯控股", params={"cursor": cursor}).status_code == 400
+    assert client.get(f"/api/stock/{STOCK}", params={"cursor": cursor, "interval": "1wk"}).status_code == 400
+    assert client.get(f"/api/stock/{STOCK}", params={"cursor": "不是游标"}).status_code == 400
+
+
+def test_decode_cursor_checks_series():
+    cursor = encode_cursor("600519", "1d", "2024-01-05")
+    assert decode_cursor(cursor, "600519", "1d") == "2024-01-05"
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "000001", "1d")
+
+
+def test_start_after_end_rejected(client):
+    response = client.get(f"/api/stock/{STOCK}", params={"start": "2024-02-01", "end": "2024-01-01"})
+    assert response.status_code == 400
+
+
+def test_append_matches_full_calculation():
+    bars = SyntheticMarket(seed=1).generate("STORE", 1000)
+    fetcher = FakeFetcher(bars, 990)
+    calculator = IndicatorCalculator()
+    store = BarStore(fetcher, calculator, max_age=0)
+    store.series("STORE", "STORE", "1d", 990)
+
+    fetcher.n = 995
+    with mock.patch("bar_store.estimate_bars", return_value=5):
+        series = store.series("STORE", "STORE", "1d", 990)
+    # 只获取了新K线（带重叠），没有重新获取完整区间
+    assert fetcher.calls == [990, 10]
+
+    expected = calculator.calculate_all(bars.iloc[:995].reset_index(drop=True))
+    assert list(series.frame["date"]) == list(expected["date"])
+    assert series.frame.dtypes.equals(expected.dtypes)
+    for column in expected.columns:
+        if expected[column].dtype == bool:
+            assert (series.frame[column] == expected[column]).all(), column
+        elif column != "date":
+            np.testing.assert_allclose(series.frame[column], expected[column], rtol=1e-3, atol=1e-3,
+                                       err_msg=column)
+
+
+def test_overlap_price_change_refetches_full_range():
+    bars = SyntheticMarket(seed=2).generate("ADJ", 600)
+    fetcher = FakeFetcher(bars, 590)
+    store = BarStore(fetcher, IndicatorCalculator(), max_age=0)
+    store.series("ADJ", "ADJ", "1d", 590)
+
+    # 除权后历史价格整体调整：重叠部分不一致，改为重新获取完整区间
+    fetcher.bars = bars.assign(close=bars["close"] * 0.5)
+    fetcher.n = 592
+    with mock.patch("bar_store.estimate_bars", return_value=2):
+        series = store.series("ADJ", "ADJ", "1d", 590)
+    assert fetcher.calls == [590, 7, 590]
+    np.testing.assert_allclose(series.frame["close"], bars["close"].iloc[2:592] * 0.5)
+
+
+def test_unpadded_dates_match_padded():
+    bars = SyntheticMarket(seed=3).generate("PAD", 400)
+    store = BarStore(FakeFetcher(bars, 400), IndicatorCalculator(), max_age=0)
+    # 月份和日都是一位数的日期，未补零时按字符串比较会排错位置
+    dates = [date for date in bars["date"] if date[5] == "0" and date[8] == "0"]
+    start, end = dates[0], dates[-1]
+    unpadded = lambda date: f"{int(date[:4])}-{int(date[5:7])}-{int(date[8:10])}"
+
+    expected, _ = store.page("PAD", "PAD", start=start, end=end, limit=1000)
+    assert expected["date"].iloc[0] == start and expected["date"].iloc[-1] == end
+    for params in ({"start": unpadded(start), "end": unpadded(end)},
+                   {"start": f" {start} ", "end": f"{end} "}):
+        frame, _ = store.page("PAD", "PAD", limit=1000, **params)
+        assert frame["date"].tolist() == expected["date"].tolist(), params
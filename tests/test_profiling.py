@@ -0,0 +1,34 @@
+# test_profiling.py - 性能分析：需要令牌，分析的请求与普通请求返回相同的数据
+import pytest
+
+TOKEN = "test-token"
+
+
+@pytest.fixture
+def profile_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("STOCK_API_PROFILE_TOKEN", TOKEN)
+    monkeypatch.setenv("STOCK_API_PROFILE_DIR", str(tmp_path))
+
+
+def test_profile_requires_token(client, profile_env):
+    response = client.get("/api/stock/贵州茅台", params={"profile": "true"})
+    assert response.status_code == 403
+
+
+def test_profile_keeps_bar_interval(client, fresh_api, profile_env):
+    params = {"days": 20, "interval": "1wk"}
+    response = client.get("/api/stock/贵州茅台", params={**params, "profile": "true"},
+                          headers={"X-Profile-Token": TOKEN})
+    assert response.status_code == 200
+    body = response.json()
+    profile = body["profile"]
+    assert profile["interval"] == "1wk"
+    assert isinstance(profile["interval_ms"], float) and profile["interval_ms"] > 0
+    assert profile["samples"] > 0
+    assert body["metadata"]["interval"] == "1wk"
+
+    plain = client.get("/api/stock/贵州茅台", params=params).json()
+    assert body["data"] == plain["data"]
+
+    saved = client.get(f"/api/profiles/{profile['id']}", headers={"X-Profile-Token": TOKEN})
+    assert saved.status_code == 200 and saved.json()["samples"] == profile["samples"]
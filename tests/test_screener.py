@@ -0,0 +1,37 @@
+# test_screener.py - 选股条件表达式：只允许布尔条件，其他表达式返回400
+import numpy as np
+import pytest
+
+from screener import compile_filter, evaluate_filter
+
+
+@pytest.mark.parametrize("expression", [
+    "RSI < 30",
+    "MACD_golden_cross",
+    "RSI < 30 and MACD_golden_cross",
+    "not (K > 80 or above_MA20)",
+    "-K < -20",
+    "True",
+])
+def test_conditions_accepted(expression):
+    compile_filter(expression)
+
+
+@pytest.mark.parametrize("expression", [
+    "RSI", "-K", "1", "RSI + 1", "RSI and K < 20", "not RSI", "__import__('os')", "RSI < 'a'", "UNKNOWN > 1",
+])
+def test_non_conditions_rejected(expression):
+    with pytest.raises(ValueError):
+        compile_filter(expression)
+
+
+def test_evaluate_filter():
+    columns = {"RSI": np.array([20.0, 50.0, np.nan]), "MACD_golden_cross": np.array([True, True, False])}
+    mask = evaluate_filter(compile_filter("RSI < 30 and MACD_golden_cross"), columns)
+    assert mask.tolist() == [True, False, False]
+
+
+@pytest.mark.parametrize("expression", ["RSI", "-K", "RSI +", "close > 'a'"])
+def test_endpoint_rejects_invalid_filter(client, expression):
+    response = client.get("/api/screener", params={"filter": expression})
+    assert response.status_code == 400
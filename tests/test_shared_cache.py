@@ -0,0 +1,54 @@
+# test_shared_cache.py - 多worker共享的SQLite缓存：淘汰次数包含L2，基础K线在worker之间共享
+import pandas as pd
+
+from cache import LRUCache
+from kline_fetcher import KlineFetcher
+from shared_cache import SQLiteCache, TieredCache
+from stock_code import StockCodeConverter
+
+
+def test_evictions_include_l2(tmp_path):
+    cache = TieredCache(LRUCache(maxsize=2), SQLiteCache(str(tmp_path / "cache.db"), max_entries=3))
+    for i in range(10):
+        cache.set(f"key_{i}", i)
+    cache.l2.trim()
+
+    assert cache.l1.evictions == 8 and cache.l2.evictions == 7
+    assert cache.evictions == 15
+    stats = cache.stats()
+    assert stats["evictions"] == 15 and stats["l1_evictions"] == 8 and stats["l2_evictions"] == 7
+
+
+def test_tuple_keys(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), ttl=60)
+    cache.set(("600519.SS", "1d"), "bars")
+    assert cache.get(("600519.SS", "1d")) == "bars"
+    assert ("600519.SS", "1d") in cache and ("600519.SS", "5m") not in cache
+
+
+def worker(monkeypatch):
+    """模拟一个worker进程中的 KlineFetcher，记录向上游获取的次数"""
+    fetcher = KlineFetcher(offline=True)
+    fetcher.set_converter(StockCodeConverter())
+    calls = []
+    fetch = fetcher._fetch_base_bars
+
+    def counting(*args, **kwargs):
+        calls.append(args[0])
+        return fetch(*args, **kwargs)
+
+    monkeypatch.setattr(fetcher, "_fetch_base_bars", counting)
+    return fetcher, calls
+
+
+def test_base_bars_shared_between_workers(tmp_path, monkeypatch):
+    monkeypatch.setenv("STOCK_API_SHARED_CACHE", str(tmp_path / "shared.db"))
+    first, first_calls = worker(monkeypatch)
+    second, second_calls = worker(monkeypatch)
+    assert isinstance(first.base_cache, TieredCache)
+
+    bars = first.get_kline_data("贵州茅台", 60)
+    assert second.get_kline_data("贵州茅台", 60).equals(bars)
+    weekly = second.get_kline_data("贵州茅台", 10, interval="1wk")
+    assert len(first_calls) == 1 and second_calls == []
+    assert isinstance(weekly, pd.DataFrame) and len(weekly) == 10
@@ -0,0 +1,109 @@
+# test_snapshot.py - 磁盘快照：往返一致，损坏、截断、schema 不一致的文件视为未命中并删除
+import os
+import time
+
+import pytest
+
+import snapshot
+from cache import LRUCache
+from compact import CompactFrame, CompactResult
+from indicators import IndicatorCalculator
+from shared_cache import TieredCache
+from snapshot import SnapshotError, SnapshotStore, read_snapshot, write_snapshot
+from synthetic_market import SyntheticMarket
+
+
+@pytest.fixture(scope="module")
+def bars():
+    return SyntheticMarket(seed=4).generate("SNAP", 250)
+
+
+@pytest.fixture(scope="module")
+def result(bars):
+    calculator = IndicatorCalculator()
+    full = calculator.calculate_all(bars)
+    return CompactResult("测试", "000000", CompactFrame.from_dataframe(full), tuple(bars.columns),
+                         calculator.get_indicators_summary(full), {"days": len(bars)})
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path / "snapshots"), ttl=60)
+
+
+def test_round_trip(store, bars, result):
+    store.set("测试_250", result)
+    store.set(("SNAP", "1d"), bars)
+    assert store.get("测试_250").render() == result.render()
+    assert store.get(("SNAP", "1d")).equals(bars)
+    assert len(store) == 2
+    value, remaining = store.get_with_ttl("测试_250")
+    assert 0 < remaining <= 60
+
+
+def test_unsupported_value_not_written(store):
+    store.set("other", {"a": 1})
+    assert len(store) == 0
+
+
+def test_wrong_key_rejected(store, result, tmp_path):
+    path = str(tmp_path / "one.snap")
+    write_snapshot(path, "测试_250", result)
+    with pytest.raises(SnapshotError):
+        read_snapshot(path, "其他_250")
+
+
+@pytest.mark.parametrize("damage", ["payload", "header", "truncate", "magic", "empty"])
+def test_corrupted_file_is_a_miss(store, result, damage):
+    store.set("测试_250", result)
+    path = store._file("测试_250")
+    with open(path, "rb") as f:
+        data = bytearray(f.read())
+    if damage == "payload":
+        data[-10] ^= 0xFF
+    elif damage == "header":
+        data[snapshot._PREFIX.size + 5] ^= 0xFF
+    elif damage == "truncate":
+        data = data[:len(data) // 2]
+    elif damage == "magic":
+        data[:8] = b"NOTSNAP\x00"
+    else:
+        data = data[:4]
+    with open(path, "wb") as f:
+        f.write(data)
+
+    assert store.get("测试_250") is None
+    assert store.get_stale("测试_250") is None
+    assert store.invalid == 1
+    assert not os.path.exists(path)
+
+
+def test_schema_mismatch_is_a_miss(store, result, monkeypatch):
+    monkeypatch.setattr(snapshot, "SCHEMA", "0000000000000000")
+    store.set("测试_250", result)
+    monkeypatch.undo()
+
+    with pytest.raises(SnapshotError):
+        read_snapshot(store._file("测试_250"), "测试_250")
+    assert store.get("测试_250") is None
+    assert store.invalid == 1
+    assert len(store) == 0
+
+
+def test_expired_entry_served_as_stale(tmp_path, result):
+    store = SnapshotStore(str(tmp_path / "ttl"), ttl=10)
+    write_snapshot(store._file("测试_250"), "测试_250", result, created=time.time() - 15)
+
+    assert store.get("测试_250") is None
+    stale, age = store.get_stale("测试_250")
+    assert stale.render() == result.render()
+    assert age == pytest.approx(5, abs=1)
+
+
+def test_tiered_cache_restores_from_snapshot(tmp_path, result):
+    path = str(tmp_path / "tiered")
+    TieredCache(LRUCache(maxsize=4, ttl=60), SnapshotStore(path, ttl=60)).set("测试_250", result)
+    # 新容器：内存缓存为空，从快照恢复
+    cold = TieredCache(LRUCache(maxsize=4, ttl=60), SnapshotStore(path, ttl=60))
+    assert cold.get("测试_250").render() == result.render()
+    assert "测试_250" in cold.l1
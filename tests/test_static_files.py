@@ -0,0 +1,134 @@
+# test_static_files.py - 收盘后预渲染的静态响应：manifest 有效期内直接返回，过期后回到动态计算
+import gzip
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from materialize import MANIFEST, SESSIONS, in_session, materialize, next_open
+from static_files import lookup_key
+from stock_api import StockDataAPI
+
+STOCK = "苹果"
+
+
+@pytest.fixture(scope="module")
+def static_dir(tmp_path_factory):
+    """离线生成美股的静态响应（只预压缩gzip）"""
+    root = str(tmp_path_factory.mktemp("static"))
+    api = StockDataAPI(offline=True)
+    try:
+        stats = materialize(api, root, ["us_share"], (30,), (10,), encodings=["gzip"])
+    finally:
+        api.close()
+    assert stats["files"] > 0 and stats["failed"] == 0
+    return root
+
+
+def set_valid_until(root, valid_until):
+    path = os.path.join(root, MANIFEST)
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest["markets"]["us_share"]["valid_until"] = valid_until
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    # 保证修改时间变化，中间件重新加载 manifest
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+@pytest.fixture
+def static_client(client, static_dir, monkeypatch):
+    monkeypatch.setenv("STOCK_API_STATIC_DIR", static_dir)
+    set_valid_until(static_dir, datetime.now().timestamp() + 3600)
+    return client
+
+
+def test_lookup_key():
+    assert lookup_key("/api/stock/苹果", []) == "/api/stock/苹果?days=30"
+    assert lookup_key("/api/stock/苹果/simple", [("days", "60")]) == "/api/stock/苹果/simple?days=30"
+    assert lookup_key("/api/stock/苹果", [("interval", "1d"), ("days", "100")]) == "/api/stock/苹果?days=100"
+    assert lookup_key("/api/stock/苹果", [("interval", "1wk")]) is None
+    assert lookup_key("/api/stock/苹果", [("max_points", "50")]) is None
+    assert lookup_key("/api/stock/苹果", [("days", "abc")]) is None
+    assert lookup_key("/api/batch", []) is None
+
+
+def test_next_open_skips_weekend():
+    tz = SESSIONS["us_share"][0]
+    friday_evening = datetime(2024, 1, 5, 17, 0, tzinfo=tz)
+    assert next_open("us_share", friday_evening) == datetime(2024, 1, 8, 9, 30, tzinfo=tz)
+    assert not in_session("us_share", friday_evening)
+    assert in_session("us_share", datetime(2024, 1, 8, 10, 0, tzinfo=tz))
+
+
+def test_serves_static_response(static_client, fresh_api, monkeypatch):
+    response = static_client.get(f"/api/stock/{STOCK}")
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "STATIC"
+    max_age = int(response.headers["Cache-Control"].split("max-age=")[1])
+    assert 3500 < max_age <= 3600
+
+    simple = static_client.get(f"/api/stock/{STOCK}/simple")
+    assert simple.headers["X-Cache"] == "STATIC"
+
+    # 与动态响应一致
+    monkeypatch.delenv("STOCK_API_STATIC_DIR")
+    dynamic = static_client.get(f"/api/stock/{STOCK}")
+    assert dynamic.headers["X-Cache"] != "STATIC"
+    assert response.json() == dynamic.json()
+
+
+def test_serves_precompressed_file(static_client, static_dir):
+    response = static_client.get(f"/api/stock/{STOCK}", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["X-Cache"] == "STATIC"
+    assert response.headers["Content-Encoding"] == "gzip"
+    with open(os.path.join(static_dir, "stock", STOCK, "days-30.json"), "rb") as f:
+        assert response.content == f.read()
+    with open(os.path.join(static_dir, "stock", STOCK, "days-30.json.gz"), "rb") as f:
+        assert gzip.decompress(f.read()) == response.content
+
+
+def test_other_requests_are_dynamic(static_client):
+    for params in ({"days": 100}, {"interval": "1wk"}, {"max_points": 10}):
+        response = static_client.get(f"/api/stock/{STOCK}", params=params)
+        assert response.status_code == 200
+        assert response.headers["X-Cache"] != "STATIC", params
+
+
+def test_expired_manifest_falls_back(static_client, static_dir):
+    assert static_client.get(f"/api/stock/{STOCK}").headers["X-Cache"] == "STATIC"
+    set_valid_until(static_dir, datetime.now().timestamp() - 1)
+    response = static_client.get(f"/api/stock/{STOCK}")
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] in ("HIT", "MISS")
+
+
+def test_schema_mismatch_ignored(static_client, static_dir):
+    path = os.path.join(static_dir, MANIFEST)
+    with open(path, encoding="utf-8") as f:
+        original = f.read()
+    try:
+        manifest = json.loads(original)
+        manifest["schema"] = "0000000000000000"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        assert static_client.get(f"/api/stock/{STOCK}").headers["X-Cache"] != "STATIC"
+    finally:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(original)
+
+
+def test_missing_file_falls_back(static_client, static_dir):
+    path = os.path.join(static_dir, "stock", STOCK, "simple-10.json")
+    for suffix in ("", ".gz"):
+        os.rename(path + suffix, path + suffix + ".bak")
+    try:
+        response = static_client.get(f"/api/stock/{STOCK}/simple")
+        assert response.status_code == 200 and response.headers["X-Cache"] != "STATIC"
+    finally:
+        for suffix in ("", ".gz"):
+            os.rename(path + suffix + ".bak", path + suffix)
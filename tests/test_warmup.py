@@ -0,0 +1,80 @@
+# test_warmup.py - 指标预热期：多获取预热K线计算后裁剪，days 的取值范围
+import numpy as np
+import pytest
+
+from indicators import IndicatorCalculator
+from synthetic_market import SyntheticMarket
+from warmup import ALL_COLUMNS, column_warmup, plan_bars, trim, warmup_bars
+
+STOCK = "贵州茅台"
+
+
+def test_column_warmup():
+    assert column_warmup("MA60") == 59
+    assert column_warmup("above_MA20") == 19
+    assert column_warmup("RSI") == 14
+    assert column_warmup("price_change_5d") == 5
+    assert column_warmup("close") == 0
+    assert column_warmup("MACD_signal") > column_warmup("MACD")
+    assert column_warmup("MACD_golden_cross") == column_warmup("MACD_signal") + 1
+    assert warmup_bars() == max(column_warmup(column) for column in ALL_COLUMNS)
+    assert plan_bars(30) == 30 + warmup_bars()
+
+
+def test_trim():
+    df = SyntheticMarket(seed=1).generate("TRIM", 50)
+    tail = trim(df, 10)
+    assert len(tail) == 10 and list(tail.index) == list(range(10))
+    assert tail["date"].tolist() == df["date"].iloc[-10:].tolist()
+    assert trim(df, 80) is df
+    for days in (0, -3):
+        empty = trim(df, days)
+        assert len(empty) == 0 and list(empty.columns) == list(df.columns)
+    assert trim(None, 5) is None
+
+
+def test_warmed_up_values_match_long_history():
+    calculator = IndicatorCalculator()
+    bars = SyntheticMarket(seed=5).generate("WARM", 2000)
+    reference = calculator.calculate_all(bars).tail(30).reset_index(drop=True)
+    window = bars.tail(plan_bars(30)).reset_index(drop=True)
+    result = trim(calculator.calculate_all(window), 30)
+
+    np.testing.assert_allclose(result["MA60"], reference["MA60"], rtol=1e-12)
+    np.testing.assert_allclose(result["RSI"], reference["RSI"], rtol=1e-12)
+    price = float(reference["close"].max())
+    for column in ("MACD", "MACD_signal"):
+        np.testing.assert_allclose(result[column], reference[column], atol=price * 1e-3)
+    for column in ("K", "D"):
+        np.testing.assert_allclose(result[column], reference[column], atol=0.1)
+    for column in ("MACD_golden_cross", "KDJ_golden_cross", "above_MA20"):
+        assert (result[column] == reference[column]).all(), column
+
+    # 不预热时开头的 MA60 只是几根K线的均值
+    cold = calculator.calculate_all(bars.tail(30).reset_index(drop=True))
+    assert not np.allclose(cold["MA60"], reference["MA60"])
+
+
+def test_response_rows_are_warmed_up(client, fresh_api):
+    body = client.get(f"/api/stock/{STOCK}", params={"days": 30}).json()
+    assert len(body["data"]) == 30 and len(body["indicators"]) == 30
+
+    closes = fresh_api.fetcher.get_kline_data(STOCK, plan_bars(30))["close"].to_numpy()
+    first = len(closes) - 30
+    assert body["indicators"][0]["MA60"] == pytest.approx(closes[first - 59:first + 1].mean())
+
+
+@pytest.mark.parametrize("path, params", [
+    (f"/api/stock/{STOCK}", {"days": 0}),
+    (f"/api/stock/{STOCK}", {"days": -5}),
+    (f"/api/stock/{STOCK}", {"start": "2024-01-01", "limit": 0}),
+    (f"/api/stock/{STOCK}/simple", {"days": 0}),
+    ("/api/batch", {"names": STOCK, "days": 0}),
+])
+def test_non_positive_days_rejected(client, path, params):
+    assert client.get(path, params=params).status_code == 400
+
+
+def test_single_bar(client):
+    body = client.get(f"/api/stock/{STOCK}", params={"days": 1}).json()
+    assert len(body["data"]) == 1 and body["summary"]["moving_averages"]["MA60"] is not None
@@ -0,0 +1,125 @@
+# warmup.py - 指标预热期规划：按需要的指标多获取预热K线，计算后裁剪为请求的数量
+"""
+calculate_all 中的均线、EMA 和 KDJ 都使用 min_periods=1 / adjust=False：
+只获取 days 根K线时，开头的 MA60 只是几根K线的均值，MACD、KDJ 的 EMA 也还受第一根K线的影响，
+短请求得到的是没有预热的值，想要准确只能手工多取K线。
+
+plan_bars(days, columns) 根据需要的指标列推算预热K线数：
+- 滚动窗口（MA、RSI、KDJ 的最高最低价）: 窗口长度 - 1
+- EMA: 第一根K线的残余权重 (1 - alpha)^k 降到 STOCK_API_WARMUP_TOLERANCE（默认0.001）以下所需的根数，
+  串联的 EMA（MACD信号线、KDJ 的 K/D）逐级相加
+- 金叉死叉等需要前一根K线的信号再加1根
+获取 days + 预热 根K线计算指标，再用 trim 只保留最后 days 根。
+
+STOCK_API_WARMUP=0 时不预热（与原先一样只获取 days 根）。
+"""
+import math
+import os
+import re
+
+from indicators import IncrementalIndicators
+
+# 与 IndicatorCalculator 使用的参数一致
+MA_WINDOWS = IncrementalIndicators.MA_WINDOWS
+RSI_PERIOD = IncrementalIndicators.RSI_PERIOD
+KDJ_N = IncrementalIndicators.KDJ_N
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+KDJ_ALPHA = 1 / 3
+
+ENABLED = os.environ.get("STOCK_API_WARMUP", "1").lower() not in ("0", "false", "no")
+TOLERANCE = float(os.environ.get("STOCK_API_WARMUP_TOLERANCE", 0.001))
+
+
+def ema_warmup(span=None, alpha=None, tolerance=None):
+    """EMA（adjust=False）中第一根K线的残余权重低于 tolerance 所需的K线数"""
+    tolerance = tolerance or TOLERANCE
+    alpha = alpha if alpha is not None else 2 / (span + 1)
+    return math.ceil(math.log(tolerance) / math.log(1 - alpha))
+
+
+def column_warmup(column, tolerance=None):
+    """
+    单个指标列需要的预热K线数（K线原始列和未知列为0）
+    """
+    match = re.fullmatch(r"(?:above_)?MA(\d+)", column)
+    if match:
+        return int(match.group(1)) - 1
+    if column.startswith("RSI"):
+        # 第一根K线没有涨跌，窗口内需要 RSI_PERIOD 个涨跌值
+        return RSI_PERIOD
+    if column.startswith("MACD"):
+        macd = ema_warmup(MACD_SLOW, tolerance=tolerance)
+        if column == "MACD":
+            return macd
+        signal = macd + ema_warmup(MACD_SIGNAL, tolerance=tolerance)
+        return signal + 1 if column.endswith("_cross") else signal
+    if column in ("K", "D", "J") or column.startswith(("KDJ_", "K_")):
+        k = KDJ_N - 1 + ema_warmup(alpha=KDJ_ALPHA, tolerance=tolerance)
+        if column in ("K", "K_overbought", "K_oversold"):
+            return k
+        d = k + ema_warmup(alpha=KDJ_ALPHA, tolerance=tolerance)
+        return d + 1 if column.endswith("_cross") else d
+    if column == "price_change":
+        return 1
+    if column == "price_change_5d":
+        return 5
+    return 0
+
+
+# calculate_all 生成的全部指标列
+ALL_COLUMNS = (
+    *(f"MA{window}" for window in MA_WINDOWS), *(f"above_MA{window}" for window in MA_WINDOWS[:3]),
+    "RSI", "RSI_overbought", "RSI_oversold",
+    "MACD", "MACD_signal", "MACD_hist", "MACD_golden_cross", "MACD_death_cross",
+    "K", "D", "J", "KDJ_golden_cross", "KDJ_death_cross", "K_overbought", "K_oversold",
+    "price_change", "price_change_5d",
+)
+
+
+def warmup_bars(columns=None, tolerance=None):
+    """
+    Args:
+        columns: 需要准确值的指标列，默认 calculate_all 的全部指标列
+    Returns:
+        预热K线数；STOCK_API_WARMUP=0 时为0
+    """
+    if not ENABLED:
+        return 0
+    return max((column_warmup(column, tolerance) for column in (columns or ALL_COLUMNS)), default=0)
+
+
+def plan_bars(days, columns=None):
+    """计算 days 根K线的指标需要获取的K线总数"""
+    return days + warmup_bars(columns)
+
+
+def trim(df, days):
+    """只保留最后 days 根K线（用于去掉预热部分）；days 不大于0时返回空表"""
+    if df is None:
+        return df
+    if days <= 0:
+        return df.iloc[0:0]
+    if len(df) <= days:
+        return df
+    return df.iloc[-days:].reset_index(drop=True)
+
+
+# 测试代码
+if __name__ == "__main__":
+    import numpy as np
+
+    from indicators import IndicatorCalculator
+    from synthetic_market import SyntheticMarket
+
+    for column in ("MA60", "RSI", "MACD", "MACD_golden_cross", "K", "KDJ_golden_cross", "price_change_5d"):
+        print(f"{column:18s} 预热 {column_warmup(column)} 根")
+    print("全部指标预热:", warmup_bars())
+
+    calculator = IndicatorCalculator()
+    bars = SyntheticMarket(seed=5).generate("WARM", 2000)
+    reference = calculator.calculate_all(bars).tail(30)
+    for label, window in (("不预热", bars.tail(30)), ("预热", bars.tail(plan_bars(30)))):
+        result = trim(calculator.calculate_all(window.reset_index(drop=True)), 30)
+        errors = {col: float(np.max(np.abs(result[col].to_numpy() - reference[col].to_numpy())))
+                  for col in ("MA60", "MACD", "MACD_signal", "K", "D")}
+        print(label, {col: f"{error:.2e}" for col, error in errors.items()})